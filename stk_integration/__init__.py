@@ -0,0 +1,33 @@
+# coding: utf-8
+"""
+Helpers for driving STK from Python at scale.
+
+These build on the workflow shown in ``STK and Python with comtypes.py`` and
+work with any object that exposes the same STK Object Model calls.
+"""
+
+from .access import access_from_results, compute_access
+from .aio import AsyncEngines, EngineThread
+from .cache import ResultCache, propagator_state, state_hash, unit_state
+from .connect import build_objects
+from .dataproviders import (ElementResult, exec_elements, exec_elements_adaptive,
+                            exec_elements_batch, exec_elements_epsec, iter_exec_elements,
+                            resolve_providers, stack_results, write_exec_elements)
+from .dirty import (ChangeTracker, TrackedPropagator, change_tracker, propagate_dirty,
+                    reset_tracker)
+from .ephemeris import Ephemeris, lagrange_weights
+from .interfaces import (InterfaceCache, TypedObject, com_identity, interface_cache,
+                         query_interface)
+from .pool import EnginePool, JobError, WorkerCrashed, create_stk_engine
+from .scenario import (add_facility, add_satellite, assign_classical, close_scenario,
+                       get_type_libraries, new_scenario, propagate, satellite_propagator)
+from .session import Session, headless_engine, open_session, register_backend
+from .shared import SharedDescriptor, SharedStore, attach, attached, detach
+from .snapshot import SnapshotEngine, restore_scenario, snapshot_scenario
+from .spec import Plan, compile_plan, load_spec, normalize_spec
+from .sweep import Sweep, grid_cases, radius_extremes, sample_cases
+from .times import (datetime64_to_epsec, epsec_to_datetime64, format_utcg_array,
+                    parse_utcg_array)
+from .trace import TracedObject, Tracer
+from .typelib import LazyLibrary, import_report, lazy_library, save_index
+from .units import UnitTracker, convert, convert_rate, unit_tracker
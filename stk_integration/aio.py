@@ -0,0 +1,265 @@
+# coding: utf-8
+"""
+asyncio front end for a few shared STK engines.
+
+COM objects must stay on the thread that created them, so each engine gets a
+dedicated worker thread that creates the root and runs every call against it.
+Interface pointers are cached per root
+(:func:`~stk_integration.interfaces.interface_cache`), so an engine thread
+only ever queries or releases its own, and clears them before it exits.
+Coroutines hand work to those threads and await the result without blocking
+the event loop:
+
+    async with AsyncEngines(2, factory=create_stk_engine) as engines:
+        await engines.run(new_scenario, "Batch", start, stop, client="alice")
+        await engines.create_objects(satellites=constellation, client="alice")
+        await engines.propagate("*/Satellite/codeSat", client="alice")
+        result = await engines.exec_elements("*/Satellite/codeSat",
+                                             "Cartesian Velocity//J2000",
+                                             start, stop, 60, ["Time", "x", "y", "z"],
+                                             client="alice", timeout=30)
+
+A scenario lives inside one engine, so each client is pinned to an engine the
+first time it submits work (the one with the fewest clients). Each engine
+serves its clients round-robin, one call at a time, so a client queueing a
+thousand calls does not starve one queueing a single call.
+
+Cancelling an awaiting coroutine, or hitting its ``timeout``, removes the call
+if it has not started. A call already running inside STK cannot be
+interrupted; it finishes and its result is discarded.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict, deque
+
+from .connect import build_objects
+from .dataproviders import TIME_ELEMENTS, exec_elements
+from .interfaces import interface_cache
+from .pool import create_stk_engine
+from .scenario import propagate
+
+
+def _co_initialize():
+    # Each COM thread needs its own apartment; engines other than STK need none
+    try:
+        import comtypes
+    except ImportError:
+        return None
+    comtypes.CoInitialize()
+    return comtypes.CoUninitialize
+
+
+class _Call(object):
+    __slots__ = ("fn", "args", "kwargs", "future", "loop")
+
+    def __init__(self, fn, args, kwargs, future, loop):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.loop = loop
+
+    def finish(self, result=None, error=None):
+        try:
+            self.loop.call_soon_threadsafe(_settle, self.future, result, error)
+        except RuntimeError:
+            # The event loop has closed; nobody is left to take the result
+            pass
+
+
+def _settle(future, result, error):
+    # Runs on the event loop; the awaiting side may have cancelled meanwhile
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class _FairQueue(object):
+    """Per-client FIFO queues served round-robin."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._queues = OrderedDict()
+        self._closed = False
+
+    def put(self, client, call):
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Engine is closed")
+            self._queues.setdefault(client, deque()).append(call)
+            self._condition.notify()
+
+    def get(self):
+        """The next call, or ``None`` once closed."""
+        with self._condition:
+            while not self._queues and not self._closed:
+                self._condition.wait()
+            if not self._queues:
+                return None
+            client, queue = next(iter(self._queues.items()))
+            call = queue.popleft()
+            # Rotate this client to the back, or drop it if it has nothing left
+            del self._queues[client]
+            if queue:
+                self._queues[client] = queue
+            return call
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for queue in self._queues.values():
+                for call in queue:
+                    call.finish(error=RuntimeError("Engine closed before the call ran"))
+            self._queues.clear()
+            self._condition.notify_all()
+
+    def __len__(self):
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+
+class EngineThread(threading.Thread):
+    """Thread that creates one engine with ``factory()`` and runs calls on it."""
+
+    def __init__(self, factory, name=None):
+        threading.Thread.__init__(self, name=name, daemon=True)
+        self.factory = factory
+        self.queue = _FairQueue()
+        self.clients = set()
+        self.calls = 0
+        self.error = None
+        self._ready = threading.Event()
+
+    def run(self):
+        uninitialize = _co_initialize()
+        try:
+            try:
+                root = self.factory()
+            except BaseException as e:
+                self.error = e
+                return
+            finally:
+                self._ready.set()
+            while True:
+                call = self.queue.get()
+                if call is None:
+                    break
+                if call.future.cancelled():
+                    continue
+                try:
+                    result = call.fn(root, *call.args, **call.kwargs)
+                except BaseException as e:
+                    call.finish(error=e)
+                else:
+                    call.finish(result)
+                self.calls += 1
+            # Release the engine's cached interfaces here, in its own apartment
+            interface_cache(root).clear()
+            root = None
+        finally:
+            if uninitialize is not None:
+                uninitialize()
+
+    def wait_ready(self):
+        self._ready.wait()
+        if self.error is not None:
+            raise RuntimeError("Engine factory failed: %r" % (self.error,))
+
+
+class AsyncEngines(object):
+    """
+    ``engines`` worker threads, each owning one engine made by ``factory``.
+
+    Work is submitted as ``fn(root, *args, **kwargs)`` via :meth:`run`, or with
+    the :meth:`propagate`, :meth:`exec_elements` and :meth:`create_objects`
+    shortcuts.
+    """
+
+    def __init__(self, engines=1, factory=create_stk_engine):
+        if engines < 1:
+            raise ValueError("engines must be at least 1")
+        self.factory = factory
+        self._threads = [EngineThread(factory, name="stk-engine-%d" % i)
+                         for i in range(engines)]
+        self._assignments = {}
+        self._started = False
+        self._ready = False
+        self._startLock = threading.Lock()
+
+    def start(self):
+        """Start every engine thread and wait until each engine exists (blocking)."""
+        with self._startLock:
+            if not self._started:
+                self._started = True
+                for thread in self._threads:
+                    thread.start()
+            for thread in self._threads:
+                thread.wait_ready()
+            self._ready = True
+        return self
+
+    def close(self):
+        for thread in self._threads:
+            thread.queue.close()
+        for thread in self._threads:
+            if thread.is_alive():
+                thread.join()
+
+    async def __aenter__(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.start)
+        return self
+
+    async def __aexit__(self, *exc):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def engine_for(self, client):
+        """The :class:`EngineThread` serving ``client``, assigning one if needed."""
+        thread = self._assignments.get(client)
+        if thread is None:
+            thread = min(self._threads, key=lambda t: len(t.clients))
+            thread.clients.add(client)
+            self._assignments[client] = thread
+        return thread
+
+    def release(self, client):
+        """Forget ``client``'s engine assignment (its scenario state stays in the engine)."""
+        thread = self._assignments.pop(client, None)
+        if thread is not None:
+            thread.clients.discard(client)
+
+    async def run(self, fn, *args, client=None, timeout=None, **kwargs):
+        """Await ``fn(root, *args, **kwargs)`` on ``client``'s engine."""
+        loop = asyncio.get_running_loop()
+        if not self._ready:
+            # Starting engines blocks; keep it off the event loop
+            await loop.run_in_executor(None, self.start)
+        future = loop.create_future()
+        self.engine_for(client).queue.put(client, _Call(fn, args, kwargs, future, loop))
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout)
+
+    async def propagate(self, path, client=None, timeout=None):
+        """Propagate the satellite at ``path``."""
+        return await self.run(propagate, path, client=client, timeout=timeout)
+
+    async def exec_elements(self, path, provider_path, start, stop, step, elements,
+                            time_elements=TIME_ELEMENTS, client=None, timeout=None):
+        """:func:`~stk_integration.dataproviders.exec_elements` for one object."""
+        return await self.run(_exec_elements, path, provider_path, start, stop, step,
+                              elements, time_elements, client=client, timeout=timeout)
+
+    async def create_objects(self, facilities=None, satellites=None, client=None,
+                             timeout=None, **options):
+        """:func:`~stk_integration.connect.build_objects` in the current scenario."""
+        return await self.run(build_objects, facilities, satellites, client=client,
+                              timeout=timeout, **options)
+
+
+def _exec_elements(root, path, provider_path, start, stop, step, elements, time_elements):
+    provider = root.GetObjectFromPath(path).DataProviders.GetDataPrvTimeVarFromPath(provider_path)
+    return exec_elements(provider, start, stop, step, elements, time_elements)
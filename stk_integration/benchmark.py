@@ -0,0 +1,290 @@
+# coding: utf-8
+"""
+Benchmarks for the scenario build / propagate / extract pipeline.
+
+Runs against the fake engine by default, or a live STK with ``--engine headless``
+(STK Engine, no UI) or ``--engine desktop`` (the notebooks' visible application),
+which also makes their start-up times comparable:
+
+    python -m stk_integration.benchmark --objects 10 100 --steps 60 10
+    python -m stk_integration.benchmark --save baseline.json
+    python -m stk_integration.benchmark --compare baseline.json
+
+Build and extraction cases run through a :class:`~stk_integration.trace.Tracer`
+and report each individual COM call (``Children.New``, ``Assign``,
+``Propagate``, ``ExecElements``...), so the percentiles are per round trip
+rather than per helper function. Rebuilding against restoring a snapshot is
+timed as a whole.
+
+Peak RSS is that of this Python process, which includes the engine for
+``fake`` and ``headless`` (STK Engine is loaded in-process). The desktop
+application runs in a process of its own, whose memory is reported
+separately as ``stk_peak_rss_mb`` when psutil is installed.
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .dataproviders import exec_elements
+from .scenario import (add_facility, add_satellite, close_scenario, get_type_libraries,
+                       new_scenario)
+from .session import open_session
+from .snapshot import restore_scenario, snapshot_scenario
+from .trace import Tracer
+
+START = "10 Jun 2016 04:00:00"
+STOP = "11 Jun 2016 04:00:00"
+EPOCH = "08 Jun 2016 15:14:26"
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unavailable."""
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2.0 ** 20
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return maxrss / (2.0 ** 20 if sys.platform == "darwin" else 2.0 ** 10)
+
+
+def process_peak_rss_mb(pid):
+    """
+    Peak working set of process ``pid`` in MB (its current RSS where the
+    platform keeps no peak), or None if psutil or the process is unavailable.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+    try:
+        memory = psutil.Process(pid).memory_info()
+    except psutil.Error:
+        return None
+    return getattr(memory, "peak_wset", memory.rss) / 2.0 ** 20
+
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t0
+
+
+def _calls(tracer, members, span=None):
+    # Durations of every traced call to one of ``members``, optionally inside ``span``
+    return [seconds for _, seconds, _, spans, _, member, _ in tracer.events
+            if member in members and (span is None or span in spans)]
+
+
+def _summary(durations, items=None):
+    durations = np.asarray(durations)
+    total = durations.sum()
+    items = len(durations) if items is None else items
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99]) * 1e3
+    return {
+        "calls": len(durations),
+        "items": items,
+        "total_s": float(total),
+        "throughput_per_s": float(items / total) if total > 0 else float("inf"),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+    }
+
+
+def _elements(i, count):
+    # Spread satellites over RAAN and mean anomaly around the notebook's orbit
+    return (15.08385840, 0.0002947, 28.4703, 114.7239,
+            (315.1965 + 360.0 * i / count) % 360, (332.9096 + 7.0 * i) % 360)
+
+
+def bench_scenario(root, repeat=5):
+    """``NewScenario`` calls."""
+    tracer = Tracer()
+    traced = tracer.wrap(root)
+    for _ in range(repeat):
+        new_scenario(traced, "Bench", START, STOP)
+        close_scenario(traced)
+    return _summary(_calls(tracer, ("NewScenario",)))
+
+
+def bench_build(root, count):
+    """
+    Facility ``Children.New``, satellite ``Children.New``, the initial state
+    ``Assign`` and ``Propagate``, each call timed on its own.
+    """
+    new_scenario(root, "Bench", START, STOP)
+    tracer = Tracer()
+    traced = tracer.wrap(root)
+    with tracer.span("facility"):
+        for i in range(count):
+            add_facility(traced, "Fac%d" % i, 38.9943, -76.8489 + i % 360, 0)
+    propagators = []
+    with tracer.span("satellite"):
+        for i in range(count):
+            _, satProp = add_satellite(traced, "Sat%d" % i, EPOCH, *_elements(i, count),
+                                       propagate=False)
+            propagators.append(satProp)
+    with tracer.span("propagate"):
+        for satProp in propagators:
+            satProp.Propagate()
+    close_scenario(root)
+    return {
+        "facility_new": _summary(_calls(tracer, ("New",), "facility")),
+        "satellite_new": _summary(_calls(tracer, ("New",), "satellite")),
+        "state_assign": _summary(_calls(tracer, ("Assign",), "satellite")),
+        "propagate": _summary(_calls(tracer, ("Propagate",), "propagate")),
+    }
+
+
+def bench_extract(root, count, step, elements=("Time", "x", "y", "z")):
+    """
+    ``ExecElements`` on Cartesian Velocity//J2000 for ``count`` satellites,
+    and the data fetch that follows it.
+    """
+    sc2 = new_scenario(root, "Bench", START, STOP)
+    tracer = Tracer()
+    providers = []
+    for i in range(count):
+        sat, _ = add_satellite(root, "Sat%d" % i, EPOCH, *_elements(i, count))
+        provider = sat.DataProviders.GetDataPrvTimeVarFromPath("Cartesian Velocity//J2000")
+        providers.append(tracer.wrap(provider))
+    start, stop = sc2.StartTime, sc2.StopTime
+    samples = 0
+    for provider in providers:
+        samples += len(exec_elements(provider, start, stop, step, elements))
+    close_scenario(root)
+    return {
+        "exec_elements": _summary(_calls(tracer, ("ExecElements",)), samples),
+        "fetch": _summary(_calls(tracer, ("ToArray", "GetValues")), samples),
+    }
+
+
+def _build(root, count):
+    new_scenario(root, "Bench", START, STOP)
+    for i in range(count):
+        add_facility(root, "Fac%d" % i, 38.9943, -76.8489 + i % 360, 0)
+        add_satellite(root, "Sat%d" % i, EPOCH, *_elements(i, count))
+
+
+def bench_restore(root, count, repeat=3):
+    """Rebuilding ``count`` facilities and satellites against restoring a snapshot of them."""
+    directory = tempfile.mkdtemp(prefix="stk_snapshot")
+    try:
+        rebuild, restore = [], []
+        for _ in range(repeat):
+            rebuild.append(_timed(_build, root, count))
+            close_scenario(root)
+        _build(root, count)
+        snapshot_scenario(root, directory, states=False)
+        close_scenario(root)
+        for _ in range(repeat):
+            restore.append(_timed(restore_scenario, root, directory))
+            close_scenario(root)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {"rebuild": _summary(rebuild, count), "restore": _summary(restore, count)}
+
+
+def run_benchmarks(root, object_counts=(10, 100), steps=(60, 10)):
+    """
+    Run every case on one engine root and return a flat ``{case: summary}``
+    dictionary. Each case starts from and leaves behind an empty engine.
+    """
+    # Import the type libraries before any timing starts
+    get_type_libraries(root)
+    results = {"scenario_new": bench_scenario(root)}
+    for count in object_counts:
+        for case, summary in bench_build(root, count).items():
+            results["%s[n=%d]" % (case, count)] = summary
+        for step in steps:
+            for case, summary in bench_extract(root, count, step).items():
+                results["%s[n=%d,step=%g]" % (case, count, step)] = summary
+        for case, summary in bench_restore(root, count).items():
+            results["%s[n=%d]" % (case, count)] = summary
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Return ``(case, baseline_s, current_s)`` for every case whose total time
+    grew by more than ``tolerance`` (a fraction) relative to ``baseline``.
+    """
+    regressions = []
+    for case, summary in results.items():
+        if not isinstance(summary, dict) or case not in baseline:
+            continue
+        before, after = baseline[case]["total_s"], summary["total_s"]
+        if after > before * (1 + tolerance):
+            regressions.append((case, before, after))
+    return regressions
+
+
+def format_report(results):
+    lines = ["%-32s %8s %12s %9s %9s %9s" % ("case", "calls", "items/s", "p50 ms",
+                                             "p90 ms", "p99 ms")]
+    for case, summary in results.items():
+        if not isinstance(summary, dict):
+            continue
+        lines.append("%-32s %8d %12.1f %9.3f %9.3f %9.3f" % (
+            case, summary["calls"], summary["throughput_per_s"],
+            summary["p50_ms"], summary["p90_ms"], summary["p99_ms"]))
+    if results.get("startup_s") is not None:
+        lines.append("start-up: %.3f s" % results["startup_s"])
+    if results.get("peak_rss_mb") is not None:
+        lines.append("peak RSS: %.1f MB" % results["peak_rss_mb"])
+    if results.get("stk_peak_rss_mb") is not None:
+        lines.append("STK process peak RSS: %.1f MB" % results["stk_peak_rss_mb"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--engine", choices=("fake", "headless", "desktop"), default="fake")
+    parser.add_argument("--latency", type=float, default=50e-6,
+                        help="per-call latency of the fake engine in seconds")
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--steps", type=float, nargs="+", default=[60, 10])
+    parser.add_argument("--save", help="write results to this JSON baseline")
+    parser.add_argument("--compare", help="compare against this JSON baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    if args.engine == "fake":
+        session = open_session("fake", latency=args.latency)
+    else:
+        session = open_session(args.engine)
+
+    with session:
+        results = run_benchmarks(session.root, args.objects, args.steps)
+        if session.pid is not None:
+            results["stk_peak_rss_mb"] = process_peak_rss_mb(session.pid)
+    results["startup_s"] = session.startup_seconds
+    print(format_report(results))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for case, before, after in regressions:
+            print("REGRESSION %s: %.4f s -> %.4f s" % (case, before, after))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# coding: utf-8
+"""
+Persistent on-disk cache of data provider results.
+
+Entries are keyed by object path, provider path, element list, interval, step,
+the unit preferences the values are reported in and a hash of the object's
+propagator inputs, so an extraction only reaches STK again when one of those
+changes:
+
+    cache = ResultCache("~/.stk_cache", max_bytes=2 ** 30)
+    result = cache.exec_elements(root, "*/Satellite/codeSat",
+                                 "Cartesian Velocity//J2000",
+                                 sc2.StartTime, sc2.StopTime, 60,
+                                 ["Time", "x", "y", "z"])
+
+Each entry is a directory holding one ``.npy`` file per column plus a
+``meta.json``; columns are loaded memory-mapped. When the cache grows past
+``max_bytes`` the least recently used entries are removed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from .dataproviders import ElementResult, TIME_ELEMENTS, exec_elements
+from .interfaces import query_interface
+from .scenario import get_type_libraries, satellite_propagator
+from .units import unit_tracker
+
+_META = "meta.json"
+
+# The unit preferences that change what a data provider reports
+UNIT_DIMENSIONS = ("DateFormat", "TimeUnit", "DistanceUnit", "AngleUnit")
+
+
+def propagator_state(root, obj):
+    """
+    Summary of what determines an object's ephemeris, for use in cache keys.
+
+    Satellites report their propagator type, initial epoch and classical
+    elements; facilities their geodetic position. Values are in the current
+    unit preferences.
+    """
+    STKObjects, STKUtil = get_type_libraries(root)
+    className = obj.ClassName
+    if className == "Facility":
+        fac2 = query_interface(root, obj, STKObjects.IAgFacility)
+        return {"class": className, "position": list(fac2.Position.QueryPlanetodetic())}
+    if className != "Satellite":
+        return {"class": className}
+
+    propagatorType = query_interface(root, obj, STKObjects.IAgSatellite).PropagatorType
+    satProp = satellite_propagator(root, obj)
+    if satProp is None:
+        return {"class": className, "propagator": propagatorType}
+    initialState = satProp.InitialState
+    keplerian = initialState.Representation.ConvertTo(STKUtil.eOrbitStateClassical)
+    keplerian2 = keplerian.QueryInterface(STKObjects.IAgOrbitStateClassical)
+    keplerian2.SizeShapeType = STKObjects.eSizeShapeSemimajorAxis
+    keplerian2.LocationType = STKObjects.eLocationMeanAnomaly
+    orientation = keplerian2.Orientation
+    orientation.AscNodeType = STKObjects.eAscNodeRAAN
+    sizeShape = keplerian2.SizeShape.QueryInterface(STKObjects.IAgClassicalSizeShapeSemimajorAxis)
+    elements = [
+        sizeShape.SemiMajorAxis,
+        sizeShape.Eccentricity,
+        orientation.Inclination,
+        orientation.ArgOfPerigee,
+        orientation.AscNode.QueryInterface(STKObjects.IAgOrientationAscNodeRAAN).Value,
+        keplerian2.Location.QueryInterface(STKObjects.IAgClassicalLocationMeanAnomaly).Value,
+    ]
+    return {"class": className, "propagator": propagatorType,
+            "epoch": initialState.Epoch, "elements": elements}
+
+
+def unit_state(root):
+    """The current unit of each of :data:`UNIT_DIMENSIONS`, as tracked by :func:`unit_tracker`."""
+    units = unit_tracker(root)
+    return dict((dimension, units.get(dimension)) for dimension in UNIT_DIMENSIONS)
+
+
+def state_hash(state):
+    """Stable hash of a JSON-serialisable state summary."""
+    text = json.dumps(state, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache(object):
+    """Content-addressed, size-bounded cache of :class:`ElementResult` objects."""
+
+    def __init__(self, directory, max_bytes=2 ** 30):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+    def key(self, object_path, provider_path, elements, start, stop, step, state, units):
+        """
+        Cache key for one extraction; ``state`` is a state summary or its hash,
+        ``units`` the :func:`unit_state` the values are reported in.
+        """
+        if not isinstance(state, str):
+            state = state_hash(state)
+        return state_hash([object_path, provider_path, list(elements), start, stop,
+                           float(step), state, units])
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """The cached result for ``key`` (columns memory-mapped), or ``None``."""
+        path = self._path(key)
+        try:
+            with open(os.path.join(path, _META)) as f:
+                meta = json.load(f)
+        except (IOError, OSError, ValueError):
+            self.misses += 1
+            return None
+        columns = {}
+        for i, name in enumerate(meta["elements"]):
+            columns[name] = np.load(os.path.join(path, "%d.npy" % i), mmap_mode="r")
+        # Mark as recently used for LRU eviction
+        os.utime(os.path.join(path, _META), None)
+        self.hits += 1
+        return ElementResult(columns)
+
+    def put(self, key, result, object_path=None, provider_path=None):
+        """Store ``result`` under ``key``, then evict down to ``max_bytes``."""
+        staging = tempfile.mkdtemp(prefix=".tmp-", dir=self.directory)
+        try:
+            for i, name in enumerate(result.names):
+                np.save(os.path.join(staging, "%d.npy" % i), np.asarray(result[name]))
+            with open(os.path.join(staging, _META), "w") as f:
+                json.dump({"elements": result.names, "object_path": object_path,
+                           "provider_path": provider_path, "created": time.time()}, f)
+            target = self._path(key)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        self.evict()
+
+    def _entries(self):
+        # (last used, size in bytes, path, meta) for every complete entry
+        entries = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            metaPath = os.path.join(path, _META)
+            if name.startswith(".") or not os.path.isfile(metaPath):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(metaPath), size, path, metaPath))
+        return entries
+
+    def size_bytes(self):
+        return sum(entry[1] for entry in self._entries())
+
+    def evict(self, max_bytes=None):
+        """Remove least recently used entries until the cache fits ``max_bytes``."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self._entries())
+        total = sum(entry[1] for entry in entries)
+        for _, size, path, _ in entries:
+            if total <= limit:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def invalidate(self, object_path=None):
+        """
+        Drop every entry for ``object_path`` (a path or a list of paths), or
+        everything when omitted.
+        """
+        if isinstance(object_path, str):
+            object_path = [object_path]
+        paths = None if object_path is None else set(object_path)
+        for _, _, path, metaPath in self._entries():
+            if paths is not None:
+                with open(metaPath) as f:
+                    if json.load(f).get("object_path") not in paths:
+                        continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def exec_elements(self, root, object_path, provider_path, start, stop, step, elements,
+                      state=None, time_elements=TIME_ELEMENTS):
+        """
+        :func:`~stk_integration.dataproviders.exec_elements` through the cache.
+
+        ``state`` defaults to :func:`propagator_state` of the object; pass a
+        precomputed summary (or hash) to skip reading it from STK.
+        """
+        elements = list(elements)
+        obj = None
+        if state is None:
+            obj = root.GetObjectFromPath(object_path)
+            state = propagator_state(root, obj)
+        key = self.key(object_path, provider_path, elements, start, stop, step, state,
+                       unit_state(root))
+        result = self.get(key)
+        if result is not None:
+            return result
+        if obj is None:
+            obj = root.GetObjectFromPath(object_path)
+        provider = obj.DataProviders.GetDataPrvTimeVarFromPath(provider_path)
+        result = exec_elements(provider, start, stop, step, elements, time_elements)
+        self.put(key, result, object_path, provider_path)
+        return result
@@ -0,0 +1,205 @@
+# coding: utf-8
+"""
+Bulk object creation with batched Connect commands.
+
+Building a constellation through ``Children.New`` and a dozen property sets per
+satellite costs dozens of round trips per object. Here each facility or
+satellite becomes two Connect commands (``New`` plus ``SetPosition`` or
+``SetState``), and the commands are sent in chunks through
+``root.ExecuteMultipleCommands`` (one round trip per chunk), falling back to
+``root.ExecuteCommand`` on engines without it.
+
+Connect works in metres and degrees regardless of the unit preferences, so
+distances given here in km are converted on the way out.
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from .j2 import MU, SECONDS_PER_DAY
+from .interfaces import interface_cache, query_interface
+from .scenario import get_type_libraries
+
+# AgEExecMultiCmdResultAction
+CONTINUE_ON_ERROR = 0
+
+# What STK accepts as an object name; anything else would split or escape the command
+_NAME = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+def _number(value):
+    return "%.15g" % value
+
+
+def _name(value):
+    value = str(value)
+    if not _NAME.match(value):
+        raise ValueError("Invalid STK object name %r: use letters, digits, '_' and '-'"
+                         % value)
+    return value
+
+
+def facility_commands(facilities):
+    """
+    Connect commands per facility row.
+
+    ``facilities`` is a DataFrame (or dict of columns) with ``name``, ``lat``,
+    ``lon`` and optionally ``alt`` (deg, deg, km). Returns a list of
+    ``(name, [commands])``.
+    """
+    facilities = pd.DataFrame(facilities)
+    alt = facilities["alt"] if "alt" in facilities else np.zeros(len(facilities))
+    rows = []
+    for name, lat, lon, h in zip(facilities["name"], facilities["lat"], facilities["lon"], alt):
+        name = _name(name)
+        rows.append((name, [
+            "New / */Facility %s" % name,
+            "SetPosition */Facility/%s Geodetic %s %s %s"
+            % (name, _number(lat), _number(lon), _number(h * 1000.0)),
+        ]))
+    return rows
+
+
+def satellite_commands(satellites, start, stop, step=60.0, propagator="J2Perturbation"):
+    """
+    Connect commands per satellite row.
+
+    ``satellites`` has ``name``, ``epoch`` (UTCG), either ``mean_motion``
+    (revs/day) or ``sma`` (km), and ``eccentricity``, ``inclination``,
+    ``arg_of_perigee``, ``raan``, ``mean_anomaly`` (deg); or instead J2000
+    ``x``, ``y``, ``z`` (km) and ``vx``, ``vy``, ``vz`` (km/s).
+    ``start``/``stop`` (UTCG) and ``step`` (s) are the propagation span.
+    Returns a list of ``(name, [commands])``.
+    """
+    satellites = pd.DataFrame(satellites)
+    if "x" in satellites:
+        return _cartesian_commands(satellites, start, stop, step, propagator)
+    if "sma" in satellites:
+        sma = satellites["sma"].to_numpy(dtype=np.float64)
+    else:
+        n = satellites["mean_motion"].to_numpy(dtype=np.float64) * 2 * np.pi / SECONDS_PER_DAY
+        sma = (MU / n ** 2) ** (1.0 / 3)
+    rows = []
+    columns = zip(satellites["name"], satellites["epoch"], sma, satellites["eccentricity"],
+                  satellites["inclination"], satellites["arg_of_perigee"], satellites["raan"],
+                  satellites["mean_anomaly"])
+    for name, epoch, a, e, i, w, raan, M in columns:
+        name = _name(name)
+        rows.append((name, [
+            "New / */Satellite %s" % name,
+            'SetState */Satellite/%s Classical %s "%s" "%s" %s J2000 "%s" %s %s %s %s %s %s'
+            % (name, propagator, start, stop, _number(step), epoch, _number(a * 1000.0),
+               _number(e), _number(i), _number(w), _number(raan), _number(M)),
+        ]))
+    return rows
+
+
+def _cartesian_commands(satellites, start, stop, step, propagator):
+    rows = []
+    columns = zip(satellites["name"], satellites["epoch"],
+                  *(satellites[c] for c in ("x", "y", "z", "vx", "vy", "vz")))
+    for row in columns:
+        name, epoch, state = _name(row[0]), row[1], row[2:]
+        rows.append((name, [
+            "New / */Satellite %s" % name,
+            'SetState */Satellite/%s Cartesian %s "%s" "%s" %s J2000 "%s" %s'
+            % (name, propagator, start, stop, _number(step), epoch,
+               " ".join(_number(value * 1000.0) for value in state)),
+        ]))
+    return rows
+
+
+def _chunks(rows, chunk_size):
+    # Whole rows per chunk so a row's commands are never split across calls
+    chunk, count = [], 0
+    for row in rows:
+        if chunk and count + len(row[1]) > chunk_size:
+            yield chunk
+            chunk, count = [], 0
+        chunk.append(row)
+        count += len(row[1])
+    if chunk:
+        yield chunk
+
+
+def execute_rows(root, rows, chunk_size=500):
+    """
+    Send ``(label, [commands])`` rows to STK in chunks of about ``chunk_size``
+    commands. A row succeeds only if all of its commands do; with
+    ``ExecuteMultipleCommands`` that costs one status read per command on top
+    of the single call per chunk. A chunk with an ``Unload`` command clears
+    the root's :func:`~stk_integration.interfaces.interface_cache`.
+
+    Returns a DataFrame with ``name``, ``ok`` and ``error`` per row; ``error``
+    names the first failing command of the row and STK's message for it.
+    """
+    results = []
+    multiple = hasattr(root, "ExecuteMultipleCommands")
+    for chunk in _chunks(rows, chunk_size):
+        commands = [command for _, rowCommands in chunk for command in rowCommands]
+        if multiple:
+            outcome = root.ExecuteMultipleCommands(commands, CONTINUE_ON_ERROR)
+            succeeded, errors = [], []
+            for i in range(outcome.Count):
+                result = outcome.Item(i)
+                ok = result.IsSucceeded
+                succeeded.append(ok)
+                # Only failures pay for reading back their message lines
+                errors.append(None if ok else
+                              " ".join(result.Item(j) for j in range(result.Count))
+                              or "no message returned")
+        else:
+            succeeded, errors = [], []
+            for command in commands:
+                try:
+                    root.ExecuteCommand(command)
+                    succeeded.append(True)
+                    errors.append(None)
+                except Exception as exc:
+                    succeeded.append(False)
+                    errors.append(str(exc))
+        position = 0
+        for name, rowCommands in chunk:
+            error = None
+            for offset in range(len(rowCommands)):
+                if not succeeded[position + offset]:
+                    error = "Failed: %s" % rowCommands[offset]
+                    if errors[position + offset]:
+                        error += " (%s)" % errors[position + offset]
+                    break
+            position += len(rowCommands)
+            results.append((name, error is None, error))
+        if any(command.lstrip().lower().startswith("unload ") for command in commands):
+            # Interfaces cached for the unloaded objects must not outlive them
+            interface_cache(root).clear()
+    return pd.DataFrame(results, columns=["name", "ok", "error"])
+
+
+def build_objects(root, facilities=None, satellites=None, step=60.0,
+                  propagator="J2Perturbation", chunk_size=500):
+    """
+    Create facilities and satellites in the current scenario from tables, see
+    :func:`facility_commands` and :func:`satellite_commands` for the columns.
+    Satellites are propagated over the scenario interval.
+
+    Returns a DataFrame with ``kind``, ``name``, ``ok`` and ``error`` per row;
+    failures do not stop the remaining rows.
+    """
+    rows = []
+    kinds = []
+    if facilities is not None:
+        facilityRows = facility_commands(facilities)
+        rows += facilityRows
+        kinds += ["Facility"] * len(facilityRows)
+    if satellites is not None:
+        STKObjects, _ = get_type_libraries(root)
+        sc2 = query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+        satelliteRows = satellite_commands(satellites, sc2.StartTime, sc2.StopTime, step,
+                                           propagator)
+        rows += satelliteRows
+        kinds += ["Satellite"] * len(satelliteRows)
+    report = execute_rows(root, rows, chunk_size)
+    report.insert(0, "kind", kinds)
+    return report
@@ -0,0 +1,376 @@
+# coding: utf-8
+"""
+Columnar access to STK data provider results.
+
+The notebooks pull every element of an ``ExecElements`` result with its own
+``DataSets.Item(i).GetValues()`` call and hand the resulting tuples to pandas.
+The helpers here fetch the whole result in one pass and land each element in a
+preallocated NumPy column, so a DataFrame can be built over them without
+another copy.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .interfaces import query_interface
+from .scenario import get_type_libraries
+from .times import (datetime64_to_epsec, epsec_to_datetime64, format_utcg, format_utcg_array,
+                    parse_utcg, parse_utcg_array)
+from .units import unit_tracker
+
+# Elements that STK reports as dates (UTCG strings unless the DateFormat unit
+# has been switched to EpSec, in which case they come back as floats)
+TIME_ELEMENTS = ("Time",)
+
+
+def _time_windows(start, stop, window):
+    """
+    Split ``start``..``stop`` into consecutive ``window`` second spans.
+
+    Accepts either UTCG strings or EpSec numbers and returns pairs of the same
+    kind, so they can be passed straight back to ``ExecElements``.
+    """
+    if isinstance(start, str):
+        t0, t1 = parse_utcg(start), parse_utcg(stop)
+        step = timedelta(seconds=window)
+        fmt = format_utcg
+    else:
+        t0, t1, step = float(start), float(stop), float(window)
+        fmt = float
+    windows = []
+    while t0 < t1:
+        windowStop = min(t0 + step, t1)
+        windows.append((fmt(t0), fmt(windowStop)))
+        t0 = windowStop
+    return windows
+
+
+def _fetch_columns(dataSets, nElements):
+    # One round trip for the whole result when the collection supports it,
+    # otherwise fall back to one GetValues() per element
+    toArray = getattr(dataSets, "ToArray", None)
+    if toArray is not None:
+        rows = toArray()
+        if len(rows) == 0:
+            return [()] * nElements
+        # Columns as views of one object array, not a transposed copy of tuples
+        return list(np.asarray(rows, dtype=object).T)
+    return [dataSets.Item(i).GetValues() for i in range(dataSets.Count)]
+
+
+def _to_column(values, isTime, epoch=None):
+    if isTime and len(values) and isinstance(values[0], str):
+        return parse_utcg_array(values)
+    column = np.empty(len(values), dtype=np.float64)
+    column[:] = values
+    if isTime and epoch is not None:
+        # EpSec: convert numerically, no strings involved
+        return epsec_to_datetime64(column, epoch)
+    return column
+
+
+class ElementResult(object):
+    """
+    Data provider result held as one contiguous NumPy array per element.
+
+    Columns are keyed by element name in the order they were requested.
+    Time elements become ``datetime64[ns]`` when STK returns UTCG strings. EpSec
+    times stay ``float64`` unless the scenario ``epoch`` is given, in which case
+    they are converted to ``datetime64[ns]`` numerically.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+
+    @classmethod
+    def from_result(cls, result, elements, time_elements=TIME_ELEMENTS, epoch=None):
+        """Build from an ``IAgDrResult`` returned by ``ExecElements``."""
+        values = _fetch_columns(result.DataSets, len(elements))
+        return cls.from_values(values, elements, time_elements, epoch)
+
+    @classmethod
+    def from_values(cls, values, elements, time_elements=TIME_ELEMENTS, epoch=None):
+        """Build from raw per-element value sequences already fetched from STK."""
+        if len(values) != len(elements):
+            raise ValueError("Result has %d data sets but %d elements were requested"
+                             % (len(values), len(elements)))
+        columns = {}
+        for name, column in zip(elements, values):
+            columns[name] = _to_column(column, name in time_elements, epoch)
+        return cls(columns)
+
+    @property
+    def names(self):
+        return list(self.columns)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def to_dataframe(self, copy=False):
+        """DataFrame over the columns; shares their memory unless ``copy``."""
+        return pd.DataFrame(self.columns, copy=copy)
+
+
+def exec_elements(provider, start, stop, step, elements, time_elements=TIME_ELEMENTS,
+                  epoch=None):
+    """
+    Run ``ExecElements`` on an ``IAgDataPrvTimeVar`` and return an
+    :class:`ElementResult`.
+
+    ``provider`` is the time-varying provider itself, e.g. what
+    ``sat.DataProviders.GetDataPrvTimeVarFromPath("Cartesian Velocity//J2000")``
+    returns. Pass the scenario ``epoch`` when the DateFormat unit is EpSec to
+    get ``datetime64`` times.
+    """
+    elements = list(elements)
+    result = provider.ExecElements(start, stop, step, elements)
+    return ElementResult.from_result(result, elements, time_elements, epoch)
+
+
+def exec_elements_epsec(root, provider, start, stop, step, elements,
+                        time_elements=TIME_ELEMENTS):
+    """
+    Like :func:`exec_elements` with UTCG ``start``/``stop``, but has STK report
+    times as EpSec and converts them numerically, avoiding date strings in both
+    directions. The DateFormat unit is restored afterwards.
+    """
+    STKObjects, _ = get_type_libraries(root)
+    units = unit_tracker(root)
+    sc2 = query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+    with units.scope(DateFormat="UTCG"):
+        epoch = sc2.Epoch
+    start, stop = datetime64_to_epsec(parse_utcg_array([start, stop]), epoch)
+    with units.scope(DateFormat="EpSec"):
+        return exec_elements(provider, float(start), float(stop), step, elements,
+                             time_elements, epoch)
+
+
+def resolve_providers(root, paths, provider_path):
+    """
+    Look up the ``IAgDataPrvTimeVar`` at ``provider_path`` (e.g.
+    ``"Cartesian Velocity//J2000"``) for every object path in ``paths``.
+    """
+    providers = []
+    for path in paths:
+        obj = root.GetObjectFromPath(path)
+        providers.append(obj.DataProviders.GetDataPrvTimeVarFromPath(provider_path))
+    return providers
+
+
+def stack_results(paths, results):
+    """
+    Stack per-object :class:`ElementResult` objects into one DataFrame indexed
+    by ``(object, sample)``.
+    """
+    paths = list(paths)
+    counts = np.array([len(r) for r in results], dtype=np.intp)
+    names = results[0].names if results else []
+    columns = {}
+    for name in names:
+        columns[name] = np.concatenate([r[name] for r in results])
+    # Unique levels, so the same object requested twice is still accepted
+    pathCodes, levels = pd.factorize(pd.Index(paths, dtype=object))
+    objectCodes = np.repeat(pathCodes, counts)
+    # Sample number within each object's block
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    sampleCodes = np.arange(counts.sum()) - starts
+    index = pd.MultiIndex(levels=[levels, np.arange(counts.max() if len(counts) else 0)],
+                          codes=[objectCodes, sampleCodes],
+                          names=["object", "sample"])
+    return pd.DataFrame(columns, index=index, copy=False)
+
+
+def exec_elements_batch(root, paths, provider_path, start, stop, step, elements,
+                        time_elements=TIME_ELEMENTS):
+    """
+    Run the same data provider over many objects and return one stacked
+    DataFrame indexed by ``(object, sample)``.
+
+    All providers are resolved up front, then each ``ExecElements`` is issued
+    from the calling (COM) thread while the previous result is converted to
+    NumPy columns on a helper thread, so STK and Python work overlap instead of
+    running one resolve-exec-convert cycle after another.
+    """
+    paths = list(paths)
+    elements = list(elements)
+    providers = resolve_providers(root, paths, provider_path)
+
+    futures = []
+    with ThreadPoolExecutor(max_workers=1) as converter:
+        for provider in providers:
+            result = provider.ExecElements(start, stop, step, elements)
+            # Fetching has to stay on the COM thread; conversion does not
+            values = _fetch_columns(result.DataSets, len(elements))
+            futures.append(converter.submit(ElementResult.from_values, values,
+                                            elements, time_elements))
+        results = [f.result() for f in futures]
+    return stack_results(paths, results)
+
+
+def iter_exec_elements(provider, start, stop, step, elements, window,
+                       time_elements=TIME_ELEMENTS):
+    """
+    Run ``ExecElements`` one time window at a time and yield a DataFrame per
+    window, so memory stays bounded however long the interval is.
+
+    ``window`` is in seconds and is rounded to a whole number of ``step``s so
+    samples line up across windows. Samples repeated at a window boundary are
+    only yielded once.
+    """
+    elements = list(elements)
+    window = max(1, int(round(float(window) / step))) * step
+    timeName = next((name for name in elements if name in time_elements), None)
+    last = None
+    for windowStart, windowStop in _time_windows(start, stop, window):
+        result = exec_elements(provider, windowStart, windowStop, step, elements,
+                               time_elements)
+        df = result.to_dataframe()
+        if last is not None and len(df):
+            if timeName is not None:
+                df = df[df[timeName].values > last]
+            else:
+                df = df.iloc[1:]
+        if len(df) == 0:
+            continue
+        if timeName is not None:
+            last = df[timeName].values[-1]
+        yield df
+
+
+def _interpolation_error(seconds, values):
+    # Leave-one-out check: predict each sample but the end ones from the four
+    # nearest other samples with a cubic and compare
+    t = seconds
+    n = len(t)
+    error = np.zeros(n)
+    if n < 5:
+        return error
+    i = np.arange(1, n - 1)
+    lo = np.clip(i - 2, 0, n - 5)
+    window = lo[:, None] + np.arange(5)
+    # Drop the sample itself from its five-sample window
+    nodes = window[window != i[:, None]].reshape(len(i), 4)
+    tn = t[nodes]
+    weights = np.ones(tn.shape)
+    for j in range(4):
+        for k in range(4):
+            if k != j:
+                weights[:, j] *= (t[i] - tn[:, k]) / (tn[:, j] - tn[:, k])
+    for column in values:
+        error[i] = np.maximum(error[i], np.abs((weights * column[nodes]).sum(axis=1) - column[i]))
+    return error
+
+
+def _bad_spans(seconds, error, tolerance, min_step):
+    # Merged (first, last) sample indices around samples exceeding the
+    # tolerance, skipping spans already sampled at ``min_step``
+    spans = []
+    for i in np.flatnonzero(error > tolerance):
+        lo, hi = max(i - 1, 0), min(i + 1, len(seconds) - 1)
+        if seconds[hi] - seconds[lo] <= 2 * min_step * (1 + 1e-9):
+            continue
+        if spans and lo <= spans[-1][1]:
+            spans[-1][1] = hi
+        else:
+            spans.append([lo, hi])
+    return spans
+
+
+def _merge_results(results, timeName, elements):
+    times = np.concatenate([result[timeName] for result in results])
+    order = np.argsort(times, kind="stable")
+    gaps = np.diff(times[order])
+    if np.issubdtype(gaps.dtype, np.timedelta64):
+        gaps = gaps / np.timedelta64(1, "s")
+    # Refined spans share their end samples with what was already there
+    keep = order[np.concatenate([[True], gaps > 1e-6])]
+    return ElementResult(dict((name, np.concatenate([result[name] for result in results])[keep])
+                              for name in elements))
+
+
+def exec_elements_adaptive(provider, start, stop, step, elements, tolerance,
+                           min_step=1.0, refine=4, check=None, time_elements=TIME_ELEMENTS,
+                           max_passes=10):
+    """
+    :func:`exec_elements` with the sampling refined only where it is needed.
+
+    The interval is first sampled every ``step`` seconds. Each sample is then
+    predicted by cubic interpolation from the four nearest other samples.
+    Where the miss exceeds ``tolerance``, in the units of the ``check``
+    elements (all non-time elements by default), the surrounding span is
+    fetched again with ``refine`` times finer spacing, but not below
+    ``min_step``. This repeats on the merged series until every sample passes,
+    returning one time-sorted :class:`ElementResult` without duplicates.
+
+    ``elements`` must include a time element. Each refined span costs one
+    ``ExecElements`` call, so quiet stretches stay at the coarse step.
+    """
+    elements = list(elements)
+    timeName = next((name for name in elements if name in time_elements), None)
+    if timeName is None:
+        raise ValueError("Adaptive sampling needs a time element such as 'Time'")
+    check = [name for name in (check or elements) if name not in time_elements]
+
+    result = exec_elements(provider, start, stop, step, elements, time_elements)
+    for _ in range(max_passes):
+        times = result[timeName]
+        isDate = np.issubdtype(times.dtype, np.datetime64)
+        seconds = ((times - times[0]) / np.timedelta64(1, "s") if isDate
+                   else np.asarray(times, dtype=np.float64))
+        error = _interpolation_error(seconds, [result[name] for name in check])
+        spans = _bad_spans(seconds, error, tolerance, min_step)
+        if not spans:
+            break
+        refined = [result]
+        for lo, hi in spans:
+            spacing = (seconds[hi] - seconds[lo]) / (hi - lo)
+            if isDate:
+                spanStart, spanStop = format_utcg_array(times[[lo, hi]], decimals=6)
+            else:
+                spanStart, spanStop = float(times[lo]), float(times[hi])
+            refined.append(exec_elements(provider, spanStart, spanStop,
+                                         max(spacing / refine, min_step), elements,
+                                         time_elements))
+        result = _merge_results(refined, timeName, elements)
+    return result
+
+
+def write_exec_elements(provider, start, stop, step, elements, window, path,
+                        time_elements=TIME_ELEMENTS):
+    """
+    Stream :func:`iter_exec_elements` windows into a Parquet file at ``path``,
+    appending one row group per window. Needs ``pyarrow``.
+
+    Returns the number of rows written.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("write_exec_elements needs pyarrow: pip install pyarrow")
+
+    writer = None
+    rows = 0
+    try:
+        for df in iter_exec_elements(provider, start, stop, step, elements, window,
+                                     time_elements):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
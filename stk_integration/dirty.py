@@ -0,0 +1,214 @@
+# coding: utf-8
+"""
+Re-propagate only the satellites whose initial state changed.
+
+In a sweep, a few satellites get new elements and then every satellite is
+propagated again. A :class:`ChangeTracker` watches the assignment path instead
+and marks a satellite dirty when its ``InitialState.Representation.Assign`` or
+``InitialState.Epoch`` is set through a tracked propagator:
+
+    tracker = change_tracker(root, cache=resultCache)
+    satProp = tracker.track("*/Satellite/codeSat")
+    keplerian = satProp.InitialState.Representation.ConvertTo(STKUtil.eOrbitStateClassical)
+    ...
+    satProp.InitialState.Representation.Assign(keplerian)     # marks codeSat dirty
+    tracker.propagate_dirty()       # one Propagate(), codeSat's cache entries dropped
+
+``add_satellite(..., propagate=False)`` marks the new satellite dirty as well
+and returns its propagator tracked, so a batch of satellites can be built and
+then propagated in one pass. Whichever way a satellite is propagated through
+this package, its entry is cleared. The dirty set belongs to the loaded
+scenario: :func:`~stk_integration.scenario.new_scenario` drops it with
+:func:`reset_tracker`.
+"""
+
+import weakref
+from collections import OrderedDict
+
+from .scenario import satellite_propagator
+
+
+def _path(obj):
+    return "*/%s/%s" % (obj.ClassName, obj.InstanceName)
+
+
+class ChangeTracker(object):
+    """
+    Dirty set of satellite paths for one root.
+
+    ``cache`` is an optional :class:`~stk_integration.cache.ResultCache`
+    whose entries for re-propagated satellites are invalidated.
+    """
+
+    def __init__(self, root, cache=None):
+        # Weak, so the per-root registry below does not keep the root alive
+        try:
+            self._root = weakref.ref(root)
+        except TypeError:
+            self._root = lambda: root
+        self.cache = cache
+        self._dirty = OrderedDict()
+        self.propagations = 0
+
+    @property
+    def root(self):
+        return self._root()
+
+    def track(self, sat, propagator=None):
+        """
+        A :class:`TrackedPropagator` for ``sat`` (an object or path such as
+        ``"*/Satellite/codeSat"``) that reports state changes to this tracker.
+        """
+        if isinstance(sat, str):
+            path, sat = sat, self.root.GetObjectFromPath(sat)
+        else:
+            path = _path(sat)
+        if propagator is None:
+            propagator = satellite_propagator(self.root, sat)
+            if propagator is None:
+                raise ValueError("%s does not use a J2 or two-body propagator" % path)
+        return TrackedPropagator(propagator, self, path)
+
+    def mark_dirty(self, path, propagator=None):
+        """Mark ``path`` as needing propagation; ``propagator`` saves looking it up later."""
+        if propagator is None:
+            propagator = self._dirty.get(path)
+        self._dirty[path] = propagator
+
+    def mark_clean(self, path):
+        self._dirty.pop(path, None)
+
+    def propagated(self, path):
+        """Record that ``path`` was propagated: it is clean and its cached results are stale."""
+        self.mark_clean(path)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+
+    def reset(self):
+        """Forget every dirty satellite."""
+        self._dirty.clear()
+
+    def is_dirty(self, path):
+        return path in self._dirty
+
+    @property
+    def dirty(self):
+        return list(self._dirty)
+
+    def propagate_dirty(self):
+        """
+        Propagate every dirty satellite, drop their cached results and return
+        their paths.
+        """
+        propagated = []
+        for path, propagator in list(self._dirty.items()):
+            if propagator is None:
+                propagator = satellite_propagator(self.root, self.root.GetObjectFromPath(path))
+            propagator.Propagate()
+            self.propagations += 1
+            del self._dirty[path]
+            propagated.append(path)
+        if self.cache is not None and propagated:
+            self.cache.invalidate(propagated)
+        return propagated
+
+
+class TrackedPropagator(object):
+    """Propagator whose initial-state assignments mark its satellite dirty."""
+
+    def __init__(self, propagator, tracker, path):
+        self._propagator = propagator
+        self._tracker = tracker
+        self.path = path
+
+    def __getattr__(self, name):
+        return getattr(self._propagator, name)
+
+    @property
+    def InitialState(self):
+        return _TrackedInitialState(self._propagator.InitialState, self)
+
+    def Propagate(self):
+        self._propagator.Propagate()
+        self._tracker.propagated(self.path)
+
+    def _changed(self):
+        self._tracker.mark_dirty(self.path, self._propagator)
+
+
+class _TrackedInitialState(object):
+
+    def __init__(self, initialState, owner):
+        object.__setattr__(self, "_initialState", initialState)
+        object.__setattr__(self, "_owner", owner)
+
+    def __getattr__(self, name):
+        return getattr(self._initialState, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._initialState, name, value)
+        if name == "Epoch":
+            self._owner._changed()
+
+    @property
+    def Representation(self):
+        return _TrackedRepresentation(self._initialState.Representation, self._owner)
+
+
+class _TrackedRepresentation(object):
+
+    def __init__(self, representation, owner):
+        self._representation = representation
+        self._owner = owner
+
+    def __getattr__(self, name):
+        return getattr(self._representation, name)
+
+    def Assign(self, state):
+        self._representation.Assign(state)
+        self._owner._changed()
+
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+def change_tracker(root, cache=None):
+    """The shared :class:`ChangeTracker` for ``root``; ``cache`` replaces its result cache."""
+    tracker = _trackers.get(root)
+    if tracker is None:
+        tracker = _trackers[root] = ChangeTracker(root, cache)
+    elif cache is not None:
+        tracker.cache = cache
+    return tracker
+
+
+def reset_tracker(root):
+    """
+    Empty the dirty set of ``root``'s tracker, e.g. when its scenario is closed
+    or replaced. The tracker keeps its result cache.
+    """
+    tracker = _trackers.get(root)
+    if tracker is not None:
+        tracker.reset()
+
+
+def export_record(root):
+    """The dirty satellite paths of ``root``'s tracker, as a JSON-ready list."""
+    tracker = _trackers.get(root)
+    return [] if tracker is None else tracker.dirty
+
+
+def import_record(root, record):
+    """Replace the dirty set of ``root``'s tracker with an :func:`export_record` result."""
+    tracker = change_tracker(root)
+    tracker.reset()
+    for path in record:
+        tracker.mark_dirty(path)
+
+
+def propagate_dirty(root):
+    """
+    Propagate the dirty satellites of ``root``'s tracker; see
+    :meth:`ChangeTracker.propagate_dirty`.
+    """
+    return change_tracker(root).propagate_dirty()
@@ -0,0 +1,257 @@
+# coding: utf-8
+"""
+Array-backed ephemerides with interpolation at arbitrary times.
+
+:class:`Ephemeris` holds the positions (and optionally velocities) of many
+objects sampled at shared times, stored as contiguous ``(n, m, 3)`` float64
+arrays rather than per-sample Python objects. Queries between the samples
+are answered locally instead of by another ``ExecElements``:
+
+    eph = Ephemeris.extract(root, ["*/Satellite/codeSat"], sc2.StartTime,
+                            sc2.StopTime, 60)
+    r, v = eph.interpolate(queryTimes)                  # (n, q, 3) each
+    r, v = eph.interpolate(queryTimes, method="hermite")
+
+Lagrange interpolation uses ``order`` samples around each query time, 8 by
+default like STK's own ephemeris interpolation. Hermite interpolation is cubic
+and uses the positions and velocities at the two bracketing samples. The
+interpolation weights depend only on the times, so they are computed once per
+query and shared by every object.
+"""
+
+import numpy as np
+
+from . import frames
+from .dataproviders import exec_elements, resolve_providers
+from .times import parse_utcg_array
+
+_XYZ = ["x", "y", "z"]
+
+
+def lagrange_weights(seconds, t, order=8, derivative=False):
+    """
+    Lagrange interpolation over the ``order`` samples of ``seconds`` nearest
+    each query time ``t``.
+
+    Returns ``(nodes, weights)``, each shaped ``(len(t), order)``, so that a
+    column ``y`` interpolates as ``(weights * y[nodes]).sum(-1)``. With
+    ``derivative`` the weights of the time derivative are returned as well.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    t = np.atleast_1d(np.asarray(t, dtype=np.float64))
+    m = len(seconds)
+    order = min(order, m)
+    # Centre the window on the interval holding each query
+    k = np.clip(np.searchsorted(seconds, t, side="right") - order // 2, 0, m - order)
+    nodes = k[:, None] + np.arange(order)
+    tn = seconds[nodes]
+    dt = t[:, None] - tn
+    weights = np.ones((len(t), order))
+    dWeights = np.zeros((len(t), order)) if derivative else None
+    for j in range(order):
+        for i in range(order):
+            if i == j:
+                continue
+            denominator = tn[:, j] - tn[:, i]
+            if derivative:
+                # Product rule: d/dt prod (t - t_i) / (t_j - t_i)
+                dWeights[:, j] = (dWeights[:, j] * dt[:, i] + weights[:, j]) / denominator
+            weights[:, j] *= dt[:, i] / denominator
+    if derivative:
+        return nodes, weights, dWeights
+    return nodes, weights
+
+
+def _hermite(seconds, positions, velocities, t):
+    # Cubic Hermite between the two samples bracketing each query
+    m = len(seconds)
+    k = np.clip(np.searchsorted(seconds, t, side="right") - 1, 0, m - 2)
+    h = (seconds[k + 1] - seconds[k])[:, None]
+    s = (t - seconds[k])[:, None] / h
+    s2, s3 = s * s, s * s * s
+    h00, h10, h01, h11 = 2 * s3 - 3 * s2 + 1, s3 - 2 * s2 + s, -2 * s3 + 3 * s2, s3 - s2
+    d00, d10 = (6 * s2 - 6 * s) / h, 3 * s2 - 4 * s + 1
+    d01, d11 = (-6 * s2 + 6 * s) / h, 3 * s2 - 2 * s
+    r0, r1 = positions[:, k], positions[:, k + 1]
+    v0, v1 = velocities[:, k], velocities[:, k + 1]
+    r = h00 * r0 + h10 * h * v0 + h01 * r1 + h11 * h * v1
+    v = d00 * r0 + d10 * v0 + d01 * r1 + d11 * v1
+    return r, v
+
+
+class Ephemeris(object):
+    """
+    Positions ``(n, m, 3)`` km and optional velocities km/s of ``n`` named
+    objects at ``m`` shared ``datetime64[ns]`` times, in one ``frame``.
+    """
+
+    def __init__(self, times, positions, velocities=None, names=None, frame="J2000"):
+        times = np.asarray(times)
+        if not np.issubdtype(times.dtype, np.datetime64):
+            times = parse_utcg_array(times)
+        self.times = times.astype("datetime64[ns]", copy=False)
+        self.positions = np.ascontiguousarray(positions, dtype=np.float64)
+        if self.positions.ndim == 2:
+            self.positions = self.positions[None]
+        self.velocities = None
+        if velocities is not None:
+            self.velocities = np.ascontiguousarray(velocities, dtype=np.float64)
+            self.velocities = self.velocities.reshape(self.positions.shape)
+        if self.positions.shape[1:] != (len(self.times), 3):
+            raise ValueError("positions must be (n, %d, 3), got %s"
+                             % (len(self.times), self.positions.shape))
+        if names is None:
+            names = [str(i) for i in range(len(self.positions))]
+        self.names = list(names)
+        self._index = dict((name, i) for i, name in enumerate(self.names))
+        self.frame = frame
+        self.seconds = (self.times - self.times[0]) / np.timedelta64(1, "s")
+
+    @classmethod
+    def from_results(cls, positions, velocities=None, frame="J2000"):
+        """
+        Build from ``{name: ElementResult}`` with ``Time``, ``x``, ``y``, ``z``
+        (and optionally the matching velocity results), all sampled at the same
+        times.
+        """
+        names = list(positions)
+        times = positions[names[0]]["Time"]
+        r = np.empty((len(names), len(times), 3))
+        v = None if velocities is None else np.empty_like(r)
+        for i, name in enumerate(names):
+            for target, results in ((r, positions), (v, velocities)):
+                if target is None:
+                    continue
+                result = results[name]
+                if len(result) != len(times) or not np.array_equal(result["Time"], times):
+                    raise ValueError("%s is not sampled at the shared times" % name)
+                for axis, element in enumerate(_XYZ):
+                    target[i, :, axis] = result[element]
+        return cls(times, r, v, names, frame)
+
+    @classmethod
+    def extract(cls, root, paths, start, stop, step, group="J2000", velocities=True):
+        """
+        Extract ``Cartesian Position`` (and ``Cartesian Velocity``) in
+        ``group`` for every object path, with UTCG ``start``/``stop``.
+        """
+        paths = list(paths)
+        elements = ["Time"] + _XYZ
+        positions = dict(zip(paths, [
+            exec_elements(provider, start, stop, step, elements)
+            for provider in resolve_providers(root, paths, "Cartesian Position//" + group)]))
+        rates = None
+        if velocities:
+            rates = dict(zip(paths, [
+                exec_elements(provider, start, stop, step, elements)
+                for provider in resolve_providers(root, paths, "Cartesian Velocity//" + group)]))
+        return cls.from_results(positions, rates, group)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def index(self, names):
+        """Row numbers of ``names``."""
+        return np.array([self._index[name] for name in names], dtype=np.intp)
+
+    def select(self, names):
+        """A new :class:`Ephemeris` holding only ``names`` (copies their rows)."""
+        rows = self.index(names)
+        return Ephemeris(self.times, self.positions[rows],
+                         None if self.velocities is None else self.velocities[rows],
+                         names, self.frame)
+
+    def _query_seconds(self, times):
+        times = np.asarray(times)
+        if np.issubdtype(times.dtype, np.datetime64):
+            return (times.astype("datetime64[ns]") - self.times[0]) / np.timedelta64(1, "s")
+        if times.dtype.kind in "USO":
+            return (parse_utcg_array(times) - self.times[0]) / np.timedelta64(1, "s")
+        return times.astype(np.float64)
+
+    def interpolate(self, times, names=None, method="lagrange", order=8, chunk_size=2 ** 20):
+        """
+        Positions and velocities at ``times`` (``datetime64``, UTCG strings or
+        seconds from the first sample), each ``(n, q, 3)``.
+
+        ``method`` is ``"lagrange"`` (velocities from the stored ones when
+        available, otherwise from the derivative of the position polynomial)
+        or ``"hermite"`` (needs velocities). ``names`` restricts the objects.
+        Queries are processed about ``chunk_size`` object-time points at a
+        time, so temporaries stay near ``chunk_size`` positions whatever the
+        object count and ``order``.
+        """
+        t = np.atleast_1d(self._query_seconds(times))
+        if np.any(t < self.seconds[0] - 1e-9) or np.any(t > self.seconds[-1] + 1e-9):
+            raise ValueError("Query times fall outside the ephemeris span")
+        rows = slice(None) if names is None else self.index(names)
+        positions = self.positions[rows]
+        velocities = None if self.velocities is None else self.velocities[rows]
+        if method == "hermite" and velocities is None:
+            raise ValueError("Hermite interpolation needs velocities")
+        if method not in ("lagrange", "hermite"):
+            raise ValueError("method must be 'lagrange' or 'hermite'")
+
+        r = np.zeros((len(positions), len(t), 3))
+        v = np.zeros_like(r)
+        step = max(1, chunk_size // max(1, len(positions)))
+        for lo in range(0, len(t), step):
+            chunk = t[lo:lo + step]
+            part = slice(lo, lo + len(chunk))
+            if method == "hermite":
+                r[:, part], v[:, part] = _hermite(self.seconds, positions, velocities, chunk)
+                continue
+            nodes, weights, dWeights = lagrange_weights(self.seconds, chunk, order, True)
+            source, w = (positions, dWeights) if velocities is None else (velocities, weights)
+            # One stencil point at a time: gathering all of them at once would
+            # take order times the memory of the result
+            rPart, vPart = r[:, part], v[:, part]
+            for p in range(nodes.shape[1]):
+                term = np.take(positions, nodes[:, p], axis=1)
+                term *= weights[:, p, None]
+                rPart += term
+                term = np.take(source, nodes[:, p], axis=1)
+                term *= w[:, p, None]
+                vPart += term
+        return r, v
+
+    def to_frame(self, frame):
+        """
+        The same ephemeris in ``"J2000"`` or ``"Fixed"``, converted locally
+        with :mod:`~stk_integration.frames` rather than re-extracted.
+        """
+        if frame == self.frame:
+            return self
+        if (self.frame, frame) == ("J2000", "Fixed"):
+            convert, rotate = frames.j2000_to_ecef_state, frames.j2000_to_ecef
+        elif (self.frame, frame) == ("Fixed", "J2000"):
+            convert, rotate = frames.ecef_to_j2000_state, frames.ecef_to_j2000
+        else:
+            raise ValueError("Cannot convert %s to %s" % (self.frame, frame))
+        if self.velocities is None:
+            r, v = rotate(self.positions, self.times), None
+        else:
+            r, v = convert(self.positions, self.velocities, self.times)
+        return Ephemeris(self.times, r, v, self.names, frame)
+
+    def geodetic(self):
+        """WGS84 ``(lat, lon, alt)`` in deg, deg, km, each ``(n, m)``."""
+        return frames.ecef_to_geodetic(self.to_frame("Fixed").positions)
+
+    def classical(self):
+        """
+        Osculating classical elements ``(n, m)`` per ``IAgOrbitStateClassical``
+        field; see :func:`~stk_integration.frames.cartesian_to_classical`.
+        """
+        if self.velocities is None:
+            raise ValueError("Classical elements need velocities")
+        inertial = self.to_frame("J2000")
+        return frames.cartesian_to_classical(inertial.positions, inertial.velocities, self.times)
+
+    @property
+    def nbytes(self):
+        return (self.times.nbytes + self.positions.nbytes
+                + (0 if self.velocities is None else self.velocities.nbytes))
@@ -0,0 +1,1352 @@
+# coding: utf-8
+"""
+In-process stand-in for the slice of the STK Object Model the notebooks use.
+
+It lets the rest of this package be run, timed and regression-tested without a
+Windows STK install:
+
+    root = create_fake_engine(latency=50e-6)
+    root.NewScenario("IPython_DIY")
+    sc2 = root.CurrentScenario.QueryInterface(STKObjects.IAgScenario)
+    ...
+
+Every PascalCase property get or set and every method call on a fake object
+counts as one COM round trip, and objects are handed out through fresh pointers
+as comtypes does. Round trips are tallied in ``root.engine.calls`` and can be
+slowed down with a fixed ``latency`` (seconds) and per-member overrides, so the
+cost of chatty access patterns can be simulated realistically.
+
+Orbits are propagated with two-body motion plus J2 secular drift, which is
+enough to produce plausible ephemerides for benchmarking.
+"""
+
+import inspect
+import json
+import math
+import shlex
+import time
+import types
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .frames import EARTH_RATE, geodetic_to_ecef, j2000_to_ecef, local_up
+from .j2 import MU, cartesian_to_classical
+from .j2 import propagate as j2_propagate
+from .times import datetime64_to_epsec, format_utcg, format_utcg_array, parse_utcg
+
+
+class FakeComError(RuntimeError):
+    """Raised where real STK would return a failing HRESULT."""
+
+
+class _TypeLibrary(object):
+    """Namespace of enums and interface markers, like ``comtypes.gen.STKObjects``."""
+
+    def __init__(self, name, enums, interfaces):
+        self.__name__ = name
+        for key, value in enums.items():
+            setattr(self, key, value)
+        for key in interfaces:
+            setattr(self, key, type(key, (object,), {}))
+
+
+STKObjects = _TypeLibrary("STKObjects", {
+    "eFacility": 8,
+    "eSatellite": 18,
+    "eScenario": 19,
+    "ePropagatorJ2Perturbation": 1,
+    "ePropagatorTwoBody": 7,
+    "eSizeShapeMeanMotion": 1,
+    "eSizeShapeSemimajorAxis": 4,
+    "eLocationMeanAnomaly": 2,
+    "eLocationTrueAnomaly": 5,
+    "eAscNodeLAN": 0,
+    "eAscNodeRAAN": 1,
+    "eCstrElevationAngle": 34,
+}, [
+    "IAgStkObject", "IAgScenario", "IAgFacility", "IAgSatellite",
+    "IAgVePropagatorJ2Perturbation", "IAgVePropagatorTwoBody",
+    "IAgOrbitStateClassical", "IAgClassicalSizeShapeMeanMotion",
+    "IAgClassicalSizeShapeSemimajorAxis", "IAgOrientationAscNodeRAAN",
+    "IAgOrientationAscNodeLAN", "IAgClassicalLocationMeanAnomaly",
+    "IAgClassicalLocationTrueAnomaly", "IAgDataProviderGroup",
+    "IAgDataPrvTimeVar", "IAgDataPrvInterval", "IAgAccessCnstrMinMax",
+])
+
+STKUtil = _TypeLibrary("STKUtil", {
+    "eOrbitStateCartesian": 0,
+    "eOrbitStateClassical": 1,
+}, [])
+
+_CLASS_NAMES = {
+    STKObjects.eFacility: "Facility",
+    STKObjects.eSatellite: "Satellite",
+}
+
+# Conversion factors from STK unit abbreviations to the internal units
+# (radians, seconds, km)
+_UNITS = {
+    "AngleUnit": {"deg": math.pi / 180, "rad": 1.0, "revs": 2 * math.pi},
+    "TimeUnit": {"sec": 1.0, "min": 60.0, "hr": 3600.0, "day": 86400.0},
+    "DistanceUnit": {"km": 1.0, "m": 1e-3},
+    "DateFormat": {"UTCG": None, "EpSec": None},
+}
+_DEFAULT_UNITS = {"AngleUnit": "deg", "TimeUnit": "sec",
+                  "DistanceUnit": "km", "DateFormat": "UTCG"}
+
+
+class FakeEngine(object):
+    """Round-trip accounting and latency injection shared by one fake object tree."""
+
+    def __init__(self, latency=0.0, member_latency=None):
+        self.latency = latency
+        self.member_latency = dict(member_latency or {})
+        self.calls = Counter()
+
+    def round_trip(self, interface, member):
+        self.calls[(interface, member)] += 1
+        delay = self.member_latency.get(member, self.latency)
+        if delay > 0:
+            _wait(delay)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def reset_counters(self):
+        self.calls.clear()
+
+
+def _wait(delay):
+    # time.sleep() is far too coarse for tens of microseconds; spin instead
+    if delay >= 1e-3:
+        time.sleep(delay)
+        return
+    end = time.perf_counter() + delay
+    while time.perf_counter() < end:
+        pass
+
+
+def _charged(engine, interface, member, method):
+    def call(self, *args, **kwargs):
+        engine.round_trip(interface, member)
+        return method(*args, **kwargs)
+    return call
+
+
+class _ComObject(object):
+    """Base for fake COM objects; PascalCase members are charged as round trips."""
+
+    _interfaces = ()
+
+    def __init__(self, engine):
+        object.__setattr__(self, "_engine", engine)
+
+    def __getattribute__(self, name):
+        value = object.__getattribute__(self, name)
+        if not name[:1].isupper():
+            return value
+        engine = object.__getattribute__(self, "_engine")
+        if inspect.ismethod(value):
+            # Method round trips happen when the method is called, not looked up
+            return types.MethodType(_charged(engine, type(self).__name__, name, value), self)
+        engine.round_trip(type(self).__name__, name)
+        return value
+
+    def __setattr__(self, name, value):
+        if name[:1].isupper():
+            if not hasattr(type(self), name):
+                raise AttributeError("%s has no member %s" % (type(self).__name__, name))
+            self._engine.round_trip(type(self).__name__, name)
+        object.__setattr__(self, name, value)
+
+    def QueryInterface(self, interface):
+        if interface.__name__ == "IUnknown":
+            return self
+        if interface.__name__ not in self._interfaces:
+            raise FakeComError("E_NOINTERFACE: %s does not implement %s"
+                               % (type(self).__name__, interface.__name__))
+        return self
+
+
+def _pointer(value):
+    if isinstance(value, _ComObject):
+        return _pointerType(type(value))(value)
+    return value
+
+
+def _target(value):
+    return object.__getattribute__(value, "_target") if isinstance(value, _Pointer) else value
+
+
+def _forwarding(method):
+    def call(self, *args, **kwargs):
+        value = method(*[_target(a) for a in args],
+                       **dict((k, _target(v)) for k, v in kwargs.items()))
+        return _pointer(value)
+    return call
+
+
+class _Pointer(object):
+    """
+    An interface pointer to a fake object.
+
+    Like comtypes, every property get and method call hands out a new pointer,
+    pointers to the same object compare equal, and
+    ``QueryInterface(IUnknown)`` returns the one stable identity without a
+    round trip, as a COM proxy answers it locally.
+    """
+
+    __slots__ = ("_target", "__weakref__")
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __getattr__(self, name):
+        value = getattr(object.__getattribute__(self, "_target"), name)
+        if not name[:1].isupper():
+            return value
+        if inspect.ismethod(value):
+            return types.MethodType(_forwarding(value), self)
+        return _pointer(value)
+
+    def __setattr__(self, name, value):
+        setattr(object.__getattribute__(self, "_target"), name, _target(value))
+
+    def QueryInterface(self, interface):
+        target = object.__getattribute__(self, "_target")
+        if interface.__name__ == "IUnknown":
+            return target
+        return _pointer(target.QueryInterface(interface))
+
+    def __call__(self, *args):
+        return _pointer(_target(self)(*[_target(a) for a in args]))
+
+    def __iter__(self):
+        return (_pointer(item) for item in _target(self))
+
+    def __len__(self):
+        return len(_target(self))
+
+    def __bool__(self):
+        return True
+
+    def __eq__(self, other):
+        return isinstance(other, _Pointer) and _target(other) is _target(self)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(id(_target(self)))
+
+    def __repr__(self):
+        return "<%s %r>" % (type(self).__name__, _target(self))
+
+
+# Named "POINTER(FakeScenario)" and so on, like comtypes pointer types
+_pointerTypes = {}
+
+
+def _pointerType(cls):
+    pointerType = _pointerTypes.get(cls)
+    if pointerType is None:
+        pointerType = _pointerTypes[cls] = type("POINTER(%s)" % cls.__name__, (_Pointer,),
+                                                {"__slots__": ()})
+    return pointerType
+
+
+class FakeApplication(_ComObject):
+    """Stand-in for ``CreateObject("STK11.Application")``."""
+
+    Visible = False
+    UserControl = False
+    Top = 0
+    Left = 0
+    Width = 800
+    Height = 600
+
+    def __init__(self, engine):
+        _ComObject.__init__(self, engine)
+        self._root = FakeRoot(engine)
+
+    @property
+    def Personality2(self):
+        return self._root
+
+    def Quit(self):
+        self._root.CloseScenario()
+
+
+class FakeUnitPreference(_ComObject):
+
+    def __init__(self, engine, root, dimension):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._dimension = dimension
+
+    @property
+    def CurrentUnit(self):
+        return self._root._units[self._dimension]
+
+    def SetCurrentUnit(self, unit):
+        if unit not in _UNITS[self._dimension]:
+            raise FakeComError("Unknown %s unit %r" % (self._dimension, unit))
+        self._root._units[self._dimension] = unit
+
+
+class FakeUnitPreferences(_ComObject):
+
+    def __init__(self, engine, root):
+        _ComObject.__init__(self, engine)
+        self._items = dict((name, FakeUnitPreference(engine, root, name)) for name in _UNITS)
+
+    def Item(self, name):
+        try:
+            return self._items[name]
+        except KeyError:
+            raise FakeComError("Unknown unit dimension %r" % name)
+
+
+class FakeRoot(_ComObject):
+    """Stand-in for ``IAgStkObjectRoot``."""
+
+    def __init__(self, engine):
+        _ComObject.__init__(self, engine)
+        self.engine = engine
+        self.type_libraries = (STKObjects, STKUtil)
+        self._units = dict(_DEFAULT_UNITS)
+        self._scenario = None
+        self._updateDepth = 0
+        self._unitPreferences = FakeUnitPreferences(engine, self)
+
+    # Unit helpers used by the fake objects themselves (not COM members)
+
+    def _to_internal(self, dimension, value):
+        return value * _UNITS[dimension][self._units[dimension]]
+
+    def _from_internal(self, dimension, value):
+        return value / _UNITS[dimension][self._units[dimension]]
+
+    def _parse_date(self, value):
+        if self._units["DateFormat"] == "EpSec":
+            return self._scenario._epoch + timedelta(seconds=float(value))
+        return parse_utcg(value)
+
+    def _format_date(self, value):
+        if self._units["DateFormat"] == "EpSec":
+            return (value - self._scenario._epoch).total_seconds()
+        return format_utcg(value)
+
+    def _format_dates(self, times):
+        # datetime64 array in the current DateFormat
+        if self._units["DateFormat"] == "EpSec":
+            return datetime64_to_epsec(times, self._scenario._epoch).tolist()
+        return format_utcg_array(times).tolist()
+
+    @property
+    def UnitPreferences(self):
+        return self._unitPreferences
+
+    @property
+    def CurrentScenario(self):
+        return self._scenario
+
+    def NewScenario(self, name):
+        if self._scenario is not None:
+            raise FakeComError("A scenario is already loaded")
+        self._scenario = FakeScenario(self._engine, self, name)
+
+    def CloseScenario(self):
+        self._scenario = None
+
+    def SaveScenarioAs(self, path):
+        if self._scenario is None:
+            raise FakeComError("No scenario is loaded")
+        with open(path, "w") as f:
+            json.dump(_scenario_document(self._scenario), f)
+
+    def LoadScenario(self, path):
+        if self._scenario is not None:
+            raise FakeComError("A scenario is already loaded")
+        with open(path) as f:
+            document = json.load(f)
+        _load_scenario(self, document)
+
+    def Rewind(self):
+        pass
+
+    def BeginUpdate(self):
+        self._updateDepth += 1
+
+    def EndUpdate(self):
+        if self._updateDepth == 0:
+            raise FakeComError("EndUpdate without BeginUpdate")
+        self._updateDepth -= 1
+
+    def _object_from_path(self, path):
+        if self._scenario is None:
+            raise FakeComError("No scenario is loaded")
+        parts = [part for part in path.split("/") if part]
+        if len(parts) < 2:
+            raise FakeComError("Invalid object path %r" % path)
+        child = self._scenario._find(parts[-2], parts[-1])
+        if child is None:
+            raise FakeComError("Object %r not found" % path)
+        return child
+
+    def GetObjectFromPath(self, path):
+        return self._object_from_path(path)
+
+    def ExecuteCommand(self, command):
+        return FakeExecCmdResult(self._engine, _execute_connect(self, command))
+
+    def ExecuteMultipleCommands(self, commands, action):
+        results = []
+        for command in commands:
+            try:
+                results.append(FakeExecCmdResult(self._engine, _execute_connect(self, command)))
+            except FakeComError as exc:
+                if action == _EXCEPTION_ON_ERROR:
+                    raise
+                results.append(FakeExecCmdResult(self._engine, [str(exc)], False))
+                if action == _STOP_ON_ERROR:
+                    break
+        return FakeExecMultiCmdResult(self._engine, results)
+
+
+# AgEExecMultiCmdResultAction
+_STOP_ON_ERROR = 1
+_EXCEPTION_ON_ERROR = 2
+
+
+class FakeExecCmdResult(_ComObject):
+
+    def __init__(self, engine, lines, succeeded=True):
+        _ComObject.__init__(self, engine)
+        self._lines = list(lines)
+        self._succeeded = succeeded
+
+    @property
+    def IsSucceeded(self):
+        return self._succeeded
+
+    @property
+    def Count(self):
+        return len(self._lines)
+
+    def Item(self, index):
+        return self._lines[index]
+
+
+class FakeExecMultiCmdResult(_ComObject):
+
+    def __init__(self, engine, results):
+        _ComObject.__init__(self, engine)
+        self._results = results
+
+    @property
+    def Count(self):
+        return len(self._results)
+
+    def Item(self, index):
+        return self._results[index]
+
+
+def _execute_connect(root, command):
+    """
+    Run the handful of Connect commands the bulk builder emits:
+
+        New / */Facility|Satellite <name>
+        Unload / */<Class>/<name>
+        SetPosition */Facility/<name> Geodetic <lat> <lon> <alt m>
+        SetState */Satellite/<name> Classical <J2Perturbation|TwoBody> "<start>"
+            "<stop>" <step> J2000 "<epoch>" <sma m> <e> <i> <w> <raan> <M>
+        SetState */Satellite/<name> Cartesian <J2Perturbation|TwoBody> "<start>"
+            "<stop>" <step> J2000 "<epoch>" <x> <y> <z> <vx> <vy> <vz>  (m, m/s)
+
+    Connect uses metres and degrees regardless of unit preferences.
+    """
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        raise FakeComError("Malformed command %r" % command)
+    if not args:
+        raise FakeComError("Empty command")
+    verb = args[0].lower()
+    if root._scenario is None:
+        raise FakeComError("No scenario is loaded")
+    if verb == "new" and len(args) == 4 and args[1] == "/":
+        className = args[2].split("/")[-1]
+        if className not in _CLASS_NAMES.values():
+            raise FakeComError("Unsupported class %r" % className)
+        root._scenario._childCollection._new(className, args[3])
+        return []
+    if verb == "unload" and len(args) == 3 and args[1] == "/":
+        obj = root._object_from_path(args[2])
+        root._scenario._children.remove(obj)
+        return []
+    if verb == "setposition" and len(args) == 6 and args[2].lower() == "geodetic":
+        fac = root._object_from_path(args[1])
+        if fac._className != "Facility":
+            raise FakeComError("SetPosition needs a facility")
+        lat, lon, alt = (float(value) for value in args[3:6])
+        fac._position._geodetic = (lat, lon, alt / 1000.0)
+        return []
+    if verb == "setstate" and len(args) == 15 and args[2].lower() in ("classical", "cartesian"):
+        sat = root._object_from_path(args[1])
+        if sat._className != "Satellite" or args[3] not in ("J2Perturbation", "TwoBody"):
+            raise FakeComError("Unsupported SetState %r" % command)
+        values = [float(value) for value in args[9:15]]
+        if args[2].lower() == "cartesian":
+            r, v = np.array(values[:3]) / 1000.0, np.array(values[3:]) / 1000.0
+            sma, ecc, inc, argp, raan, M = (float(x) for x in cartesian_to_classical(r, v))
+        else:
+            sma, ecc = values[0] / 1000.0, values[1]
+            inc, argp, raan, M = (math.radians(value) for value in values[2:])
+        if not sma > 0 or not 0 <= ecc < 1:
+            raise FakeComError("Invalid orbit in %r" % command)
+        propagator = FakePropagator(sat._engine, root, args[3] == "J2Perturbation")
+        propagator._initialState._epoch = parse_utcg(args[8])
+        propagator._initialState._elements = _Elements(sma, ecc, inc, argp, raan, M)
+        sat._propagator = propagator
+        propagator._propagate()
+        return []
+    raise FakeComError("Unsupported command %r" % command)
+
+
+class FakeStkObject(_ComObject):
+    """Common ``IAgStkObject`` members."""
+
+    _className = None
+
+    def __init__(self, engine, root, name, parent):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._name = name
+        self._parent = parent
+        self._dataProviders = FakeDataProviders(engine, self)
+
+    @property
+    def InstanceName(self):
+        return self._name
+
+    @property
+    def ClassName(self):
+        return self._className
+
+    @property
+    def Path(self):
+        return _object_path(self)
+
+    @property
+    def DataProviders(self):
+        return self._dataProviders
+
+    def Unload(self):
+        self._parent._children.remove(self)
+
+    def GetAccessToObject(self, other):
+        if isinstance(other, str):
+            other = self._root._object_from_path(other)
+        return FakeAccess(self._engine, self, other)
+
+
+def _object_path(obj):
+    if obj._parent is None:
+        return "/Application/STK/Scenario/%s" % obj._name
+    return "%s/%s/%s" % (_object_path(obj._parent), obj._className, obj._name)
+
+
+class FakeChildren(_ComObject):
+
+    def __init__(self, engine, scenario):
+        _ComObject.__init__(self, engine)
+        self._scenario = scenario
+
+    @property
+    def Count(self):
+        return len(self._scenario._children)
+
+    def Item(self, indexOrName):
+        children = self._scenario._children
+        if isinstance(indexOrName, int):
+            return children[indexOrName]
+        for child in children:
+            if child._name == indexOrName:
+                return child
+        raise FakeComError("No child named %r" % indexOrName)
+
+    def Contains(self, objectType, name):
+        return self._scenario._find(_CLASS_NAMES.get(objectType), name) is not None
+
+    def _new(self, className, name):
+        if self._scenario._find(className, name) is not None:
+            raise FakeComError("%s %r already exists" % (className, name))
+        cls = FakeFacility if className == "Facility" else FakeSatellite
+        child = cls(self._engine, self._scenario._root, name, self._scenario)
+        self._scenario._children.append(child)
+        return child
+
+    def New(self, objectType, name):
+        className = _CLASS_NAMES.get(objectType)
+        if className is None:
+            raise FakeComError("Unsupported object type %r" % objectType)
+        return self._new(className, name)
+
+    def Unload(self, objectType, name):
+        child = self._scenario._find(_CLASS_NAMES.get(objectType), name)
+        if child is None:
+            raise FakeComError("Object %r not found" % name)
+        self._scenario._children.remove(child)
+
+    def __iter__(self):
+        return iter(list(self._scenario._children))
+
+    def __len__(self):
+        return len(self._scenario._children)
+
+
+class FakeScenario(FakeStkObject):
+
+    _interfaces = ("IAgStkObject", "IAgScenario")
+    _className = "Scenario"
+
+    def __init__(self, engine, root, name):
+        FakeStkObject.__init__(self, engine, root, name, None)
+        self._children = []
+        self._childCollection = FakeChildren(engine, self)
+        self._epoch = parse_utcg("1 Jan 2016 00:00:00.000")
+        self._start = self._epoch
+        self._stop = self._epoch + timedelta(days=1)
+
+    def _find(self, className, name):
+        for child in self._children:
+            if child._className == className and child._name == name:
+                return child
+        return None
+
+    @property
+    def Children(self):
+        return self._childCollection
+
+    def SetTimePeriod(self, start, stop):
+        start, stop = self._root._parse_date(start), self._root._parse_date(stop)
+        if stop <= start:
+            raise FakeComError("Stop time must be after start time")
+        self._start, self._stop = start, stop
+        self._epoch = start
+
+    @property
+    def StartTime(self):
+        return self._root._format_date(self._start)
+
+    @property
+    def StopTime(self):
+        return self._root._format_date(self._stop)
+
+    @property
+    def Epoch(self):
+        return self._root._format_date(self._epoch)
+
+
+class FakePosition(_ComObject):
+
+    def __init__(self, engine):
+        _ComObject.__init__(self, engine)
+        self._geodetic = (0.0, 0.0, 0.0)
+
+    def AssignGeodetic(self, lat, lon, alt):
+        self._geodetic = (float(lat), float(lon), float(alt))
+
+    def QueryPlanetodetic(self):
+        return self._geodetic
+
+
+class FakeFacility(FakeStkObject):
+
+    _interfaces = ("IAgStkObject", "IAgFacility")
+    _className = "Facility"
+
+    def __init__(self, engine, root, name, parent):
+        FakeStkObject.__init__(self, engine, root, name, parent)
+        self._position = FakePosition(engine)
+        self._constraints = FakeAccessConstraints(engine, root)
+
+    @property
+    def Position(self):
+        return self._position
+
+    @property
+    def AccessConstraints(self):
+        return self._constraints
+
+    def _min_elevation(self):
+        constraint = self._constraints._active.get(STKObjects.eCstrElevationAngle)
+        if constraint is None or not constraint._enableMin:
+            return 0.0
+        return constraint._min
+
+
+class FakeAccessCnstrMinMax(_ComObject):
+
+    _interfaces = ("IAgAccessCnstrMinMax",)
+
+    def __init__(self, engine, root):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._enableMin = False
+        self._min = 0.0
+
+    @property
+    def EnableMin(self):
+        return self._enableMin
+
+    @EnableMin.setter
+    def EnableMin(self, value):
+        self._enableMin = bool(value)
+
+    @property
+    def Min(self):
+        return self._root._from_internal("AngleUnit", self._min)
+
+    @Min.setter
+    def Min(self, value):
+        self._min = self._root._to_internal("AngleUnit", float(value))
+
+
+class FakeAccessConstraints(_ComObject):
+    """Facility access constraints; only the elevation angle is modelled."""
+
+    def __init__(self, engine, root):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._active = {}
+
+    def IsConstraintActive(self, constraint):
+        return constraint in self._active
+
+    def GetActiveConstraint(self, constraint):
+        if constraint not in self._active:
+            raise FakeComError("Constraint %r is not active" % constraint)
+        return self._active[constraint]
+
+    def AddConstraint(self, constraint):
+        if constraint != STKObjects.eCstrElevationAngle:
+            raise FakeComError("Unsupported constraint %r" % constraint)
+        if constraint in self._active:
+            raise FakeComError("Constraint %r is already active" % constraint)
+        self._active[constraint] = FakeAccessCnstrMinMax(self._engine, self._root)
+        return self._active[constraint]
+
+
+class _Elements(object):
+    """Plain classical element set in internal units (km, rad)."""
+
+    def __init__(self, sma=6678.137, ecc=0.0, inc=math.radians(28.5), argp=0.0,
+                 raan=0.0, meanAnomaly=0.0):
+        self.sma = sma
+        self.ecc = ecc
+        self.inc = inc
+        self.argp = argp
+        self.raan = raan
+        self.meanAnomaly = meanAnomaly
+
+    def copy(self):
+        return _Elements(self.sma, self.ecc, self.inc, self.argp, self.raan,
+                         self.meanAnomaly)
+
+
+def _true_to_mean(nu, ecc):
+    E = 2 * math.atan2(math.sqrt(1 - ecc) * math.sin(nu / 2),
+                       math.sqrt(1 + ecc) * math.cos(nu / 2))
+    return E - ecc * math.sin(E)
+
+
+def _mean_to_true(M, ecc):
+    E = M
+    for _ in range(50):
+        dE = (E - ecc * math.sin(E) - M) / (1 - ecc * math.cos(E))
+        E -= dE
+        if abs(dE) < 1e-14:
+            break
+    return 2 * math.atan2(math.sqrt(1 + ecc) * math.sin(E / 2),
+                          math.sqrt(1 - ecc) * math.cos(E / 2))
+
+
+class _StateValue(_ComObject):
+    """Single-valued sub-interface such as ``IAgOrientationAscNodeRAAN``."""
+
+    def __init__(self, engine, state, interfaces, getter, setter):
+        _ComObject.__init__(self, engine)
+        object.__setattr__(self, "_interfaces", interfaces)
+        self._state = state
+        self._getter = getter
+        self._setter = setter
+
+    @property
+    def Value(self):
+        return self._getter()
+
+    @Value.setter
+    def Value(self, value):
+        self._setter(value)
+
+
+class FakeSizeShape(_ComObject):
+
+    _interfaces = ("IAgClassicalSizeShapeMeanMotion", "IAgClassicalSizeShapeSemimajorAxis")
+
+    def __init__(self, engine, state):
+        _ComObject.__init__(self, engine)
+        self._state = state
+
+    @property
+    def MeanMotion(self):
+        n = math.sqrt(MU / self._state._elements.sma ** 3)
+        return self._state._root._from_internal(
+            "AngleUnit", n) * _UNITS["TimeUnit"][self._state._root._units["TimeUnit"]]
+
+    @MeanMotion.setter
+    def MeanMotion(self, value):
+        root = self._state._root
+        n = root._to_internal("AngleUnit", value) / _UNITS["TimeUnit"][root._units["TimeUnit"]]
+        self._state._elements.sma = (MU / n ** 2) ** (1.0 / 3)
+
+    @property
+    def SemiMajorAxis(self):
+        return self._state._root._from_internal("DistanceUnit", self._state._elements.sma)
+
+    @SemiMajorAxis.setter
+    def SemiMajorAxis(self, value):
+        self._state._elements.sma = self._state._root._to_internal("DistanceUnit", value)
+
+    @property
+    def Eccentricity(self):
+        return self._state._elements.ecc
+
+    @Eccentricity.setter
+    def Eccentricity(self, value):
+        if not 0 <= value < 1:
+            raise FakeComError("Eccentricity must be in [0, 1)")
+        self._state._elements.ecc = float(value)
+
+
+class FakeOrientation(_ComObject):
+
+    AscNodeType = STKObjects.eAscNodeRAAN
+
+    def __init__(self, engine, state):
+        _ComObject.__init__(self, engine)
+        self._state = state
+        root = state._root
+        elements = state._elements
+        self._ascNode = _StateValue(
+            engine, state,
+            ("IAgOrientationAscNodeRAAN", "IAgOrientationAscNodeLAN"),
+            lambda: root._from_internal("AngleUnit", elements.raan),
+            lambda value: setattr(elements, "raan", root._to_internal("AngleUnit", value)))
+
+    def _angle(self, name):
+        return self._state._root._from_internal("AngleUnit", getattr(self._state._elements, name))
+
+    def _set_angle(self, name, value):
+        setattr(self._state._elements, name, self._state._root._to_internal("AngleUnit", value))
+
+    @property
+    def Inclination(self):
+        return self._angle("inc")
+
+    @Inclination.setter
+    def Inclination(self, value):
+        self._set_angle("inc", value)
+
+    @property
+    def ArgOfPerigee(self):
+        return self._angle("argp")
+
+    @ArgOfPerigee.setter
+    def ArgOfPerigee(self, value):
+        self._set_angle("argp", value)
+
+    @property
+    def AscNode(self):
+        return self._ascNode
+
+
+class FakeOrbitStateClassical(_ComObject):
+    """Stand-in for the classical orbit state returned by ``ConvertTo``."""
+
+    _interfaces = ("IAgOrbitStateClassical",)
+    SizeShapeType = STKObjects.eSizeShapeSemimajorAxis
+    LocationType = STKObjects.eLocationTrueAnomaly
+
+    def __init__(self, engine, root, elements):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._elements = elements
+        self._sizeShape = FakeSizeShape(engine, self)
+        self._orientation = FakeOrientation(engine, self)
+        self._location = _StateValue(
+            engine, self,
+            ("IAgClassicalLocationMeanAnomaly", "IAgClassicalLocationTrueAnomaly"),
+            self._get_location, self._set_location)
+
+    def _get_location(self):
+        M = self._elements.meanAnomaly
+        if object.__getattribute__(self, "LocationType") == STKObjects.eLocationTrueAnomaly:
+            M = _mean_to_true(M, self._elements.ecc)
+        return self._root._from_internal("AngleUnit", M) % (
+            self._root._from_internal("AngleUnit", 2 * math.pi))
+
+    def _set_location(self, value):
+        value = self._root._to_internal("AngleUnit", value)
+        if object.__getattribute__(self, "LocationType") == STKObjects.eLocationTrueAnomaly:
+            value = _true_to_mean(value, self._elements.ecc)
+        self._elements.meanAnomaly = value
+
+    @property
+    def SizeShape(self):
+        return self._sizeShape
+
+    @property
+    def Orientation(self):
+        return self._orientation
+
+    @property
+    def Location(self):
+        return self._location
+
+
+class FakeOrbitState(_ComObject):
+    """``InitialState.Representation``."""
+
+    def __init__(self, engine, root, initialState):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._initialState = initialState
+
+    def ConvertTo(self, stateType):
+        if stateType != STKUtil.eOrbitStateClassical:
+            raise FakeComError("Only classical states are supported")
+        return FakeOrbitStateClassical(self._engine, self._root,
+                                       self._initialState._elements.copy())
+
+    def Assign(self, state):
+        self._initialState._elements = state._elements.copy()
+
+
+class FakeInitialState(_ComObject):
+
+    def __init__(self, engine, root, propagator):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._propagator = propagator
+        self._elements = _Elements()
+        self._epoch = root._scenario._start
+        self._representation = FakeOrbitState(engine, root, self)
+
+    @property
+    def Epoch(self):
+        return self._root._format_date(self._epoch)
+
+    @Epoch.setter
+    def Epoch(self, value):
+        self._epoch = self._root._parse_date(value)
+
+    @property
+    def Representation(self):
+        return self._representation
+
+
+# Sampling of the ephemeris Propagate() computes, STK's default step
+_EPHEMERIS_STEP = 60.0
+
+
+class FakePropagator(_ComObject):
+    """J2 perturbation (or two-body) propagator."""
+
+    _interfaces = ("IAgVePropagatorJ2Perturbation", "IAgVePropagatorTwoBody")
+
+    def __init__(self, engine, root, j2=True):
+        _ComObject.__init__(self, engine)
+        self._root = root
+        self._j2 = j2
+        self._initialState = FakeInitialState(engine, root, self)
+        self._propagated = None
+        self._samples = None
+
+    @property
+    def InitialState(self):
+        return self._initialState
+
+    def Propagate(self):
+        self._propagate()
+
+    def _propagate(self):
+        # Like STK, do the work now: sample the scenario interval once. Queries
+        # are still answered analytically from the snapshotted inputs.
+        epoch, elements = self._initialState._epoch, self._initialState._elements.copy()
+        self._propagated = (epoch, elements, self._j2)
+        scenario = self._root._scenario
+        span = (scenario._stop - scenario._start).total_seconds()
+        offset = (scenario._start - epoch).total_seconds()
+        self._samples = propagate_elements(
+            elements, offset + np.arange(0.0, span + _EPHEMERIS_STEP, _EPHEMERIS_STEP), self._j2)
+
+
+def propagate_elements(elements, dt, j2=True):
+    """
+    Two-body plus J2 secular motion of one element set.
+
+    ``dt`` is an array of seconds from epoch; returns ``(r, v)`` in km and km/s,
+    each shaped ``(len(dt), 3)``, in the inertial frame of the elements.
+    """
+    r, v = j2_propagate(elements.sma, elements.ecc, elements.inc, elements.argp,
+                        elements.raan, elements.meanAnomaly, dt, j2)
+    return r[0], v[0]
+
+
+class FakeSatellite(FakeStkObject):
+
+    _interfaces = ("IAgStkObject", "IAgSatellite")
+    _className = "Satellite"
+
+    def __init__(self, engine, root, name, parent):
+        FakeStkObject.__init__(self, engine, root, name, parent)
+        self._propagator = FakePropagator(engine, root)
+
+    @property
+    def Propagator(self):
+        return self._propagator
+
+    @property
+    def PropagatorType(self):
+        if self._propagator._j2:
+            return STKObjects.ePropagatorJ2Perturbation
+        return STKObjects.ePropagatorTwoBody
+
+    @property
+    def PropagatorSupportedTypes(self):
+        return (STKObjects.ePropagatorJ2Perturbation, STKObjects.ePropagatorTwoBody)
+
+    def SetPropagatorType(self, propagatorType):
+        if propagatorType not in (STKObjects.ePropagatorJ2Perturbation,
+                                  STKObjects.ePropagatorTwoBody):
+            raise FakeComError("Unsupported propagator type %r" % propagatorType)
+        self._propagator = FakePropagator(
+            self._engine, self._root, propagatorType == STKObjects.ePropagatorJ2Perturbation)
+
+    def _ephemeris(self, times):
+        if self._propagator._propagated is None:
+            raise FakeComError("%s has not been propagated" % self._name)
+        epoch, elements, j2 = self._propagator._propagated
+        dt = (times - np.datetime64(epoch, "ns")) / np.timedelta64(1, "s")
+        return propagate_elements(elements, dt, j2)
+
+
+def _save_elements(elements):
+    return [elements.sma, elements.ecc, elements.inc, elements.argp, elements.raan,
+            elements.meanAnomaly]
+
+
+def _scenario_document(scenario):
+    # What a .sc file would hold, as JSON; ephemeris is recomputed on load
+    children = []
+    for child in scenario._children:
+        entry = {"class": child._className, "name": child._name}
+        if child._className == "Facility":
+            entry["position"] = list(child._position._geodetic)
+            entry["min_elevation"] = child._min_elevation() if child._constraints._active else None
+        else:
+            initialState = child._propagator._initialState
+            entry.update(j2=child._propagator._j2, epoch=initialState._epoch.isoformat(),
+                         elements=_save_elements(initialState._elements),
+                         propagated=child._propagator._propagated is not None)
+        children.append(entry)
+    return {"name": scenario._name, "epoch": scenario._epoch.isoformat(),
+            "start": scenario._start.isoformat(), "stop": scenario._stop.isoformat(),
+            "children": children}
+
+
+def _load_scenario(root, document):
+    engine = root._engine
+    scenario = FakeScenario(engine, root, document["name"])
+    scenario._epoch, scenario._start, scenario._stop = [
+        datetime.fromisoformat(document[key]) for key in ("epoch", "start", "stop")]
+    # New satellites take their default epoch from the current scenario
+    root._scenario = scenario
+    for entry in document["children"]:
+        # Loading still costs STK some work per object, modelled as one round trip
+        if engine.latency > 0:
+            _wait(engine.latency)
+        child = scenario._childCollection._new(entry["class"], entry["name"])
+        if entry["class"] == "Facility":
+            child._position._geodetic = tuple(entry["position"])
+            if entry["min_elevation"] is not None:
+                constraint = FakeAccessCnstrMinMax(engine, root)
+                constraint._enableMin, constraint._min = True, entry["min_elevation"]
+                child._constraints._active[STKObjects.eCstrElevationAngle] = constraint
+            continue
+        child._propagator = FakePropagator(engine, root, entry["j2"])
+        initialState = child._propagator._initialState
+        initialState._epoch = datetime.fromisoformat(entry["epoch"])
+        initialState._elements = _Elements(*entry["elements"])
+        if entry["propagated"]:
+            child._propagator._propagate()
+
+
+# Elements offered by each provider group, in STK's order
+_PROVIDER_ELEMENTS = {
+    "Cartesian Position": ("Time", "x", "y", "z"),
+    "Cartesian Velocity": ("Time", "x", "y", "z", "Speed"),
+}
+_PROVIDER_GROUPS = ("J2000", "Fixed")
+
+
+class FakeDataSet(_ComObject):
+
+    def __init__(self, engine, name, values):
+        _ComObject.__init__(self, engine)
+        self._name = name
+        self._values = values
+
+    @property
+    def ElementName(self):
+        return self._name
+
+    @property
+    def Count(self):
+        return len(self._values)
+
+    def GetValues(self):
+        return self._values
+
+
+class FakeDataSetCollection(_ComObject):
+
+    def __init__(self, engine, names, columns):
+        _ComObject.__init__(self, engine)
+        self._names = names
+        self._columns = columns
+
+    @property
+    def Count(self):
+        return len(self._names)
+
+    @property
+    def ElementNames(self):
+        return tuple(self._names)
+
+    def Item(self, index):
+        return FakeDataSet(self._engine, self._names[index], self._columns[index])
+
+    def GetDataSetByName(self, name):
+        return self.Item(self._names.index(name))
+
+    def ToArray(self):
+        return tuple(zip(*self._columns))
+
+
+class FakeDrResult(_ComObject):
+
+    def __init__(self, engine, names, columns):
+        _ComObject.__init__(self, engine)
+        self._dataSets = FakeDataSetCollection(engine, names, columns)
+
+    @property
+    def DataSets(self):
+        return self._dataSets
+
+
+class FakeDataPrvTimeVar(_ComObject):
+
+    _interfaces = ("IAgDataPrvTimeVar",)
+
+    def __init__(self, engine, obj, provider, group):
+        _ComObject.__init__(self, engine)
+        self._obj = obj
+        self._provider = provider
+        self._group = group
+
+    def ExecElements(self, start, stop, step, elements):
+        root = self._obj._root
+        available = _PROVIDER_ELEMENTS[self._provider]
+        for name in elements:
+            if name not in available:
+                raise FakeComError("%s//%s has no element %r"
+                                   % (self._provider, self._group, name))
+        t0, t1 = root._parse_date(start), root._parse_date(stop)
+        step = root._to_internal("TimeUnit", float(step))
+        if step <= 0:
+            raise FakeComError("Step must be positive")
+        span = (t1 - t0).total_seconds()
+        offsets = list(np.arange(0.0, span, step))
+        if not offsets or span - offsets[-1] > 1e-9:
+            offsets.append(span)
+        times = np.datetime64(t0, "ns") + np.rint(np.array(offsets) * 1e9).astype("timedelta64[ns]")
+        r, v = self._obj._ephemeris(times)
+        if self._group == "Fixed":
+            r, v = j2000_to_ecef(r, times), j2000_to_ecef(v, times)
+            v = v - np.cross([0.0, 0.0, EARTH_RATE], r)
+        vector = r if self._provider == "Cartesian Position" else v
+        scale = _UNITS["DistanceUnit"][root._units["DistanceUnit"]]
+        columns = []
+        for name in elements:
+            if name == "Time":
+                columns.append(tuple(root._format_dates(times)))
+            elif name in ("x", "y", "z"):
+                columns.append(tuple((vector[:, "xyz".index(name)] / scale).tolist()))
+            else:
+                columns.append(tuple((np.linalg.norm(vector, axis=1) / scale).tolist()))
+        return FakeDrResult(self._engine, list(elements), columns)
+
+
+class FakeDataProviderGroupItems(_ComObject):
+
+    def __init__(self, engine, obj, provider):
+        _ComObject.__init__(self, engine)
+        self._obj = obj
+        self._provider = provider
+
+    def _item(self, group):
+        if group not in _PROVIDER_GROUPS:
+            raise FakeComError("Unknown group %r" % group)
+        return FakeDataPrvTimeVar(self._engine, self._obj, self._provider, group)
+
+    def Item(self, group):
+        return self._item(group)
+
+
+class FakeDataProviderGroup(_ComObject):
+
+    _interfaces = ("IAgDataProviderGroup",)
+
+    def __init__(self, engine, obj, provider):
+        _ComObject.__init__(self, engine)
+        self._group = FakeDataProviderGroupItems(engine, obj, provider)
+
+    @property
+    def Group(self):
+        return self._group
+
+
+class FakeDataProviders(_ComObject):
+
+    def __init__(self, engine, obj):
+        _ComObject.__init__(self, engine)
+        self._obj = obj
+
+    def _item(self, name):
+        if name not in _PROVIDER_ELEMENTS or self._obj._className != "Satellite":
+            raise FakeComError("Unknown data provider %r" % name)
+        return FakeDataProviderGroup(self._engine, self._obj, name)
+
+    def __call__(self, name):
+        # sat.DataProviders("Cartesian Velocity") is a single call on the collection
+        self._engine.round_trip(type(self).__name__, "Item")
+        return self._item(name)
+
+    def Item(self, name):
+        return self._item(name)
+
+    def GetDataPrvTimeVarFromPath(self, path):
+        provider, _, group = path.partition("//")
+        return self._item(provider)._group._item(group)
+
+
+def _brute_force_access(facility, satellite, start, stop, step=1.0):
+    # Elevation sampled every ``step`` seconds, crossings interpolated linearly
+    span = (stop - start).total_seconds()
+    offsets = np.arange(0.0, span + step, step)
+    offsets[-1] = min(offsets[-1], span)
+    times = np.datetime64(start, "ns") + np.rint(offsets * 1e9).astype("timedelta64[ns]")
+    r, _ = satellite._ephemeris(times)
+    lat, lon, alt = facility._position._geodetic
+    rho = j2000_to_ecef(r, times) - geodetic_to_ecef(lat, lon, alt)
+    sinEl = rho.dot(local_up(lat, lon)) / np.linalg.norm(rho, axis=1)
+    f = np.arcsin(np.clip(sinEl, -1, 1)) - facility._min_elevation()
+    visible = f >= 0
+    edges = np.flatnonzero(visible[1:] != visible[:-1])
+    # Linear interpolation of each sign change of the elevation margin
+    fraction = f[edges] / (f[edges] - f[edges + 1])
+    crossings = offsets[edges] + fraction * (offsets[edges + 1] - offsets[edges])
+    events = list(crossings)
+    if visible[0]:
+        events.insert(0, 0.0)
+    if visible[-1]:
+        events.append(span)
+    return [(start + timedelta(seconds=a), start + timedelta(seconds=b))
+            for a, b in zip(events[::2], events[1::2])]
+
+
+class FakeAccess(_ComObject):
+    """Access between two objects, computed by dense sampling."""
+
+    def __init__(self, engine, fromObject, toObject):
+        _ComObject.__init__(self, engine)
+        self._objects = (fromObject, toObject)
+        self._intervals = None
+        self._dataProviders = FakeAccessDataProviders(engine, self)
+
+    def ComputeAccess(self):
+        scenario = self._objects[0]._root._scenario
+        classes = dict((obj._className, obj) for obj in self._objects)
+        if set(classes) != {"Facility", "Satellite"}:
+            raise FakeComError("Access is only modelled between a facility and a satellite")
+        self._intervals = _brute_force_access(classes["Facility"], classes["Satellite"],
+                                              scenario._start, scenario._stop)
+
+    @property
+    def DataProviders(self):
+        return self._dataProviders
+
+
+class FakeAccessDataProviders(_ComObject):
+
+    def __init__(self, engine, access):
+        _ComObject.__init__(self, engine)
+        self._access = access
+
+    def Item(self, name):
+        if name != "Access Data":
+            raise FakeComError("Unknown data provider %r" % name)
+        return FakeDataPrvInterval(self._engine, self._access)
+
+
+class FakeDataPrvInterval(_ComObject):
+
+    _interfaces = ("IAgDataPrvInterval",)
+
+    def __init__(self, engine, access):
+        _ComObject.__init__(self, engine)
+        self._access = access
+
+    def Exec(self, start, stop):
+        if self._access._intervals is None:
+            raise FakeComError("Access has not been computed")
+        root = self._access._objects[0]._root
+        t0, t1 = root._parse_date(start), root._parse_date(stop)
+        rows = [(max(a, t0), min(b, t1)) for a, b in self._access._intervals if b > t0 and a < t1]
+        names = ["Access Number", "Start Time", "Stop Time", "Duration"]
+        columns = [tuple(range(1, len(rows) + 1)),
+                   tuple(root._format_date(a) for a, _ in rows),
+                   tuple(root._format_date(b) for _, b in rows),
+                   tuple(root._from_internal("TimeUnit", (b - a).total_seconds()) for a, b in rows)]
+        return FakeDrResult(self._engine, names, columns)
+
+
+def create_fake_application(latency=0.0, member_latency=None):
+    """Return a :class:`FakeApplication`, the stand-in for ``CreateObject``."""
+    return _pointer(FakeApplication(FakeEngine(latency, member_latency)))
+
+
+def create_fake_engine(latency=0.0, member_latency=None):
+    """
+    Engine factory returning a fake ``IAgStkObjectRoot``; usable anywhere an
+    STK root is expected, including as the :class:`~stk_integration.pool.EnginePool`
+    factory (wrap it in ``functools.partial`` to pass latencies).
+    """
+    return create_fake_application(latency, member_latency).Personality2
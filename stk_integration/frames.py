@@ -0,0 +1,244 @@
+# coding: utf-8
+"""
+Vectorised reference-frame conversions for ephemeris arrays.
+
+Data providers report ``Cartesian Position//J2000``; ground geometry needs
+Earth-fixed coordinates, reports want LLA or classical elements, and relative
+motion is read in RIC. Rather than executing a provider per frame per object,
+extract J2000 once and convert the whole arrays here.
+
+The Earth rotation model is IAU-76 precession, the four largest IAU-80
+nutation terms and IAU-82 sidereal time, with UT1 = UTC and no polar motion.
+At LEO that puts positions within a few hundred metres of STK's ``Fixed``
+frame, which is plenty for visibility screening.
+
+Times are ``datetime64`` arrays; positions are ``(..., m, 3)`` in km with the
+time axis second to last. Geodetic coordinates are WGS84 degrees and km, as
+passed to ``AssignGeodetic``. Classical elements use the
+``IAgOrbitStateClassical`` field names in km, revs/day and degrees, the units
+``assign_classical`` takes.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+
+from . import j2
+
+WGS84_A = 6378.137                  # km
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+EARTH_RATE = 7.292115146706979e-5    # rad/s, including precession
+ARCSEC = np.pi / (180 * 3600)
+_J2000 = np.datetime64("2000-01-01T12:00:00", "ns")
+
+
+def _centuries(times):
+    # Julian centuries since J2000.0
+    days = (np.asarray(times, dtype="datetime64[ns]") - _J2000) / np.timedelta64(86400, "s")
+    return days / 36525.0
+
+
+def _r1(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return np.stack([np.stack([one, zero, zero], -1),
+                     np.stack([zero, c, s], -1),
+                     np.stack([zero, -s, c], -1)], -2)
+
+
+def _r2(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return np.stack([np.stack([c, zero, -s], -1),
+                     np.stack([zero, one, zero], -1),
+                     np.stack([s, zero, c], -1)], -2)
+
+
+def _r3(angle):
+    c, s = np.cos(angle), np.sin(angle)
+    one, zero = np.ones_like(c), np.zeros_like(c)
+    return np.stack([np.stack([c, s, zero], -1),
+                     np.stack([-s, c, zero], -1),
+                     np.stack([zero, zero, one], -1)], -2)
+
+
+def _nutation(T):
+    # Largest IAU-80 terms: (dpsi, deps, mean obliquity) in radians
+    omega = np.radians(125.04452 - 1934.136261 * T)
+    sunL = np.radians(280.4665 + 36000.7698 * T)
+    moonL = np.radians(218.3165 + 481267.8813 * T)
+    dpsi = (-17.20 * np.sin(omega) - 1.32 * np.sin(2 * sunL) - 0.23 * np.sin(2 * moonL)
+            + 0.21 * np.sin(2 * omega)) * ARCSEC
+    deps = (9.20 * np.cos(omega) + 0.57 * np.cos(2 * sunL) + 0.10 * np.cos(2 * moonL)
+            - 0.09 * np.cos(2 * omega)) * ARCSEC
+    eps = (84381.448 - 46.8150 * T - 0.00059 * T ** 2 + 0.001813 * T ** 3) * ARCSEC
+    return dpsi, deps, eps
+
+
+def gmst(times):
+    """Greenwich mean sidereal time (IAU-82, UT1 = UTC) in radians."""
+    T = _centuries(times)
+    seconds = (67310.54841 + (876600.0 * 3600 + 8640184.812866) * T
+               + 0.093104 * T ** 2 - 6.2e-6 * T ** 3)
+    return np.radians((seconds / 240.0) % 360.0)
+
+
+def gast(times):
+    """Greenwich apparent sidereal time in radians."""
+    dpsi, _, eps = _nutation(_centuries(times))
+    return gmst(times) + dpsi * np.cos(eps)
+
+
+def j2000_to_ecef_matrix(times):
+    """Rotation matrices ``(m, 3, 3)`` taking J2000 vectors to Earth-fixed at ``times``."""
+    times = np.atleast_1d(times)
+    T = _centuries(times)
+    zeta = (2306.2181 * T + 0.30188 * T ** 2 + 0.017998 * T ** 3) * ARCSEC
+    z = (2306.2181 * T + 1.09468 * T ** 2 + 0.018203 * T ** 3) * ARCSEC
+    theta = (2004.3109 * T - 0.42665 * T ** 2 - 0.041833 * T ** 3) * ARCSEC
+    precession = _r3(-z) @ _r2(theta) @ _r3(-zeta)
+    dpsi, deps, eps = _nutation(T)
+    nutation = _r1(-(eps + deps)) @ _r3(-dpsi) @ _r1(eps)
+    return _r3(gmst(times) + dpsi * np.cos(eps)) @ nutation @ precession
+
+
+def j2000_to_ecef(r, times):
+    """Rotate J2000 positions ``(..., m, 3)`` into the Earth-fixed frame."""
+    return np.einsum("mij,...mj->...mi", j2000_to_ecef_matrix(times), np.asarray(r))
+
+
+def ecef_to_j2000(r, times):
+    """Rotate Earth-fixed positions ``(..., m, 3)`` into J2000."""
+    return np.einsum("mji,...mj->...mi", j2000_to_ecef_matrix(times), np.asarray(r))
+
+
+def j2000_to_ecef_state(r, v, times):
+    """J2000 position and velocity ``(..., m, 3)`` to Earth-fixed, including Earth rotation."""
+    matrix = j2000_to_ecef_matrix(times)
+    rFixed = np.einsum("mij,...mj->...mi", matrix, np.asarray(r))
+    vFixed = np.einsum("mij,...mj->...mi", matrix, np.asarray(v))
+    return rFixed, vFixed - np.cross([0.0, 0.0, EARTH_RATE], rFixed)
+
+
+def ecef_to_j2000_state(r, v, times):
+    """Earth-fixed position and velocity ``(..., m, 3)`` to J2000."""
+    r = np.asarray(r)
+    vInertial = np.asarray(v) + np.cross([0.0, 0.0, EARTH_RATE], r)
+    matrix = j2000_to_ecef_matrix(times)
+    return (np.einsum("mji,...mj->...mi", matrix, r),
+            np.einsum("mji,...mj->...mi", matrix, vInertial))
+
+
+def geodetic_to_ecef(lat, lon, alt=0.0):
+    """WGS84 geodetic (deg, deg, km) to Earth-fixed Cartesian km, shaped ``(..., 3)``."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    alt = np.asarray(alt, dtype=np.float64)
+    sinLat = np.sin(lat)
+    N = WGS84_A / np.sqrt(1 - WGS84_E2 * sinLat ** 2)
+    return np.stack(np.broadcast_arrays((N + alt) * np.cos(lat) * np.cos(lon),
+                                        (N + alt) * np.cos(lat) * np.sin(lon),
+                                        (N * (1 - WGS84_E2) + alt) * sinLat), axis=-1)
+
+
+def local_up(lat, lon):
+    """Geodetic zenith unit vectors ``(..., 3)`` in the Earth-fixed frame."""
+    lat, lon = np.radians(lat), np.radians(lon)
+    return np.stack(np.broadcast_arrays(np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon),
+                                        np.sin(lat)), axis=-1)
+
+
+def ecef_to_geodetic(r, iterations=5):
+    """
+    Earth-fixed Cartesian km ``(..., 3)`` to WGS84 ``(lat, lon, alt)`` in deg,
+    deg and km. The fixed-point iteration converges below a millimetre for
+    anything from the ground to GEO within five passes.
+    """
+    r = np.asarray(r, dtype=np.float64)
+    x, y, z = r[..., 0], r[..., 1], r[..., 2]
+    p = np.hypot(x, y)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+    for _ in range(iterations):
+        sinLat = np.sin(lat)
+        N = WGS84_A / np.sqrt(1 - WGS84_E2 * sinLat ** 2)
+        lat = np.arctan2(z + WGS84_E2 * N * sinLat, p)
+    sinLat = np.sin(lat)
+    alt = p * np.cos(lat) + z * sinLat - WGS84_A * np.sqrt(1 - WGS84_E2 * sinLat ** 2)
+    return np.degrees(lat), np.degrees(np.arctan2(y, x)), alt
+
+
+def cartesian_to_classical(r, v, times=None):
+    """
+    Osculating classical elements of inertial states ``(..., 3)`` km, km/s.
+
+    Returns an ``OrderedDict`` of arrays shaped ``r.shape[:-1]`` keyed like the
+    ``IAgOrbitStateClassical`` fields: ``SemiMajorAxis``, ``MeanMotion``
+    (revs/day), ``Eccentricity``, ``Inclination``, ``ArgOfPerigee``, ``RAAN``,
+    ``TrueAnomaly`` and ``MeanAnomaly``. With ``times`` (the ``m`` times of an
+    ``(..., m, 3)`` ephemeris) ``LAN``, the node's Earth-fixed longitude, is
+    added too.
+    """
+    sma, ecc, inc, argp, raan, M = j2.cartesian_to_classical(r, v)
+    E = j2.solve_kepler(M, ecc)
+    nu = 2 * np.arctan2(np.sqrt(1 + ecc) * np.sin(E / 2), np.sqrt(1 - ecc) * np.cos(E / 2))
+    elements = OrderedDict([
+        ("SemiMajorAxis", sma),
+        ("MeanMotion", np.sqrt(j2.MU / sma ** 3) * j2.SECONDS_PER_DAY / (2 * np.pi)),
+        ("Eccentricity", ecc),
+        ("Inclination", np.degrees(inc)),
+        ("ArgOfPerigee", np.degrees(argp)),
+        ("RAAN", np.degrees(raan)),
+        ("TrueAnomaly", np.degrees(nu) % 360.0),
+        ("MeanAnomaly", np.degrees(M)),
+    ])
+    if times is not None:
+        elements["LAN"] = np.degrees(raan - gast(np.atleast_1d(times))) % 360.0
+    return elements
+
+
+def classical_to_cartesian(eccentricity, inclination, arg_of_perigee, raan, mean_anomaly,
+                           mean_motion=None, sma=None):
+    """
+    Inertial ``(r, v)`` ``(..., 3)`` from classical elements given like
+    ``assign_classical``: ``mean_motion`` in revs/day or ``sma`` in km, and
+    angles in degrees. Inputs broadcast against each other.
+    """
+    if (mean_motion is None) == (sma is None):
+        raise ValueError("Give exactly one of mean_motion and sma")
+    if sma is None:
+        n = np.asarray(mean_motion, dtype=np.float64) * 2 * np.pi / j2.SECONDS_PER_DAY
+        sma = (j2.MU / n ** 2) ** (1.0 / 3)
+    arrays = np.broadcast_arrays(sma, eccentricity, np.radians(inclination),
+                                 np.radians(arg_of_perigee), np.radians(raan),
+                                 np.radians(mean_anomaly))
+    shape = arrays[0].shape
+    r, v = j2.propagate(*[a.ravel() for a in arrays], dt=np.zeros(1), j2=False)
+    return r.reshape(shape + (3,)), v.reshape(shape + (3,))
+
+
+def ric_matrix(r, v):
+    """
+    Rotation matrices ``(..., 3, 3)`` from the frame of ``r``/``v`` to radial,
+    in-track, cross-track.
+    """
+    r, v = np.asarray(r, dtype=np.float64), np.asarray(v, dtype=np.float64)
+    radial = r / np.linalg.norm(r, axis=-1)[..., None]
+    h = np.cross(r, v)
+    cross = h / np.linalg.norm(h, axis=-1)[..., None]
+    return np.stack([radial, np.cross(cross, radial), cross], axis=-2)
+
+
+def to_ric(r, v, r_ref, v_ref):
+    """
+    Position and velocity of ``r``/``v`` relative to the reference state
+    ``r_ref``/``v_ref``, in the reference's rotating RIC frame. All ``(..., 3)``
+    inertial and broadcast together.
+    """
+    r_ref, v_ref = np.asarray(r_ref, dtype=np.float64), np.asarray(v_ref, dtype=np.float64)
+    matrix = ric_matrix(r_ref, v_ref)
+    rho = np.asarray(r) - r_ref
+    omega = np.cross(r_ref, v_ref) / np.sum(r_ref * r_ref, axis=-1)[..., None]
+    rhoDot = np.asarray(v) - v_ref - np.cross(omega, rho)
+    return (np.einsum("...ij,...j->...i", matrix, rho),
+            np.einsum("...ij,...j->...i", matrix, rhoDot))
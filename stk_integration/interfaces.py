@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+Cache of ``QueryInterface`` results.
+
+Every ``obj.QueryInterface(STKObjects.IAgSatellite)`` is a COM round trip, and
+the notebooks repeat them on the same objects (``keplerian2.SizeShape`` is
+queried twice in a row, for example). :class:`InterfaceCache` remembers the
+interface pointers it has resolved per underlying object, with one cache per
+root:
+
+    sat2 = query_interface(root, sat, STKObjects.IAgSatellite)     # round trip
+    sat2 = query_interface(root, sat, STKObjects.IAgSatellite)     # cached
+
+comtypes hands out a new pointer on every property get, so entries are keyed
+on COM identity instead: the address of the object's ``IUnknown``, which is
+the same for every pointer to one object. Asking for ``IUnknown`` is answered
+by the proxy without a round trip to STK. The cache holds that ``IUnknown``
+so the address cannot be reused while the entry exists.
+
+Entries live until they are dropped explicitly. Unloading through
+:meth:`InterfaceCache.unload` (or calling :meth:`InterfaceCache.invalidate`)
+drops one object, and :meth:`InterfaceCache.clear` drops everything. Every
+path in this package that unloads objects or closes a scenario does one or
+the other on the root's own cache, so roots (and the engine threads of
+:mod:`~stk_integration.aio`) never touch each other's pointers. Code that
+removes objects behind the cache's back (``Children.Unload`` called directly)
+should follow it with :meth:`InterfaceCache.invalidate`.
+"""
+
+import ctypes
+import weakref
+
+_IUnknown = None
+
+
+def _unknown_interface():
+    global _IUnknown
+    if _IUnknown is None:
+        try:
+            from comtypes import IUnknown
+        except ImportError:
+            # Without comtypes only the name is needed (see stk_integration.fake)
+            IUnknown = type("IUnknown", (object,), {})
+        _IUnknown = IUnknown
+    return _IUnknown
+
+
+def com_identity(obj):
+    """
+    ``(key, unknown)`` identifying the COM object behind the pointer ``obj``,
+    or ``(None, None)`` if it has no ``QueryInterface``. ``key`` stays unique
+    only while ``unknown`` is kept alive.
+    """
+    queryInterface = getattr(obj, "QueryInterface", None)
+    if queryInterface is None:
+        return None, None
+    unknown = queryInterface(_unknown_interface())
+    try:
+        return ("com", ctypes.cast(unknown, ctypes.c_void_p).value), unknown
+    except ctypes.ArgumentError:
+        return ("object", id(unknown)), unknown
+
+
+class InterfaceCache(object):
+    """``{COM identity: {interface: view}}`` cache of resolved interfaces."""
+
+    def __init__(self):
+        # identity -> (IUnknown kept alive, {interface: view})
+        self._views = {}
+        self.hits = 0
+        self.misses = 0
+
+    def query(self, obj, interface):
+        """``obj.QueryInterface(interface)``, resolved at most once per object."""
+        key, unknown = com_identity(obj)
+        if key is None:
+            self.misses += 1
+            return obj.QueryInterface(interface)
+        entry = self._views.get(key)
+        if entry is None:
+            entry = self._views[key] = (unknown, {})
+        views = entry[1]
+        view = views.get(interface)
+        if view is None:
+            self.misses += 1
+            view = views[interface] = obj.QueryInterface(interface)
+            return view
+        self.hits += 1
+        return view
+
+    def invalidate(self, obj):
+        """Forget every interface resolved for ``obj``."""
+        key, _ = com_identity(obj)
+        self._views.pop(key, None)
+
+    def unload(self, obj):
+        """Unload an STK object and drop its cached interfaces."""
+        self.invalidate(obj)
+        obj.Unload()
+
+    def clear(self):
+        """Forget every object, e.g. once its scenario has been closed."""
+        self._views.clear()
+
+    def __len__(self):
+        return len(self._views)
+
+    def typed(self, obj, library=None):
+        """Wrap ``obj`` in a :class:`TypedObject` backed by this cache."""
+        return TypedObject(obj, self, library)
+
+
+class TypedObject(object):
+    """
+    An STK object whose interface views are resolved lazily through an
+    :class:`InterfaceCache`.
+
+    ``typed.as_(STKObjects.IAgSatellite)`` returns the view; when built with
+    ``library=STKObjects`` the same is available as ``typed.IAgSatellite``.
+    Any other attribute is read from the wrapped object itself.
+    """
+
+    def __init__(self, obj, cache, library=None):
+        self.obj = obj
+        self.cache = cache
+        self.library = library
+
+    def as_(self, interface):
+        return self.cache.query(self.obj, interface)
+
+    def unload(self):
+        self.cache.unload(self.obj)
+
+    def __getattr__(self, name):
+        if name.startswith("IAg") and self.library is not None:
+            return self.as_(getattr(self.library, name))
+        return getattr(self.obj, name)
+
+
+_caches = weakref.WeakKeyDictionary()
+
+
+def interface_cache(root):
+    """The :class:`InterfaceCache` for the objects of ``root``, created on first use."""
+    cache = _caches.get(root)
+    if cache is None:
+        cache = _caches[root] = InterfaceCache()
+    return cache
+
+
+def query_interface(root, obj, interface):
+    """``obj.QueryInterface(interface)`` through the cache of ``root``."""
+    return interface_cache(root).query(obj, interface)
@@ -0,0 +1,201 @@
+# coding: utf-8
+"""
+Vectorised J2 secular propagation for quick-look screening.
+
+Mirrors what ``SetPropagatorType(ePropagatorJ2Perturbation)`` + ``Propagate()``
+does for a whole batch of orbits at once: two-body motion with the secular J2
+drift of RAAN, argument of perigee and mean anomaly. The input elements are
+treated as mean elements, so expect small periodic differences from STK, which
+:func:`validate_against_stk` quantifies.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .interfaces import interface_cache
+
+MU = 398600.4415        # km^3/s^2, EGM96
+RE = 6378.1363          # km
+J2 = 1.082626925638815e-3
+
+SECONDS_PER_DAY = 86400.0
+
+
+def secular_rates(sma, ecc, inc):
+    """J2 secular rates ``(raanDot, argpDot, meanAnomalyDot)`` in rad/s (excluding n)."""
+    sma, ecc, inc = np.asarray(sma), np.asarray(ecc), np.asarray(inc)
+    n = np.sqrt(MU / sma ** 3)
+    p = sma * (1 - ecc ** 2)
+    factor = 1.5 * J2 * (RE / p) ** 2 * n
+    sini2 = np.sin(inc) ** 2
+    raanDot = -factor * np.cos(inc)
+    argpDot = factor * (2 - 2.5 * sini2)
+    meanAnomalyDot = factor * np.sqrt(1 - ecc ** 2) * (1 - 1.5 * sini2)
+    return raanDot, argpDot, meanAnomalyDot
+
+
+def solve_kepler(M, ecc, tol=1e-13, max_iter=30):
+    """Eccentric anomaly for mean anomaly ``M`` (Newton iteration, vectorised)."""
+    M = np.asarray(M, dtype=np.float64)
+    ecc = np.broadcast_to(ecc, M.shape)
+    E = np.where(ecc < 0.8, M, np.pi * np.ones_like(M))
+    for _ in range(max_iter):
+        dE = (E - ecc * np.sin(E) - M) / (1 - ecc * np.cos(E))
+        E = E - dE
+        if np.max(np.abs(dE), initial=0.0) < tol:
+            break
+    return E
+
+
+def propagate(sma, ecc, inc, argp, raan, mean_anomaly, dt, j2=True):
+    """
+    Propagate ``n`` element sets over time offsets ``dt``.
+
+    Elements are ``(n,)`` arrays (or scalars) in km and radians; ``dt`` is
+    seconds from each element set's epoch, shaped ``(m,)`` (shared) or
+    ``(n, m)``. Returns inertial ``(r, v)`` in km and km/s, each ``(n, m, 3)``.
+    """
+    sma, ecc, inc, argp, raan, mean_anomaly = (
+        np.atleast_1d(np.asarray(x, dtype=np.float64))[:, None]
+        for x in (sma, ecc, inc, argp, raan, mean_anomaly))
+    dt = np.asarray(dt, dtype=np.float64)
+    if dt.ndim == 1:
+        dt = dt[None, :]
+
+    n = np.sqrt(MU / sma ** 3)
+    if j2:
+        raanDot, argpDot, mDot = secular_rates(sma, ecc, inc)
+    else:
+        raanDot = argpDot = mDot = 0.0
+    raan = raan + raanDot * dt
+    argp = argp + argpDot * dt
+    M = mean_anomaly + (n + mDot) * dt
+
+    E = solve_kepler(M, np.broadcast_to(ecc, M.shape))
+    cosE, sinE = np.cos(E), np.sin(E)
+    root1me2 = np.sqrt(1 - ecc ** 2)
+    rMag = sma * (1 - ecc * cosE)
+    # Perifocal position and velocity
+    xp = sma * (cosE - ecc)
+    yp = sma * root1me2 * sinE
+    vScale = np.sqrt(MU * sma) / rMag
+    vxp = -vScale * sinE
+    vyp = vScale * root1me2 * cosE
+
+    cO, sO = np.cos(raan), np.sin(raan)
+    cw, sw = np.cos(argp), np.sin(argp)
+    ci, si = np.cos(inc), np.sin(inc)
+    P = np.stack(np.broadcast_arrays(cO * cw - sO * sw * ci, sO * cw + cO * sw * ci,
+                                     sw * si), axis=-1)
+    Q = np.stack(np.broadcast_arrays(-cO * sw - sO * cw * ci, -sO * sw + cO * cw * ci,
+                                     cw * si), axis=-1)
+    r = xp[..., None] * P + yp[..., None] * Q
+    v = vxp[..., None] * P + vyp[..., None] * Q
+    return r, v
+
+
+def cartesian_to_classical(r, v, tol=1e-11):
+    """
+    Osculating elements from inertial position and velocity (km, km/s).
+
+    ``r`` and ``v`` are ``(..., 3)``. Returns ``(sma, ecc, inc, argp, raan,
+    mean_anomaly)`` in km and radians, each shaped ``r.shape[:-1]``. Circular
+    orbits get ``argp = 0`` (anomaly measured from the node) and equatorial
+    ones ``raan = 0`` (node along the x axis).
+    """
+    r = np.asarray(r, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    rMag = np.linalg.norm(r, axis=-1)
+    h = np.cross(r, v)
+    hMag = np.linalg.norm(h, axis=-1)
+    node = np.stack([-h[..., 1], h[..., 0], np.zeros_like(hMag)], axis=-1)
+    nodeMag = np.linalg.norm(node, axis=-1)
+    eVec = np.cross(v, h) / MU - r / rMag[..., None]
+    ecc = np.linalg.norm(eVec, axis=-1)
+    energy = 0.5 * np.sum(v * v, axis=-1) - MU / rMag
+    sma = -MU / (2 * energy)
+    inc = np.arccos(np.clip(h[..., 2] / hMag, -1.0, 1.0))
+
+    equatorial = nodeMag < tol * hMag
+    circular = ecc < tol
+    # Reference directions for the angles when the node or perigee is undefined
+    nodeDir = np.where(equatorial[..., None], [1.0, 0.0, 0.0],
+                       node / np.where(equatorial, 1.0, nodeMag)[..., None])
+    raan = np.where(equatorial, 0.0, np.arctan2(nodeDir[..., 1], nodeDir[..., 0]) % (2 * np.pi))
+    hUnit = h / hMag[..., None]
+    inPlane = np.cross(hUnit, nodeDir)
+
+    def angle_from_node(vec):
+        return np.arctan2(np.sum(vec * inPlane, axis=-1), np.sum(vec * nodeDir, axis=-1))
+
+    argp = np.where(circular, 0.0, angle_from_node(eVec) % (2 * np.pi))
+    nu = angle_from_node(r) - argp
+    E = 2 * np.arctan2(np.sqrt(1 - ecc) * np.sin(nu / 2), np.sqrt(1 + ecc) * np.cos(nu / 2))
+    mean_anomaly = (E - ecc * np.sin(E)) % (2 * np.pi)
+    return sma, ecc, inc, argp, raan, mean_anomaly
+
+
+def _offsets(times, epoch):
+    # Seconds from each epoch to each time; datetime64 or plain seconds
+    times = np.asarray(times)
+    if epoch is None:
+        epoch = times[0] if np.issubdtype(times.dtype, np.datetime64) else 0.0
+    epoch = np.atleast_1d(np.asarray(epoch))
+    dt = times[None, :] - epoch[:, None]
+    if np.issubdtype(dt.dtype, np.timedelta64):
+        dt = dt / np.timedelta64(1, "s")
+    return dt
+
+
+def propagate_classical(mean_motion, eccentricity, inclination, arg_of_perigee, raan,
+                        mean_anomaly, times, epoch=None, j2=True):
+    """
+    Propagate classical elements entered the way the notebook sets them on
+    ``keplerian2``: mean motion in revs/day, angles in degrees.
+
+    ``times`` is a ``datetime64`` array (or seconds); ``epoch`` is the epoch of
+    each element set in the same kind, scalar or ``(n,)``, defaulting to
+    ``times[0]``. Returns J2000 ``(r, v)`` in km and km/s, each ``(n, m, 3)``.
+    """
+    n = np.asarray(mean_motion, dtype=np.float64) * 2 * np.pi / SECONDS_PER_DAY
+    sma = (MU / n ** 2) ** (1.0 / 3)
+    return propagate(sma, eccentricity, np.radians(inclination), np.radians(arg_of_perigee),
+                     np.radians(raan), np.radians(mean_anomaly), _offsets(times, epoch), j2)
+
+
+def validate_against_stk(root, elements, epoch, start, stop, step=60.0):
+    """
+    Compare :func:`propagate_classical` with STK's own J2 propagator.
+
+    ``elements`` is a DataFrame (or dict of arrays) with columns
+    ``mean_motion, eccentricity, inclination, arg_of_perigee, raan,
+    mean_anomaly``. Each row is built as a satellite in the scenario loaded in
+    ``root`` with the same UTCG ``epoch``, propagated, and its
+    ``Cartesian Position``/``Cartesian Velocity`` J2000 ephemeris compared with
+    the local result. Returns a DataFrame of per-orbit maximum position (km)
+    and velocity (km/s) errors.
+    """
+    from .dataproviders import exec_elements
+    from .scenario import add_satellite
+    from .times import parse_utcg
+
+    elements = pd.DataFrame(elements)
+    columns = ["mean_motion", "eccentricity", "inclination", "arg_of_perigee", "raan",
+               "mean_anomaly"]
+    epoch64 = np.datetime64(parse_utcg(epoch), "ns")
+    rows = []
+    for i, row in enumerate(elements[columns].itertuples(index=False)):
+        sat, _ = add_satellite(root, "J2Check%d" % i, epoch, *row)
+        providers = sat.DataProviders
+        pos = exec_elements(providers.GetDataPrvTimeVarFromPath("Cartesian Position//J2000"),
+                            start, stop, step, ["Time", "x", "y", "z"])
+        vel = exec_elements(providers.GetDataPrvTimeVarFromPath("Cartesian Velocity//J2000"),
+                            start, stop, step, ["Time", "x", "y", "z"])
+        interface_cache(root).unload(sat)
+        r, v = propagate_classical(*row, times=pos["Time"], epoch=epoch64)
+        stkR = np.column_stack([pos["x"], pos["y"], pos["z"]])
+        stkV = np.column_stack([vel["x"], vel["y"], vel["z"]])
+        rows.append((np.max(np.linalg.norm(r[0] - stkR, axis=1)),
+                     np.max(np.linalg.norm(v[0] - stkV, axis=1))))
+    return pd.DataFrame(rows, columns=["max_position_error_km", "max_velocity_error_km_s"],
+                        index=elements.index)
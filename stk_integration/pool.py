@@ -0,0 +1,210 @@
+# coding: utf-8
+"""
+Run independent scenario jobs across several STK engine instances.
+
+Each worker process owns one engine (its own ``root = app.Personality2``) and
+runs jobs sent to it one at a time, so COM calls never cross apartments. The
+engine factory is pluggable; any picklable zero-argument callable that returns
+an object with the STK root API will do.
+"""
+
+import multiprocessing
+import traceback
+from collections import deque
+from multiprocessing.connection import wait
+
+
+def create_stk_engine():
+    """Default engine factory: start STK through comtypes and return its root."""
+    from .typelib import timed_import
+    app = timed_import("comtypes.client").CreateObject("STK11.Application")
+    app.UserControl = False
+    return app.Personality2
+
+
+class JobError(RuntimeError):
+    """A job raised inside a worker; the message carries the worker traceback."""
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker running a job died and the job ran out of retries."""
+
+
+def _worker_main(conn, factory):
+    try:
+        root = factory()
+    except Exception:
+        conn.send(("failed", traceback.format_exc()))
+        return
+    conn.send(("ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        fn, args, kwargs = message
+        try:
+            conn.send((True, fn(root, *args, **kwargs)))
+        except Exception:
+            conn.send((False, traceback.format_exc()))
+
+
+class _Worker(object):
+
+    def __init__(self, context, factory):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, factory),
+                                       daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None
+
+    def wait_ready(self):
+        try:
+            status, detail = self.conn.recv()
+        except EOFError:
+            status, detail = "failed", "worker exited during start-up"
+        if status != "ready":
+            self.process.join()
+            raise RuntimeError("Engine factory failed in worker:\n%s" % detail)
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError):
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+
+
+class EnginePool(object):
+    """
+    Pool of worker processes, each owning one STK engine.
+
+    Jobs are ``(fn, args)`` or ``(fn, args, kwargs)`` tuples, or bare callables,
+    and are called as ``fn(root, *args, **kwargs)`` inside a worker. ``fn`` and
+    its arguments must be picklable, so define jobs at module level. A worker
+    that dies mid-job is restarted and the job retried up to ``max_retries``
+    times.
+
+        with EnginePool(4) as pool:
+            results = pool.map(build_and_extract, cases)
+    """
+
+    def __init__(self, processes, factory=create_stk_engine, max_retries=1,
+                 start_method="spawn"):
+        if processes < 1:
+            raise ValueError("processes must be at least 1")
+        self.processes = processes
+        self.factory = factory
+        self.max_retries = max_retries
+        self._context = multiprocessing.get_context(start_method)
+        self._workers = []
+        self.restarts = 0
+
+    def start(self):
+        if self._workers:
+            return self
+        # Launch every engine before waiting on any, so they start in parallel
+        self._workers = [_Worker(self._context, self.factory)
+                         for _ in range(self.processes)]
+        try:
+            for worker in self._workers:
+                worker.wait_ready()
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _restart(self, worker):
+        worker.stop()
+        replacement = _Worker(self._context, self.factory)
+        replacement.wait_ready()
+        self._workers[self._workers.index(worker)] = replacement
+        self.restarts += 1
+        return replacement
+
+    def run(self, jobs, return_exceptions=False):
+        """
+        Run ``jobs`` across the pool and return their results in order.
+
+        A failed job raises :class:`JobError` (or :class:`WorkerCrashed`) unless
+        ``return_exceptions`` is set, in which case the exception takes the
+        job's place in the returned list.
+        """
+        self.start()
+        jobs = [_normalise_job(job) for job in jobs]
+        results = [None] * len(jobs)
+        attempts = [0] * len(jobs)
+        pending = deque(range(len(jobs)))
+        idle = deque(self._workers)
+        busy = {}
+
+        while pending or busy:
+            while pending and idle:
+                worker = idle.popleft()
+                index = pending.popleft()
+                worker.job = index
+                worker.conn.send(jobs[index])
+                busy[worker.conn] = worker
+
+            ready = wait(list(busy) + [w.process.sentinel for w in busy.values()])
+            for worker in list(busy.values()):
+                if worker.conn not in ready and worker.process.sentinel not in ready:
+                    continue
+                index = worker.job
+                try:
+                    ok, value = worker.conn.recv()
+                except (EOFError, OSError):
+                    # Worker died mid-job: replace it and maybe retry the job
+                    del busy[worker.conn]
+                    attempts[index] += 1
+                    # The pipe can close before the process is reaped
+                    worker.process.join(1)
+                    if attempts[index] > self.max_retries:
+                        results[index] = WorkerCrashed(
+                            "Worker exited with code %s while running job %d"
+                            % (worker.process.exitcode, index))
+                    else:
+                        pending.appendleft(index)
+                    idle.append(self._restart(worker))
+                    continue
+                del busy[worker.conn]
+                worker.job = None
+                idle.append(worker)
+                results[index] = value if ok else JobError(value)
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, (JobError, WorkerCrashed)):
+                    raise result
+        return results
+
+    def map(self, fn, iterable, return_exceptions=False):
+        """Run ``fn(root, item)`` for every item and return results in order."""
+        return self.run([(fn, (item,)) for item in iterable], return_exceptions)
+
+
+def _normalise_job(job):
+    if callable(job):
+        return job, (), {}
+    if len(job) == 2:
+        return job[0], tuple(job[1]), {}
+    fn, args, kwargs = job
+    return fn, tuple(args), dict(kwargs)
@@ -0,0 +1,154 @@
+# coding: utf-8
+"""
+Scenario building blocks, following the steps in ``STK and Python with comtypes.py``.
+
+Interface queries on long-lived objects go through
+:func:`~stk_integration.interfaces.query_interface`, so repeated calls on the
+same scenario, satellite or propagator only resolve each interface once.
+"""
+
+from .interfaces import interface_cache, query_interface
+from .typelib import lazy_library
+from .units import unit_tracker
+
+
+def get_type_libraries(root):
+    """
+    Return the ``(STKObjects, STKUtil)`` enum/interface namespaces for ``root``.
+
+    Stand-in engines carry their own as ``root.type_libraries``; a real STK
+    root gets lazy views of the comtypes-generated wrappers, which are only
+    imported once an interface is needed.
+    """
+    libraries = getattr(root, "type_libraries", None)
+    if libraries is not None:
+        return libraries
+    return lazy_library("STKObjects"), lazy_library("STKUtil")
+
+
+def new_scenario(root, name, start, stop, rewind=True):
+    """
+    Create a scenario, set its analysis interval and return it as ``IAgScenario``.
+
+    ``rewind`` resets the animation as the notebook does; headless sessions
+    have nothing to animate and can skip it.
+    """
+    from .dirty import reset_tracker
+    STKObjects, _ = get_type_libraries(root)
+    # Whatever was cached or marked dirty for a previous scenario is gone with it
+    interface_cache(root).clear()
+    reset_tracker(root)
+    root.NewScenario(name)
+    sc2 = query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+    sc2.SetTimePeriod(start, stop)
+    if rewind:
+        root.Rewind()
+    return sc2
+
+
+def close_scenario(root):
+    """
+    Close the loaded scenario, if any, and forget the interfaces resolved for
+    its objects and its dirty satellites.
+    """
+    from .dirty import reset_tracker
+    current = root.CurrentScenario
+    if current is not None and current:
+        root.CloseScenario()
+    interface_cache(root).clear()
+    reset_tracker(root)
+
+
+def add_facility(root, name, lat, lon, alt=0.0):
+    """Insert a facility at a geodetic position (deg, deg, km)."""
+    STKObjects, _ = get_type_libraries(root)
+    fac = root.CurrentScenario.Children.New(STKObjects.eFacility, name)
+    fac2 = query_interface(root, fac, STKObjects.IAgFacility)
+    fac2.Position.AssignGeodetic(lat, lon, alt)
+    return fac
+
+
+def add_satellite(root, name, epoch, mean_motion, eccentricity, inclination,
+                  arg_of_perigee, raan, mean_anomaly, propagate=True):
+    """
+    Insert a J2 satellite from classical elements, as in the notebook.
+
+    ``mean_motion`` is in revs/day and the angles are in degrees. Returns the
+    ``IAgStkObject`` and the ``IAgVePropagatorJ2Perturbation`` propagator.
+    With ``propagate=False`` the satellite is left dirty for
+    :func:`~stk_integration.dirty.propagate_dirty`, and the propagator is
+    returned tracked so that calling its ``Propagate()`` clears that.
+    """
+    STKObjects, STKUtil = get_type_libraries(root)
+    sat = root.CurrentScenario.Children.New(STKObjects.eSatellite, name)
+    sat2 = query_interface(root, sat, STKObjects.IAgSatellite)
+    sat2.SetPropagatorType(STKObjects.ePropagatorJ2Perturbation)
+    satProp = query_interface(root, sat2.Propagator, STKObjects.IAgVePropagatorJ2Perturbation)
+    satProp.InitialState.Epoch = epoch
+
+    keplerian = satProp.InitialState.Representation.ConvertTo(STKUtil.eOrbitStateClassical)
+    assign_classical(root, keplerian, mean_motion, eccentricity, inclination,
+                     arg_of_perigee, raan, mean_anomaly)
+    satProp.InitialState.Representation.Assign(keplerian)
+    if propagate:
+        satProp.Propagate()
+        return sat, satProp
+    from .dirty import TrackedPropagator, change_tracker
+    path = "*/Satellite/%s" % name
+    tracker = change_tracker(root)
+    tracker.mark_dirty(path, satProp)
+    return sat, TrackedPropagator(satProp, tracker, path)
+
+
+def assign_classical(root, keplerian, mean_motion, eccentricity, inclination,
+                     arg_of_perigee, raan, mean_anomaly):
+    """
+    Fill a classical orbit state with mean motion (revs/day), e and angles (deg).
+
+    Values are converted locally into the unit preferences already in effect,
+    so no ``SetCurrentUnit`` switches are needed.
+    """
+    STKObjects, _ = get_type_libraries(root)
+    units = unit_tracker(root)
+    keplerian2 = keplerian.QueryInterface(STKObjects.IAgOrbitStateClassical)
+    keplerian2.SizeShapeType = STKObjects.eSizeShapeMeanMotion
+    keplerian2.LocationType = STKObjects.eLocationMeanAnomaly
+    keplerian2.Orientation.AscNodeType = STKObjects.eAscNodeRAAN
+
+    sizeShape = keplerian2.SizeShape.QueryInterface(STKObjects.IAgClassicalSizeShapeMeanMotion)
+    sizeShape.MeanMotion = units.rate_to_current(mean_motion, ("revs", "day"))
+    sizeShape.Eccentricity = eccentricity
+
+    orientation = keplerian2.Orientation
+    orientation.Inclination = units.to_current(inclination, "AngleUnit", "deg")
+    orientation.ArgOfPerigee = units.to_current(arg_of_perigee, "AngleUnit", "deg")
+    orientation.AscNode.QueryInterface(STKObjects.IAgOrientationAscNodeRAAN).Value = \
+        units.to_current(raan, "AngleUnit", "deg")
+    keplerian2.Location.QueryInterface(STKObjects.IAgClassicalLocationMeanAnomaly).Value = \
+        units.to_current(mean_anomaly, "AngleUnit", "deg")
+    return keplerian2
+
+
+def satellite_propagator(root, sat):
+    """
+    The satellite's propagator as ``IAgVePropagatorJ2Perturbation`` or
+    ``IAgVePropagatorTwoBody``, or ``None`` for other propagator types.
+    """
+    STKObjects, _ = get_type_libraries(root)
+    sat2 = query_interface(root, sat, STKObjects.IAgSatellite)
+    propagatorType = sat2.PropagatorType
+    if propagatorType == STKObjects.ePropagatorJ2Perturbation:
+        return query_interface(root, sat2.Propagator, STKObjects.IAgVePropagatorJ2Perturbation)
+    if propagatorType == STKObjects.ePropagatorTwoBody:
+        return query_interface(root, sat2.Propagator, STKObjects.IAgVePropagatorTwoBody)
+    return None
+
+
+def propagate(root, path):
+    """Propagate the satellite at ``path`` (e.g. ``"*/Satellite/codeSat"``)."""
+    satProp = satellite_propagator(root, root.GetObjectFromPath(path))
+    if satProp is None:
+        raise ValueError("%s does not use a J2 or two-body propagator" % path)
+    satProp.Propagate()
+    from .dirty import change_tracker
+    change_tracker(root).propagated(path)
@@ -0,0 +1,164 @@
+# coding: utf-8
+"""
+STK sessions without the desktop UI.
+
+The notebooks start the full desktop application, make it visible and size its
+window from ``GetSystemMetrics``. For batch work :func:`open_session` can
+instead start STK Engine with graphics disabled:
+
+    with open_session("headless") as session:
+        new_scenario(session.root, "Batch", start, stop, rewind=False)
+        with session.bulk():
+            ...                 # no graphics or animation updates in here
+
+Backends are pluggable through :func:`register_backend`; ``"desktop"``
+reproduces the notebook set-up, ``"headless"`` uses STK Engine, and ``"fake"``
+runs against :mod:`stk_integration.fake` so the same code works on Linux.
+"""
+
+import time
+from contextlib import contextmanager
+
+from .scenario import close_scenario
+
+STK_VERSION = 11
+
+# Image name of the desktop application's process
+DESKTOP_PROCESS = "AgUiApplication.exe"
+
+
+class Session(object):
+    """
+    An application (possibly ``None``) and its ``IAgStkObjectRoot``. ``pid``
+    is the STK process when STK runs outside this one (the desktop
+    application), if it could be identified.
+    """
+
+    def __init__(self, root, app=None, headless=False, close=None):
+        self.root = root
+        self.app = app
+        self.headless = headless
+        self.startup_seconds = None
+        self.pid = None
+        self._close = close
+
+    def close(self):
+        if self.root is not None:
+            try:
+                close_scenario(self.root)
+            except Exception:
+                pass
+        if self._close is not None:
+            self._close(self)
+        self.root = None
+        self.app = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def bulk(self):
+        """
+        Suspend graphics and animation updates while building or editing many
+        objects, via ``root.BeginUpdate()``/``EndUpdate()``.
+        """
+        self.root.BeginUpdate()
+        try:
+            yield self.root
+        finally:
+            self.root.EndUpdate()
+
+
+def _desktop_pids():
+    # Running desktop STK processes, or None without psutil
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return set(process.pid for process in psutil.process_iter(["name"])
+               if process.info["name"] == DESKTOP_PROCESS)
+
+
+def _desktop(visible=True, width=None, height=None, version=STK_VERSION):
+    # What the notebooks do: a visible, user-controlled desktop application
+    from comtypes.client import CreateObject
+    before = _desktop_pids()
+    app = CreateObject("STK%d.Application" % version)
+    app.Visible = visible
+    app.UserControl = visible
+    if visible:
+        from win32api import GetSystemMetrics
+        app.Top = 0
+        app.Left = 0
+        app.Width = width or int(GetSystemMetrics(0) / 2)
+        app.Height = height or int(GetSystemMetrics(1) - 30)
+    session = Session(app.Personality2, app, headless=False,
+                      close=lambda session: session.app.Quit())
+    if before is not None:
+        # The application runs in its own process, started by COM rather than by us
+        started = _desktop_pids() - before
+        if len(started) == 1:
+            session.pid = started.pop()
+    return session
+
+
+def _headless(version=STK_VERSION):
+    # STK Engine: no application window, graphics disabled before the root exists
+    from comtypes.client import CreateObject
+    stkx = CreateObject("STKX%d.Application" % version)
+    stkx.NoGraphics = True
+    root = CreateObject("AgStkObjects%d.AgStkObjectRoot" % version)
+    return Session(root, stkx, headless=True)
+
+
+def _fake(headless=True, latency=0.0, member_latency=None):
+    from .fake import create_fake_application
+    app = create_fake_application(latency, member_latency)
+    if headless:
+        return Session(app.Personality2, None, headless=True)
+    app.Visible = True
+    app.UserControl = True
+    return Session(app.Personality2, app, headless=False,
+                   close=lambda session: session.app.Quit())
+
+
+_backends = {
+    "desktop": _desktop,
+    "headless": _headless,
+    "fake": _fake,
+}
+
+
+def register_backend(name, factory):
+    """Add a session backend: ``factory(**options)`` must return a :class:`Session`."""
+    _backends[name] = factory
+
+
+def open_session(backend="headless", **options):
+    """Start a :class:`Session` with the named backend, timing the start-up."""
+    try:
+        factory = _backends[backend]
+    except KeyError:
+        raise ValueError("Unknown session backend %r (have: %s)"
+                         % (backend, ", ".join(sorted(_backends))))
+    t0 = time.perf_counter()
+    session = factory(**options)
+    session.startup_seconds = time.perf_counter() - t0
+    return session
+
+
+# Sessions opened by engine factories live as long as their worker process
+_engineSessions = []
+
+
+def headless_engine(backend="headless", **options):
+    """
+    Engine factory for :class:`~stk_integration.pool.EnginePool` returning the
+    root of a new session; wrap in ``functools.partial`` to choose the backend.
+    """
+    session = open_session(backend, **options)
+    _engineSessions.append(session)
+    return session.root
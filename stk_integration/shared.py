@@ -0,0 +1,311 @@
+# coding: utf-8
+"""
+Hand extracted ephemerides to worker processes without pickling them.
+
+Sending a DataFrame to each ``multiprocessing`` worker pickles it once per
+worker and unpickles a private copy on the other side. A :class:`SharedStore`
+instead copies each result once into a named shared-memory block (or a
+memory-mapped file) and hands out a small picklable
+:class:`SharedDescriptor` naming the object path, provider, columns, dtypes and
+shapes. Workers :func:`attach` to it and get read-only NumPy views of the same
+pages:
+
+    with SharedStore() as store:
+        descriptors = store.publish_extraction(
+            root, paths, "Cartesian Position//J2000", start, stop, 60,
+            ["Time", "x", "y", "z"])
+        pool.map(analyse, descriptors.values())
+
+    def analyse(root, descriptor):
+        with attached(descriptor) as result:     # ElementResult over shared pages
+            return result["x"].max()
+
+Blocks are reference counted by the store: ``publish`` holds one reference,
+``acquire``/``release`` add and drop more, and a block is unlinked when its
+count reaches zero or the store closes. Each worker process maps a block once
+however many times it attaches, and unmaps it after the last ``detach``.
+
+``backend="shm"`` uses :mod:`multiprocessing.shared_memory` and suits workers
+started by ``multiprocessing``/``EnginePool``. ``backend="mmap"`` writes files
+under ``directory`` instead, for unrelated processes or data larger than RAM.
+"""
+
+import mmap
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from .dataproviders import ElementResult, exec_elements, resolve_providers
+from .ephemeris import Ephemeris
+
+_ALIGN = 64
+
+
+class SharedDescriptor(object):
+    """
+    Picklable description of one shared block: where it lives (``name`` and
+    ``backend``), what it holds (``key`` such as the object path,
+    ``provider``) and how to view it (``arrays`` of ``(column, dtype, shape,
+    offset)``).
+    """
+
+    def __init__(self, name, backend, arrays, key=None, provider=None, kind="result",
+                 meta=None):
+        self.name = name
+        self.backend = backend
+        self.arrays = [(column, dtype, tuple(shape), offset)
+                       for column, dtype, shape, offset in arrays]
+        self.key = key
+        self.provider = provider
+        self.kind = kind
+        self.meta = meta or {}
+
+    @property
+    def columns(self):
+        return [column for column, _, _, _ in self.arrays]
+
+    @property
+    def nbytes(self):
+        return sum(int(np.prod(shape)) * np.dtype(dtype).itemsize
+                   for _, dtype, shape, _ in self.arrays)
+
+    def __repr__(self):
+        return "SharedDescriptor(%r, key=%r, provider=%r, columns=%r)" % (
+            self.name, self.key, self.provider, self.columns)
+
+
+def _layout(arrays):
+    # Column offsets aligned for vectorised reads, and the total block size
+    layout, offset = [], 0
+    for column, array in arrays:
+        offset = -(-offset // _ALIGN) * _ALIGN
+        layout.append((column, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+    return layout, max(offset, 1)
+
+
+def _arrays_of(data):
+    # (kind, [(column, array)], meta) for everything publish() accepts
+    if isinstance(data, Ephemeris):
+        arrays = [("times", data.times), ("positions", data.positions)]
+        if data.velocities is not None:
+            arrays.append(("velocities", data.velocities))
+        return "ephemeris", arrays, {"names": list(data.names), "frame": data.frame}
+    if isinstance(data, ElementResult):
+        data = data.columns
+    elif hasattr(data, "to_numpy") and hasattr(data, "columns"):
+        data = dict((column, data[column].to_numpy()) for column in data.columns)
+    return "result", [(str(column), np.asarray(array)) for column, array in data.items()], None
+
+
+class _Mapping(object):
+    # One process's view of a block; buffer is what NumPy arrays are built on
+
+    def __init__(self, descriptor):
+        if descriptor.backend == "shm":
+            from multiprocessing.shared_memory import SharedMemory
+            self._handle = SharedMemory(descriptor.name)
+            self.buffer = self._handle.buf
+        else:
+            with open(descriptor.name, "rb") as f:
+                self._handle = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.buffer = self._handle
+        self.count = 0
+
+    def arrays(self, descriptor):
+        arrays = {}
+        for column, dtype, shape, offset in descriptor.arrays:
+            array = np.ndarray(shape, dtype, buffer=self.buffer, offset=offset)
+            array.flags.writeable = False
+            arrays[column] = array
+        return arrays
+
+    def close(self):
+        # BufferError while views are still alive; retried on later detaches
+        self.buffer = None
+        self._handle.close()
+
+
+_mappings = {}
+_lingering = []
+
+
+def _sweep():
+    for mapping in list(_lingering):
+        try:
+            mapping.close()
+        except BufferError:
+            continue
+        _lingering.remove(mapping)
+
+
+def attach(descriptor):
+    """
+    Zero-copy read-only view of a published block: an
+    :class:`~stk_integration.dataproviders.ElementResult` for results and
+    :class:`~stk_integration.ephemeris.Ephemeris` for ephemerides. Pair with
+    :func:`detach`, or use :func:`attached`.
+    """
+    _sweep()
+    mapping = _mappings.get(descriptor.name)
+    if mapping is None:
+        mapping = _mappings[descriptor.name] = _Mapping(descriptor)
+    mapping.count += 1
+    arrays = mapping.arrays(descriptor)
+    if descriptor.kind == "ephemeris":
+        return Ephemeris(arrays["times"], arrays["positions"], arrays.get("velocities"),
+                         descriptor.meta["names"], descriptor.meta["frame"])
+    return ElementResult(arrays)
+
+
+def detach(descriptor):
+    """Drop one :func:`attach` of ``descriptor``; the block is unmapped after the last."""
+    mapping = _mappings.get(descriptor.name)
+    if mapping is None:
+        return
+    mapping.count -= 1
+    if mapping.count <= 0:
+        del _mappings[descriptor.name]
+        _lingering.append(mapping)
+    _sweep()
+
+
+@contextmanager
+def attached(descriptor):
+    """``with attached(descriptor) as data:`` -- :func:`attach` then :func:`detach`."""
+    data = attach(descriptor)
+    try:
+        yield data
+    finally:
+        del data
+        detach(descriptor)
+
+
+class SharedStore(object):
+    """
+    Owner of published blocks in the parent process.
+
+    ``backend`` is ``"shm"`` or ``"mmap"``; ``directory`` holds the mmap files
+    (a temporary directory removed on :meth:`close` by default).
+    """
+
+    def __init__(self, backend="shm", directory=None, prefix="stk"):
+        if backend not in ("shm", "mmap"):
+            raise ValueError("backend must be 'shm' or 'mmap'")
+        self.backend = backend
+        self.prefix = prefix
+        self._ownsDirectory = backend == "mmap" and directory is None
+        self.directory = tempfile.mkdtemp(prefix=prefix) if self._ownsDirectory else directory
+        self._blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def publish(self, data, key=None, provider=None):
+        """
+        Copy ``data`` (an ``ElementResult``, DataFrame, dict of arrays or
+        :class:`~stk_integration.ephemeris.Ephemeris`) into a new block and
+        return its :class:`SharedDescriptor`, holding one reference.
+        """
+        kind, arrays, meta = _arrays_of(data)
+        layout, size = _layout(arrays)
+        name = "%s_%s" % (self.prefix, uuid.uuid4().hex[:16])
+        if self.backend == "shm":
+            from multiprocessing.shared_memory import SharedMemory
+            handle = SharedMemory(name, create=True, size=size)
+            buffer = handle.buf
+        else:
+            name = os.path.join(self.directory, name + ".bin")
+            handle = buffer = np.memmap(name, dtype=np.uint8, mode="w+", shape=(size,))
+        for (column, array), (_, dtype, shape, offset) in zip(arrays, layout):
+            np.ndarray(shape, dtype, buffer=buffer, offset=offset)[...] = array
+        if self.backend == "mmap":
+            handle.flush()
+            handle = buffer = None
+        del buffer
+        descriptor = SharedDescriptor(name, self.backend, layout, key, provider, kind, meta)
+        # The shm handle stays open: on Windows the block lives only while it does
+        self._blocks[name] = [handle, 1, descriptor]
+        return descriptor
+
+    def publish_results(self, results, provider=None):
+        """Publish ``{path: result}`` and return ``{path: descriptor}``."""
+        return dict((key, self.publish(result, key, provider)) for key, result in results.items())
+
+    def publish_extraction(self, root, paths, provider_path, start, stop, step, elements,
+                           **options):
+        """
+        ``exec_elements`` ``provider_path`` for every object path and publish
+        each result straight away; returns ``{path: descriptor}``.
+        """
+        paths = list(paths)
+        descriptors = {}
+        for path, provider in zip(paths, resolve_providers(root, paths, provider_path)):
+            result = exec_elements(provider, start, stop, step, elements, **options)
+            descriptors[path] = self.publish(result, path, provider_path)
+        return descriptors
+
+    def acquire(self, descriptor):
+        """Take another reference to ``descriptor``'s block."""
+        self._blocks[descriptor.name][1] += 1
+        return descriptor
+
+    def release(self, descriptor):
+        """Drop a reference; the block is unlinked when none remain."""
+        block = self._blocks.get(descriptor.name)
+        if block is None:
+            return
+        block[1] -= 1
+        if block[1] <= 0:
+            self._unlink(descriptor.name)
+
+    @contextmanager
+    def lease(self, descriptors):
+        """Hold an extra reference to each descriptor for the ``with`` block."""
+        descriptors = list(descriptors)
+        for descriptor in descriptors:
+            self.acquire(descriptor)
+        try:
+            yield descriptors
+        finally:
+            for descriptor in descriptors:
+                self.release(descriptor)
+
+    def refcount(self, descriptor):
+        block = self._blocks.get(descriptor.name)
+        return 0 if block is None else block[1]
+
+    @property
+    def descriptors(self):
+        return [block[2] for block in self._blocks.values()]
+
+    @property
+    def nbytes(self):
+        return sum(block[2].nbytes for block in self._blocks.values())
+
+    def _unlink(self, name):
+        handle = self._blocks.pop(name)[0]
+        if self.backend == "shm":
+            handle.close()
+            handle.unlink()
+        else:
+            try:
+                os.remove(name)
+            except OSError:
+                # Still mapped by a worker on Windows; the directory cleanup retries
+                pass
+
+    def close(self):
+        """Unlink every block still published, whatever its count."""
+        for name in list(self._blocks):
+            self._unlink(name)
+        if self._ownsDirectory and self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self.directory = None
@@ -0,0 +1,139 @@
+# coding: utf-8
+"""
+Snapshot a built scenario and restore it instead of rebuilding it.
+
+Every run repeats ``NewScenario``, ``SetTimePeriod``, object creation and
+``Propagate()`` even when the base scenario never changes. A snapshot saves
+the scenario once with ``SaveScenarioAs``, next to a ``manifest.json`` listing
+the interval and every object with a hash of its propagator state. Restoring
+is then a single ``LoadScenario``:
+
+    snapshot_scenario(root, "snapshots/constellation")     # after building it
+    ...
+    sc2 = restore_scenario(root, "snapshots/constellation")
+
+    # Or warm every pooled engine from the snapshot as it starts
+    with EnginePool(8, factory=SnapshotEngine("snapshots/constellation")) as pool:
+        ...
+
+``verify="objects"`` (the default) checks that the loaded scenario holds the
+objects of the manifest. ``verify="states"`` also compares the state hashes,
+which reads every satellite's initial state back, so keep the unit
+preferences the same as when the snapshot was taken. Objects that a
+``spec.Plan`` had applied and the satellites still waiting in
+``propagate_dirty`` are recorded too, so ``compile_plan`` still diffs against
+the restored scenario and nothing pending is lost.
+"""
+
+import json
+import os
+import time
+
+from . import dirty, spec
+from .cache import propagator_state, state_hash
+from .interfaces import query_interface
+from .pool import create_stk_engine
+from .scenario import close_scenario, get_type_libraries
+from .units import unit_tracker
+
+MANIFEST = "manifest.json"
+
+
+def _path(obj):
+    return "*/%s/%s" % (obj.ClassName, obj.InstanceName)
+
+
+def snapshot_scenario(root, directory, states=True):
+    """
+    Save the current scenario to ``directory`` as ``<name>.sc`` plus
+    ``manifest.json`` and return the manifest. ``states=False`` skips reading
+    back each object's state for the hashes.
+    """
+    STKObjects, _ = get_type_libraries(root)
+    scenario = root.CurrentScenario
+    if scenario is None or not scenario:
+        raise ValueError("No scenario is loaded")
+    sc2 = query_interface(root, scenario, STKObjects.IAgScenario)
+    name = scenario.InstanceName
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    root.SaveScenarioAs(os.path.abspath(os.path.join(directory, name + ".sc")))
+
+    objects = []
+    for child in scenario.Children:
+        entry = {"path": _path(child)}
+        if states:
+            entry["state"] = state_hash(propagator_state(root, child))
+        objects.append(entry)
+    manifest = {
+        "scenario": {"name": name, "start": sc2.StartTime, "stop": sc2.StopTime},
+        "file": name + ".sc",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "objects": objects,
+        "spec": spec.export_record(root),
+        "dirty": dirty.export_record(root),
+    }
+    with open(os.path.join(directory, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST)) as f:
+        return json.load(f)
+
+
+def _verify(root, scenario, manifest, verify):
+    loaded = dict((_path(child), child) for child in scenario.Children)
+    expected = [entry["path"] for entry in manifest["objects"]]
+    missing = [path for path in expected if path not in loaded]
+    extra = sorted(set(loaded) - set(expected))
+    if missing or extra:
+        raise ValueError("Restored scenario does not match its manifest: missing %s, extra %s"
+                         % (missing, extra))
+    if verify != "states":
+        return
+    changed = [entry["path"] for entry in manifest["objects"]
+               if "state" in entry
+               and state_hash(propagator_state(root, loaded[entry["path"]])) != entry["state"]]
+    if changed:
+        raise ValueError("Restored objects differ from the snapshot: %s" % changed)
+
+
+def restore_scenario(root, directory, verify="objects"):
+    """
+    Close whatever ``root`` has loaded, load the snapshot in ``directory`` and
+    return it as ``IAgScenario``. ``verify`` is ``None``, ``"objects"`` or
+    ``"states"``; a mismatch raises ``ValueError``.
+    """
+    if verify not in (None, "objects", "states"):
+        raise ValueError("verify must be None, 'objects' or 'states'")
+    STKObjects, _ = get_type_libraries(root)
+    manifest = load_manifest(directory)
+    close_scenario(root)
+    root.LoadScenario(os.path.abspath(os.path.join(directory, manifest["file"])))
+    # The scenario file brings its own unit preferences
+    unit_tracker(root).forget()
+    scenario = root.CurrentScenario
+    if verify is not None:
+        _verify(root, scenario, manifest, verify)
+    spec.import_record(root, manifest.get("spec"))
+    dirty.import_record(root, manifest.get("dirty", []))
+    return query_interface(root, scenario, STKObjects.IAgScenario)
+
+
+class SnapshotEngine(object):
+    """
+    Picklable :class:`~stk_integration.pool.EnginePool` factory: start an
+    engine with ``factory`` and restore the snapshot in ``directory`` into it.
+    """
+
+    def __init__(self, directory, factory=create_stk_engine, verify="objects"):
+        self.directory = os.path.abspath(directory)
+        self.factory = factory
+        self.verify = verify
+
+    def __call__(self):
+        root = self.factory()
+        restore_scenario(root, self.directory, self.verify)
+        return root
@@ -0,0 +1,359 @@
+# coding: utf-8
+"""
+Declarative scenario descriptions compiled into a minimal plan.
+
+Instead of the notebook's step-by-step building code, describe the scenario:
+
+    scenario: {name: Python_Starter, start: "10 Jun 2016 04:00:00.000",
+               stop: "11 Jun 2016 04:00:00.000"}
+    step: 60
+    facilities:
+      - {name: GroundStation, lat: 22.3, lon: 113.9, alt: 0}
+    satellites:
+      - name: codeSat
+        propagator: J2Perturbation
+        classical: {mean_motion: 15.08385840, eccentricity: 0.0002947,
+                    inclination: 28.4703, arg_of_perigee: 114.7239,
+                    raan: 309.1977, mean_anomaly: 245.3924}
+
+and apply it:
+
+    plan = compile_plan(root, load_spec("scenario.yaml"))
+    print(plan.describe())      # new / update / unload / unchanged per object
+    report = plan.execute(root)
+
+Distances are km, angles degrees and mean motion revs/day, as in the
+notebook. Satellites take either ``classical`` elements (``mean_motion`` or
+``sma``) or a J2000 ``cartesian`` state (``x``..``vz`` in km and km/s), plus an
+optional ``epoch`` that defaults to the scenario start.
+
+The compiled plan sends every object change as Connect commands in batches of
+``ExecuteMultipleCommands``. Connect works in fixed units, so the plan needs
+no unit switches; the one date unit needed to set the scenario interval goes
+through :func:`~stk_integration.units.unit_tracker` and is skipped if it is
+already UTCG. The applied spec is remembered per root, so compiling again
+after an edit touches only the objects that changed. Objects that were already
+loaded but were not applied from a spec are updated in place. Facilities and
+satellites that are missing from the spec are unloaded.
+"""
+
+import copy
+import json
+import os
+import weakref
+from collections import OrderedDict
+
+import pandas as pd
+
+from .connect import execute_rows, facility_commands, satellite_commands
+from .interfaces import query_interface
+from .scenario import get_type_libraries, new_scenario
+from .times import parse_utcg
+from .units import unit_tracker
+
+CLASSICAL_FIELDS = ("eccentricity", "inclination", "arg_of_perigee", "raan", "mean_anomaly")
+CARTESIAN_FIELDS = ("x", "y", "z", "vx", "vy", "vz")
+PROPAGATORS = ("J2Perturbation", "TwoBody")
+
+
+def load_spec(source):
+    """
+    Read a spec from a dict, a ``.json``/``.yaml`` file, or JSON/YAML text.
+    YAML needs PyYAML.
+    """
+    if isinstance(source, dict):
+        return copy.deepcopy(source)
+    text = source
+    isYaml = True
+    if os.path.isfile(source):
+        with open(source) as f:
+            text = f.read()
+        isYaml = os.path.splitext(source)[1].lower() in (".yaml", ".yml")
+    try:
+        return json.loads(text)
+    except ValueError:
+        if not isYaml:
+            raise
+    try:
+        import yaml
+    except ImportError:
+        raise ImportError("Reading YAML scenario specs needs PyYAML (pip install pyyaml)")
+    return yaml.safe_load(text)
+
+
+def _require(entry, fields, what):
+    missing = [field for field in fields if field not in entry]
+    if missing:
+        raise ValueError("%s is missing %s" % (what, ", ".join(missing)))
+
+
+def normalize_spec(spec):
+    """Validate ``spec`` and fill in defaults, returning a new canonical dict."""
+    spec = load_spec(spec)
+    _require(spec, ("scenario",), "Scenario spec")
+    scenario = spec["scenario"]
+    _require(scenario, ("name", "start", "stop"), "scenario")
+    scenario = {"name": str(scenario["name"]), "start": scenario["start"],
+                "stop": scenario["stop"]}
+    step = float(spec.get("step", 60.0))
+
+    names = set()
+
+    def check_name(name, kind):
+        if (kind, name) in names:
+            raise ValueError("Duplicate %s name %r" % (kind.lower(), name))
+        names.add((kind, name))
+
+    facilities = []
+    for entry in spec.get("facilities") or ():
+        _require(entry, ("name", "lat", "lon"), "facility")
+        check_name(entry["name"], "Facility")
+        facilities.append({"name": str(entry["name"]), "lat": float(entry["lat"]),
+                           "lon": float(entry["lon"]), "alt": float(entry.get("alt", 0.0))})
+
+    satellites = []
+    for entry in spec.get("satellites") or ():
+        _require(entry, ("name",), "satellite")
+        name = str(entry["name"])
+        check_name(name, "Satellite")
+        what = "satellite %r" % name
+        propagator = entry.get("propagator", "J2Perturbation")
+        if propagator not in PROPAGATORS:
+            raise ValueError("%s: propagator must be one of %s" % (what, ", ".join(PROPAGATORS)))
+        satellite = {"name": name, "propagator": propagator,
+                     "epoch": entry.get("epoch", scenario["start"])}
+        if ("classical" in entry) == ("cartesian" in entry):
+            raise ValueError("%s needs exactly one of classical or cartesian" % what)
+        if "classical" in entry:
+            classical = entry["classical"]
+            _require(classical, CLASSICAL_FIELDS, what)
+            if ("mean_motion" in classical) == ("sma" in classical):
+                raise ValueError("%s needs exactly one of mean_motion or sma" % what)
+            size = "mean_motion" if "mean_motion" in classical else "sma"
+            satellite["classical"] = dict((field, float(classical[field]))
+                                          for field in (size,) + CLASSICAL_FIELDS)
+        else:
+            cartesian = entry["cartesian"]
+            _require(cartesian, CARTESIAN_FIELDS, what)
+            satellite["cartesian"] = dict((field, float(cartesian[field]))
+                                          for field in CARTESIAN_FIELDS)
+        satellites.append(satellite)
+
+    return {"scenario": scenario, "step": step, "facilities": facilities,
+            "satellites": satellites}
+
+
+def _fingerprint(entry, step=None):
+    return json.dumps([entry, step], sort_keys=True)
+
+
+# Per root: what the last executed plan left in the scenario
+_applied = weakref.WeakKeyDictionary()
+
+
+def reset_record(root):
+    """Forget what plans have applied to ``root``."""
+    _applied.pop(root, None)
+
+
+def export_record(root):
+    """
+    What plans have applied to ``root`` as JSON-ready data, or ``None``; see
+    :func:`import_record`.
+    """
+    record = _applied.get(root)
+    if record is None:
+        return None
+    return {"scenario": record["scenario"],
+            "objects": [[kind, name, fingerprint]
+                        for (kind, name), fingerprint in record["objects"].items()]}
+
+
+def import_record(root, record):
+    """
+    Restore an :func:`export_record` result for ``root``, e.g. after loading
+    the scenario it was exported with, so the next plan diffs against it.
+    """
+    if record is None:
+        reset_record(root)
+        return
+    _applied[root] = {"scenario": record["scenario"],
+                      "objects": dict(((kind, name), fingerprint)
+                                      for kind, name, fingerprint in record["objects"])}
+
+
+def _current_scenario(root):
+    scenario = root.CurrentScenario
+    # comtypes returns a NULL pointer (falsy) rather than None
+    if scenario is None or not scenario:
+        return None
+    return scenario
+
+
+def _same_period(root, scenario, spec):
+    STKObjects, _ = get_type_libraries(root)
+    sc2 = query_interface(root, scenario, STKObjects.IAgScenario)
+    with unit_tracker(root).scope(DateFormat="UTCG"):
+        start, stop = sc2.StartTime, sc2.StopTime
+    return (parse_utcg(start) == parse_utcg(spec["start"])
+            and parse_utcg(stop) == parse_utcg(spec["stop"]))
+
+
+class Plan(object):
+    """
+    Changes needed to bring the loaded scenario in line with a spec.
+
+    ``scenario_action`` is ``"new"``, ``"period"`` or ``None``. ``actions``
+    lists ``(kind, name, action)`` with action ``"new"``, ``"update"`` or
+    ``"unload"``, one per Connect command row in ``rows``; ``unchanged``
+    lists the objects left alone.
+    """
+
+    def __init__(self, spec, scenario_action, actions, unchanged, rows, fingerprints):
+        self.spec = spec
+        self.scenario_action = scenario_action
+        self.actions = actions
+        self.unchanged = unchanged
+        self.rows = rows
+        self._fingerprints = fingerprints
+
+    @property
+    def commands(self):
+        return [command for _, commands in self.rows for command in commands]
+
+    def __len__(self):
+        return len(self.rows) + (self.scenario_action is not None)
+
+    def describe(self):
+        """The planned actions as a DataFrame of ``kind``, ``name``, ``action``."""
+        rows = self.actions + self.unchanged
+        if self.scenario_action is not None:
+            rows.insert(0, ("Scenario", self.spec["scenario"]["name"], self.scenario_action))
+        return pd.DataFrame(rows, columns=["kind", "name", "action"])
+
+    def __repr__(self):
+        counts = self.describe()["action"].value_counts()
+        return "<Plan %s>" % ", ".join("%s=%d" % item for item in sorted(counts.items()))
+
+    def execute(self, root, chunk_size=500):
+        """
+        Apply the plan to ``root``. Returns a DataFrame with ``kind``, ``name``,
+        ``action``, ``ok`` and ``error`` for every object that was touched.
+        """
+        scenario = self.spec["scenario"]
+        if self.scenario_action is not None:
+            with unit_tracker(root).scope(DateFormat="UTCG"):
+                if self.scenario_action == "new":
+                    if _current_scenario(root) is not None:
+                        root.CloseScenario()
+                    reset_record(root)
+                    new_scenario(root, scenario["name"], scenario["start"], scenario["stop"],
+                                 rewind=False)
+                else:
+                    STKObjects, _ = get_type_libraries(root)
+                    sc2 = query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+                    sc2.SetTimePeriod(scenario["start"], scenario["stop"])
+
+        report = execute_rows(root, self.rows, chunk_size)
+        report.insert(0, "kind", [kind for kind, _, _ in self.actions])
+        report.insert(2, "action", [action for _, _, action in self.actions])
+
+        record = _applied.get(root)
+        if record is None or record["scenario"]["name"] != scenario["name"]:
+            record = _applied[root] = {"scenario": scenario, "objects": {}}
+        record["scenario"] = scenario
+        objects = record["objects"]
+        for kind, name, action, ok in zip(report["kind"], report["name"], report["action"],
+                                          report["ok"]):
+            key = (kind, name)
+            if action == "unload":
+                if ok:
+                    objects.pop(key, None)
+            elif ok:
+                objects[key] = self._fingerprints[key]
+            else:
+                # Unknown state: make the next plan re-send it
+                objects[key] = None
+        return report
+
+
+def compile_plan(root, spec):
+    """
+    Compile ``spec`` (see :func:`normalize_spec`) against the scenario loaded
+    in ``root`` into a :class:`Plan`. Nothing is changed until
+    :meth:`Plan.execute`.
+    """
+    spec = normalize_spec(spec)
+    scenario = spec["scenario"]
+    step = spec["step"]
+    loaded = _current_scenario(root)
+    record = _applied.get(root)
+
+    if loaded is None or loaded.InstanceName != scenario["name"]:
+        scenarioAction = "new"
+        existing = {}
+    else:
+        if record is not None and record["scenario"]["name"] == scenario["name"]:
+            existing = dict(record["objects"])
+            samePeriod = record["scenario"] == scenario or _same_period(root, loaded, scenario)
+        else:
+            # Not built from a spec: list what is there and treat it all as stale
+            existing = dict(((child.ClassName, child.InstanceName), None)
+                            for child in loaded.Children)
+            samePeriod = _same_period(root, loaded, scenario)
+        scenarioAction = None if samePeriod else "period"
+
+    fingerprints = {}
+    for entry in spec["facilities"]:
+        fingerprints[("Facility", entry["name"])] = _fingerprint(entry)
+    for entry in spec["satellites"]:
+        # Satellites are propagated over the scenario interval, so it is part of their state
+        fingerprints[("Satellite", entry["name"])] = _fingerprint(
+            entry, [step, scenario["start"], scenario["stop"]])
+
+    rows, actions, unchanged = [], [], []
+    for kind, name in sorted(key for key in existing
+                             if key[0] in ("Facility", "Satellite") and key not in fingerprints):
+        rows.append((name, ["Unload / */%s/%s" % (kind, name)]))
+        actions.append((kind, name, "unload"))
+
+    def plan_objects(kind, entries, commands):
+        changed = []
+        for entry in entries:
+            key = (kind, entry["name"])
+            if key in existing and existing[key] == fingerprints[key]:
+                unchanged.append((kind, entry["name"], "unchanged"))
+            else:
+                changed.append(entry)
+        if not changed:
+            return
+        for name, rowCommands in commands(changed):
+            if (kind, name) in existing:
+                # Already loaded: only its state changes
+                rowCommands = [c for c in rowCommands if not c.startswith("New ")]
+                actions.append((kind, name, "update"))
+            else:
+                actions.append((kind, name, "new"))
+            rows.append((name, rowCommands))
+
+    def satellite_rows(entries):
+        # One table per propagator and state form, then back into spec order
+        groups = OrderedDict()
+        for entry in entries:
+            if "cartesian" in entry:
+                state, form = entry["cartesian"], "cartesian"
+            else:
+                state = entry["classical"]
+                form = "sma" if "sma" in state else "mean_motion"
+            groups.setdefault((entry["propagator"], form), []).append(
+                dict(state, name=entry["name"], epoch=entry["epoch"]))
+        result = []
+        for (propagator, _), group in groups.items():
+            result += satellite_commands(pd.DataFrame(group), scenario["start"],
+                                         scenario["stop"], step, propagator)
+        order = dict((entry["name"], i) for i, entry in enumerate(entries))
+        return sorted(result, key=lambda row: order[row[0]])
+
+    plan_objects("Facility", spec["facilities"], facility_commands)
+    plan_objects("Satellite", spec["satellites"], satellite_rows)
+    return Plan(spec, scenarioAction, actions, unchanged, rows, fingerprints)
@@ -0,0 +1,306 @@
+# coding: utf-8
+"""
+Parallel parameter sweeps and Monte Carlo runs over classical elements.
+
+A sweep case is one set of the values ``assign_classical`` takes
+(``mean_motion``, ``eccentricity``, ``inclination``, ``arg_of_perigee``,
+``raan``, ``mean_anomaly``) plus ``epoch``. Each case is propagated, extracted
+and reduced to a few numbers. Rather than building a satellite per case, every
+worker builds one scenario with one satellite on first use. For each case it
+then reassigns ``InitialState.Epoch`` and ``InitialState.Representation`` and
+calls ``Propagate()``:
+
+    cases = sample_cases(5000, {"inclination": ("uniform", 40, 60),
+                                "raan": ("uniform", 0, 360),
+                                "epoch_offset": ("uniform", 0, 86400)},
+                         base={"mean_motion": 15.2, "eccentricity": 0.001},
+                         seed=1)
+    sweep = Sweep(cases, "sweep.jsonl", sc2.StartTime, sc2.StopTime, step=60,
+                  reduce=radius_extremes)
+    with EnginePool(8) as pool:
+        sweep.run(pool=pool)
+    metrics = sweep.results()
+
+Reduced metrics are appended to a JSON-lines file as each wave of chunks
+finishes, and that file is the checkpoint. Running the same sweep again skips
+the cases already recorded, so a crashed overnight run picks up where it
+stopped. Cases that raised are recorded with their error and retried on the
+next run. ``reduce`` and any distribution callables must be picklable
+(module-level functions) to reach the workers.
+"""
+
+import hashlib
+import itertools
+import json
+import os
+import weakref
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from .dataproviders import exec_elements, resolve_providers
+from .interfaces import com_identity
+from .scenario import (add_satellite, assign_classical, close_scenario, get_type_libraries,
+                       new_scenario)
+from .times import format_utcg, parse_utcg
+
+ELEMENTS = ("mean_motion", "eccentricity", "inclination", "arg_of_perigee", "raan",
+            "mean_anomaly")
+
+DEFAULT_BASE = {
+    "mean_motion": 15.0, "eccentricity": 0.001, "inclination": 45.0,
+    "arg_of_perigee": 0.0, "raan": 0.0, "mean_anomaly": 0.0,
+}
+
+
+def grid_cases(base=None, **axes):
+    """
+    Every combination of the ``axes`` values, e.g.
+    ``grid_cases(inclination=[45, 50, 55], raan=range(0, 360, 30))``, on top
+    of ``base``. ``epoch`` takes UTCG strings and ``epoch_offset`` seconds
+    from the sweep start.
+    """
+    names = list(axes)
+    cases = []
+    for values in itertools.product(*[list(axes[name]) for name in names]):
+        case = dict(base or {})
+        case.update(zip(names, values))
+        cases.append(case)
+    return cases
+
+
+def _draw(rng, spec, n):
+    if callable(spec):
+        return np.asarray(spec(rng, n))
+    if not isinstance(spec, (tuple, list)):
+        return np.full(n, spec)
+    kind, args = spec[0], spec[1:]
+    if kind == "uniform":
+        return rng.uniform(args[0], args[1], n)
+    if kind == "normal":
+        return rng.normal(args[0], args[1], n)
+    if kind == "choice":
+        return rng.choice(np.asarray(args[0]), n)
+    raise ValueError("Unknown distribution %r" % (kind,))
+
+
+def sample_cases(n, distributions, base=None, seed=0):
+    """
+    ``n`` cases drawn from ``distributions``, mapping a case field to a
+    constant, ``("uniform", lo, hi)``, ``("normal", mean, sd)``,
+    ``("choice", values)`` or ``fn(rng, n)``. The same ``seed`` always gives
+    the same cases, which resuming relies on.
+    """
+    rng = np.random.default_rng(seed)
+    columns = OrderedDict((name, _draw(rng, spec, n)) for name, spec in distributions.items())
+    cases = []
+    for i in range(n):
+        case = dict(base or {})
+        for name, values in columns.items():
+            value = values[i]
+            case[name] = value.item() if hasattr(value, "item") else value
+        cases.append(case)
+    return cases
+
+
+def radius_extremes(result, case):
+    """Default reduction: minimum, maximum and mean radius in km."""
+    radius = np.sqrt(result["x"] ** 2 + result["y"] ** 2 + result["z"] ** 2)
+    return {"min_radius": float(radius.min()), "max_radius": float(radius.max()),
+            "mean_radius": float(radius.mean())}
+
+
+def _resolve_case(case, start):
+    # Full element set and UTCG epoch for one case
+    elements = dict(DEFAULT_BASE)
+    elements.update((k, v) for k, v in case.items() if k in ELEMENTS)
+    epoch = case.get("epoch", start)
+    if "epoch_offset" in case:
+        epoch = format_utcg(parse_utcg(epoch) + timedelta(seconds=float(case["epoch_offset"])))
+    return elements, epoch
+
+
+# Per root: (setup key, scenario identity, satellite propagator, data
+# provider), so each worker builds its sweep scenario once and reuses it for
+# every later chunk while that scenario is still the one loaded
+_workerState = weakref.WeakKeyDictionary()
+
+
+def _is_current(root, identity):
+    current = root.CurrentScenario
+    return current is not None and bool(current) and com_identity(current)[0] == identity[0]
+
+
+def _worker_satellite(root, setup):
+    key = (setup["scenario"], setup["satellite"], setup["start"], setup["stop"],
+           setup["provider_path"])
+    state = _workerState.get(root)
+    if state is not None and state[0] == key and _is_current(root, state[1]):
+        return state[2], state[3]
+    close_scenario(root)
+    new_scenario(root, setup["scenario"], setup["start"], setup["stop"], rewind=False)
+    elements, epoch = _resolve_case({}, setup["start"])
+    _, satProp = add_satellite(root, setup["satellite"], epoch, propagate=False,
+                               **elements)
+    provider = resolve_providers(root, ["*/Satellite/" + setup["satellite"]],
+                                 setup["provider_path"])[0]
+    # The identity holds the scenario's IUnknown, so it cannot be mistaken for a later one
+    _workerState[root] = (key, com_identity(root.CurrentScenario), satProp, provider)
+    return satProp, provider
+
+
+def _run_cases(root, job):
+    # Worker side: reassign, propagate, extract and reduce each case of a chunk
+    setup, cases = job
+    satProp, provider = _worker_satellite(root, setup)
+    _, STKUtil = get_type_libraries(root)
+    rows = []
+    for caseId, case in cases:
+        row = {"case": caseId}
+        row.update(case)
+        try:
+            elements, epoch = _resolve_case(case, setup["start"])
+            satProp.InitialState.Epoch = epoch
+            representation = satProp.InitialState.Representation
+            keplerian = representation.ConvertTo(STKUtil.eOrbitStateClassical)
+            assign_classical(root, keplerian, **elements)
+            representation.Assign(keplerian)
+            satProp.Propagate()
+            result = exec_elements(provider, setup["start"], setup["stop"], setup["step"],
+                                   setup["elements"])
+            row.update(setup["reduce"](result, case))
+        except Exception as e:
+            row["error"] = "%s: %s" % (type(e).__name__, e)
+        rows.append(row)
+    return rows
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class Sweep(object):
+    """
+    A resumable sweep of ``cases`` over ``[start, stop]`` writing one JSON line
+    per case to ``output``.
+
+    ``reduce(result, case)`` turns the ``ElementResult`` of ``provider_path``
+    and ``elements`` into a dict of metrics. Cases are sent to workers
+    ``chunk_size`` at a time.
+    """
+
+    def __init__(self, cases, output, start, stop, step=60.0, reduce=radius_extremes,
+                 provider_path="Cartesian Position//J2000", elements=("Time", "x", "y", "z"),
+                 chunk_size=16, scenario="Sweep", satellite="SweepSat"):
+        self.cases = [dict(case) for case in cases]
+        self.output = output
+        self.chunk_size = chunk_size
+        self.setup = {
+            "scenario": scenario, "satellite": satellite, "start": start, "stop": stop,
+            "step": step, "provider_path": provider_path, "elements": list(elements),
+            "reduce": reduce,
+        }
+        self.fingerprint = self._fingerprint()
+
+    def _fingerprint(self):
+        described = dict(self.setup, reduce="%s.%s" % (
+            getattr(self.setup["reduce"], "__module__", ""),
+            getattr(self.setup["reduce"], "__qualname__", repr(self.setup["reduce"]))))
+        text = json.dumps([described, self.cases], sort_keys=True, default=_json_default)
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _records(self):
+        # Valid lines of the checkpoint; a line cut short by a crash is ignored
+        if not os.path.exists(self.output):
+            return
+        with open(self.output, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def completed(self):
+        """Ids of the cases already recorded without an error."""
+        done = set()
+        for record in self._records():
+            if "sweep" in record:
+                if record["sweep"] != self.fingerprint:
+                    raise ValueError("%s was written by a different sweep" % self.output)
+                continue
+            if "error" not in record:
+                done.add(record["case"])
+        return done
+
+    def pending(self):
+        done = self.completed()
+        return [(i, case) for i, case in enumerate(self.cases) if i not in done]
+
+    def _append(self, rows):
+        exists = os.path.exists(self.output) and os.path.getsize(self.output) > 0
+        with open(self.output, "a+") as f:
+            if exists:
+                f.seek(f.tell() - 1)
+                if f.read(1) != "\n":
+                    f.write("\n")
+            else:
+                f.write(json.dumps({"sweep": self.fingerprint, "cases": len(self.cases)}) + "\n")
+            for row in rows:
+                f.write(json.dumps(row, default=_json_default) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def run(self, pool=None, root=None, progress=None):
+        """
+        Run every pending case on ``pool`` (an ``EnginePool``, waves of two
+        chunks per worker) or in-process on ``root``, whose current scenario is
+        replaced by the sweep scenario. ``progress(done, total)``
+        is called after each write. Returns the number of cases run.
+        """
+        if (pool is None) == (root is None):
+            raise ValueError("Give exactly one of pool and root")
+        pending = self.pending()
+        chunks = [(self.setup, pending[i:i + self.chunk_size])
+                  for i in range(0, len(pending), self.chunk_size)]
+        wave = 1 if pool is None else 2 * pool.processes
+        done = len(self.cases) - len(pending)
+        for i in range(0, len(chunks), wave):
+            batch = chunks[i:i + wave]
+            if pool is None:
+                results = [_run_cases(root, chunk) for chunk in batch]
+            else:
+                results = pool.map(_run_cases, batch, return_exceptions=True)
+            rows = []
+            for chunk, result in zip(batch, results):
+                if isinstance(result, Exception):
+                    # The whole chunk failed (e.g. its worker crashed)
+                    lines = str(result).strip().splitlines()
+                    message = "%s: %s" % (type(result).__name__, lines[-1] if lines else "")
+                    rows.extend(dict(case, case=caseId, error=message) for caseId, case in chunk[1])
+                else:
+                    rows.extend(result)
+            self._append(rows)
+            done += sum(1 for row in rows if "error" not in row)
+            if progress is not None:
+                progress(done, len(self.cases))
+        return len(pending)
+
+    def results(self, errors=False):
+        """
+        DataFrame of the recorded cases, one row per case (its latest record),
+        without failed cases unless ``errors``.
+        """
+        latest = OrderedDict()
+        for record in self._records():
+            if "sweep" not in record:
+                latest[record["case"]] = record
+        frame = pd.DataFrame(list(latest.values()))
+        if len(frame) and not errors and "error" in frame:
+            frame = frame[frame["error"].isna()].drop(columns="error")
+        return frame.sort_values("case").reset_index(drop=True) if len(frame) else frame
@@ -0,0 +1,180 @@
+# coding: utf-8
+"""
+STK date handling.
+
+STK reports and accepts dates as UTCG strings such as
+``"10 Jun 2016 04:00:00.000"`` unless the DateFormat unit is switched to EpSec
+(seconds from the scenario epoch). Besides single-value helpers this module
+converts whole columns between UTCG, EpSec and ``datetime64[ns]`` without
+handling one string at a time.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+
+def parse_utcg(value):
+    """Parse a single UTCG string into a ``datetime``; fractional seconds are optional."""
+    whole, _, fraction = value.partition(".")
+    parsed = datetime.strptime(whole.strip(), "%d %b %Y %H:%M:%S")
+    return parsed + timedelta(seconds=float("0." + fraction) if fraction else 0)
+
+
+def format_utcg(value):
+    """Format a ``datetime`` the way STK does, e.g. ``"10 Jun 2016 04:00:00.000"``."""
+    return "%d %s.%03d" % (value.day, value.strftime("%b %Y %H:%M:%S"),
+                           value.microsecond // 1000)
+
+
+_MONTHS = [b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+           b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"]
+# Three month-name bytes packed into one integer, sorted for searchsorted
+_MONTH_KEYS = np.array([(m[0] << 16) | (m[1] << 8) | m[2] for m in _MONTHS], dtype=np.int64)
+_MONTH_ORDER = np.argsort(_MONTH_KEYS)
+_MONTH_SORTED = _MONTH_KEYS[_MONTH_ORDER]
+
+# Byte offsets within a zero-padded "DD Mon YYYY HH:MM:SS.fffffffff"
+_WIDTH = 30
+_SEPARATORS = {2: b" ", 6: b" ", 11: b" ", 14: b":", 17: b":"}
+
+
+def _days_from_civil(y, m, d):
+    # Days since 1970-01-01 for proleptic Gregorian dates (H. Hinnant's algorithm)
+    y = y - (m <= 2)
+    era = np.floor_divide(y, 400)
+    yoe = y - era * 400
+    doy = (153 * (m + np.where(m > 2, -3, 9)) + 2) // 5 + d - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def _digits(chars, start, stop):
+    value = np.zeros(len(chars), dtype=np.int64)
+    for i in range(start, stop):
+        value = value * 10 + (chars[:, i].astype(np.int64) - 48)
+    return value
+
+
+def _value(values, i):
+    # Positional, whatever the container (a Series indexes by label)
+    return np.asarray(values, dtype=object)[i]
+
+
+def parse_utcg_array(values):
+    """
+    Parse a column of UTCG strings into ``datetime64[ns]`` in bulk.
+
+    Works on the raw bytes of the whole column at once rather than one string
+    at a time, handling one- or two-digit days and 0-9 fractional digits.
+    Raises ``ValueError`` if a value is not in STK's UTCG layout.
+    """
+    # One spare byte catches values the fixed width would silently truncate
+    try:
+        raw = np.asarray(values, dtype="S%d" % (_WIDTH + 1))
+    except UnicodeEncodeError:
+        bad = next(str(value) for value in values if not str(value).isascii())
+        raise ValueError("Not a UTCG date: %r" % (bad,))
+    n = len(raw)
+    if n == 0:
+        return np.empty(0, dtype="datetime64[ns]")
+    chars = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(n, _WIDTH + 1)
+    long = chars[:, _WIDTH] != 0
+    if long.any():
+        raise ValueError("Not a UTCG date: %r" % (_value(values, int(np.argmax(long))),))
+    chars = chars[:, :_WIDTH].copy()
+    # Single-digit days: shift right one byte and insert a leading "0"
+    short = chars[:, 1] == ord(" ")
+    if short.any():
+        chars[short, 1:] = chars[short, :-1]
+        chars[short, 0] = ord("0")
+
+    ok = np.ones(n, dtype=bool)
+    for offset, separator in _SEPARATORS.items():
+        ok &= chars[:, offset] == separator[0]
+    digitCols = [0, 1, 7, 8, 9, 10, 12, 13, 15, 16, 18, 19]
+    ok &= ((chars[:, digitCols] >= 48) & (chars[:, digitCols] <= 57)).all(axis=1)
+    # Anything after the seconds is either ".digits" or padding
+    tail = chars[:, 20:]
+    hasFraction = tail[:, 0] == ord(".")
+    fraction = tail[:, 1:]
+    isDigit = (fraction >= 48) & (fraction <= 57)
+    ok &= np.where(hasFraction, True, tail[:, 0] == 0)
+    # Digits must be contiguous and followed only by padding
+    ok &= ~(np.logical_and.accumulate(isDigit, axis=1) != isDigit).any(axis=1)
+    ok &= (isDigit | (fraction == 0)).all(axis=1)
+
+    key = (chars[:, 3].astype(np.int64) << 16) | (chars[:, 4].astype(np.int64) << 8) | chars[:, 5]
+    position = np.clip(np.searchsorted(_MONTH_SORTED, key), 0, 11)
+    ok &= _MONTH_SORTED[position] == key
+    if not ok.all():
+        raise ValueError("Not a UTCG date: %r" % (_value(values, int(np.argmin(ok))),))
+    month = _MONTH_ORDER[position] + 1
+
+    days = _days_from_civil(_digits(chars, 7, 11), month, _digits(chars, 0, 2))
+    seconds = (days * 86400 + _digits(chars, 12, 14) * 3600 + _digits(chars, 15, 17) * 60
+               + _digits(chars, 18, 20))
+    weights = 10 ** np.arange(8, -1, -1, dtype=np.int64)
+    nanos = (np.where(isDigit, fraction.astype(np.int64) - 48, 0) * weights).sum(axis=1)
+    return (seconds * 1000000000 + nanos).view("datetime64[ns]")
+
+
+def format_utcg_array(times, decimals=3):
+    """
+    Format ``datetime64`` values as STK UTCG strings in bulk, e.g.
+    ``"10 Jun 2016 04:00:00.000"``. Returns an object array of ``str``.
+    """
+    times = np.asarray(times, dtype="datetime64[ns]")
+    nanos = times.view(np.int64)
+    days, nanoOfDay = np.divmod(nanos, 86400 * 1000000000)
+    dates = days.astype("datetime64[D]")
+    years = dates.astype("datetime64[Y]")
+    months = dates.astype("datetime64[M]")
+    year = years.astype(np.int64) + 1970
+    month = (months - years).astype(np.int64)
+    day = (dates - months).astype(np.int64) + 1
+    secondOfDay, subNanos = np.divmod(nanoOfDay, 1000000000)
+    hour, rest = np.divmod(secondOfDay, 3600)
+    minute, second = np.divmod(rest, 60)
+
+    width = 20 + (decimals + 1 if decimals else 0)
+    chars = np.full((len(times), width), ord(" "), dtype=np.uint8)
+
+    def put(offset, value, digits):
+        for i in range(digits - 1, -1, -1):
+            chars[:, offset + i] = 48 + value % 10
+            value = value // 10
+
+    put(0, day, 2)
+    monthNames = np.frombuffer(b"".join(_MONTHS), dtype=np.uint8).reshape(12, 3)
+    chars[:, 3:6] = monthNames[month]
+    put(7, year, 4)
+    put(12, hour, 2)
+    chars[:, 14] = ord(":")
+    put(15, minute, 2)
+    chars[:, 17] = ord(":")
+    put(18, second, 2)
+    if decimals:
+        chars[:, 20] = ord(".")
+        put(21, subNanos // 10 ** (9 - decimals), decimals)
+    strings = chars.view("S%d" % width).ravel()
+    # STK does not zero-pad the day
+    strings = np.char.lstrip(strings, b"0")
+    return strings.astype("U").astype(object)
+
+
+def _epoch64(epoch):
+    if isinstance(epoch, str):
+        epoch = parse_utcg(epoch)
+    return np.datetime64(epoch, "ns")
+
+
+def epsec_to_datetime64(values, epoch):
+    """EpSec values (seconds from ``epoch``, a UTCG string or datetime) to ``datetime64[ns]``."""
+    offsets = np.rint(np.asarray(values, dtype=np.float64) * 1e9).astype(np.int64)
+    return _epoch64(epoch) + offsets.view("timedelta64[ns]")
+
+
+def datetime64_to_epsec(times, epoch):
+    """``datetime64`` values to EpSec relative to ``epoch`` (a UTCG string or datetime)."""
+    return (np.asarray(times, dtype="datetime64[ns]") - _epoch64(epoch)) / np.timedelta64(1, "s")
@@ -0,0 +1,233 @@
+# coding: utf-8
+"""
+Opt-in tracing of COM round trips.
+
+Every property get/set, method call and ``QueryInterface`` made through a
+traced root (and through any object obtained from it) is counted and timed:
+
+    tracer = Tracer()
+    root = tracer.wrap(root)
+    with tracer.span("build"):
+        add_satellite(root, "codeSat", ...)
+    print(tracer.summary().head(20))
+    tracer.write_chrome_trace("trace.json")     # chrome://tracing, Perfetto
+    tracer.write_folded("trace.folded")         # flamegraph.pl, speedscope
+
+Only PascalCase members are traced, since those are the COM members. Anything
+else passes straight through to the wrapped object. Wrapped objects are
+unwrapped again when they are passed back into a COM call.
+"""
+
+import inspect
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import pandas as pd
+
+GET = "get"
+SET = "set"
+CALL = "call"
+QUERY = "QueryInterface"
+
+# Separators of the folded stack format, replaced in frame names
+_FRAME_SEPARATORS = re.compile(r"[\s;]")
+
+
+def _interface_name(value):
+    # comtypes pointer types are named "POINTER(IAgScenario)"
+    name = type(value).__name__
+    if name.startswith("POINTER(") and name.endswith(")"):
+        name = name[8:-1]
+    return name
+
+
+def _is_com_object(value):
+    return hasattr(value, "QueryInterface") and not isinstance(value, type)
+
+
+def _unwrap(value):
+    if isinstance(value, TracedObject):
+        return object.__getattribute__(value, "_obj")
+    return value
+
+
+class Tracer(object):
+    """
+    Collects one event per traced COM access.
+
+    ``events`` holds ``(start, seconds, thread, spans, interface, member, kind)``
+    tuples; ``stats`` aggregates ``[count, seconds]`` by
+    ``(interface, member, kind)``.
+    """
+
+    def __init__(self, keep_events=True):
+        self.keep_events = keep_events
+        self.events = []
+        self.stats = defaultdict(lambda: [0, 0.0])
+        self._local = threading.local()
+        self._origin = time.perf_counter()
+
+    def wrap(self, obj, interface=None):
+        """Return ``obj`` wrapped so every COM access through it is traced."""
+        if isinstance(obj, TracedObject) or not _is_com_object(obj):
+            return obj
+        return TracedObject(obj, self, interface or _interface_name(obj))
+
+    def _spans(self):
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            spans = self._local.spans = []
+        return spans
+
+    @contextmanager
+    def span(self, name):
+        """Label the calls made inside the block; spans nest in the flame graph."""
+        spans = self._spans()
+        spans.append(name)
+        try:
+            yield
+        finally:
+            spans.pop()
+
+    def record(self, interface, member, kind, start, seconds):
+        stat = self.stats[(interface, member, kind)]
+        stat[0] += 1
+        stat[1] += seconds
+        if self.keep_events:
+            self.events.append((start - self._origin, seconds, threading.get_ident(),
+                                tuple(self._spans()), interface, member, kind))
+
+    def reset(self):
+        self.events = []
+        self.stats.clear()
+
+    @property
+    def total_calls(self):
+        return sum(count for count, _ in self.stats.values())
+
+    def summary(self, by=("interface", "member", "kind")):
+        """Counts and times aggregated by ``by``, most expensive first."""
+        rows = [dict(interface=i, member=m, kind=k, count=c, total_s=s)
+                for (i, m, k), (c, s) in self.stats.items()]
+        frame = pd.DataFrame(rows, columns=["interface", "member", "kind", "count", "total_s"])
+        frame = frame.groupby(list(by), as_index=False)[["count", "total_s"]].sum()
+        frame["mean_us"] = frame["total_s"] / frame["count"] * 1e6
+        return frame.sort_values("total_s", ascending=False).reset_index(drop=True)
+
+    def chrome_trace(self):
+        """The events in Chrome trace-event format (complete ``"X"`` events)."""
+        events = []
+        for start, seconds, thread, spans, interface, member, kind in self.events:
+            events.append({"name": "%s.%s" % (interface, member), "cat": kind, "ph": "X",
+                           "ts": start * 1e6, "dur": seconds * 1e6, "pid": 0, "tid": thread,
+                           "args": {"spans": list(spans)}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def folded(self):
+        """
+        Folded stacks (``span;span;Interface.Member microseconds``) for flame
+        graphs. Whitespace and ``;`` in frame names, which the format uses as
+        separators, become ``_``.
+        """
+        weights = defaultdict(float)
+        for _, seconds, _, spans, interface, member, _ in self.events:
+            frames = spans + ("%s.%s" % (interface, member),)
+            weights[";".join(_FRAME_SEPARATORS.sub("_", frame) for frame in frames)] += seconds
+        return ["%s %d" % (stack, max(1, round(seconds * 1e6)))
+                for stack, seconds in sorted(weights.items())]
+
+    def write_folded(self, path):
+        with open(path, "w") as f:
+            f.write("\n".join(self.folded()) + "\n")
+
+
+class TracedObject(object):
+    """Proxy recording each COM access on the wrapped object with its :class:`Tracer`."""
+
+    __slots__ = ("_obj", "_tracer", "_interface", "__weakref__")
+
+    def __init__(self, obj, tracer, interface):
+        object.__setattr__(self, "_obj", obj)
+        object.__setattr__(self, "_tracer", tracer)
+        object.__setattr__(self, "_interface", interface)
+
+    def _timed(self, member, kind, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            self._tracer.record(self._interface, member, kind, t0, time.perf_counter() - t0)
+
+    def __getattr__(self, name):
+        obj = object.__getattribute__(self, "_obj")
+        if not name[:1].isupper():
+            return getattr(obj, name)
+        t0 = time.perf_counter()
+        value = getattr(obj, name)
+        elapsed = time.perf_counter() - t0
+        # Looking up a method is local; the round trip happens when it is called
+        if inspect.ismethod(value) or inspect.isbuiltin(value):
+            return _TracedMethod(self, name, value)
+        self._tracer.record(self._interface, name, GET, t0, elapsed)
+        return self._tracer.wrap(value)
+
+    def __setattr__(self, name, value):
+        obj = object.__getattribute__(self, "_obj")
+        if not name[:1].isupper():
+            setattr(obj, name, value)
+            return
+        self._timed(name, SET, setattr, obj, name, _unwrap(value))
+
+    def QueryInterface(self, interface, *args):
+        obj = object.__getattribute__(self, "_obj")
+        value = self._timed(interface.__name__, QUERY, obj.QueryInterface, interface, *args)
+        if interface.__name__ == "IUnknown":
+            # Left unwrapped: it identifies the object (see stk_integration.interfaces)
+            return value
+        return self._tracer.wrap(value, interface.__name__)
+
+    def __call__(self, *args):
+        obj = object.__getattribute__(self, "_obj")
+        return self._tracer.wrap(self._timed("Item", CALL, obj, *[_unwrap(a) for a in args]))
+
+    def __iter__(self):
+        tracer = self._tracer
+        for item in object.__getattribute__(self, "_obj"):
+            yield tracer.wrap(item)
+
+    def __bool__(self):
+        return bool(object.__getattribute__(self, "_obj"))
+
+    def __len__(self):
+        return len(object.__getattribute__(self, "_obj"))
+
+    def __getitem__(self, key):
+        return self._tracer.wrap(object.__getattribute__(self, "_obj")[key])
+
+    def __repr__(self):
+        return "<traced %s %r>" % (self._interface, self._obj)
+
+
+class _TracedMethod(object):
+
+    __slots__ = ("_owner", "_name", "_method")
+
+    def __init__(self, owner, name, method):
+        self._owner = owner
+        self._name = name
+        self._method = method
+
+    def __call__(self, *args, **kwargs):
+        owner = self._owner
+        args = [_unwrap(a) for a in args]
+        kwargs = dict((k, _unwrap(v)) for k, v in kwargs.items())
+        value = owner._timed(self._name, CALL, lambda: self._method(*args, **kwargs))
+        return owner._tracer.wrap(value)
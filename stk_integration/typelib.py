@@ -0,0 +1,158 @@
+# coding: utf-8
+"""
+Lazy access to the comtypes-generated STK type libraries.
+
+``from comtypes.gen import STKObjects`` imports a very large generated module
+before any work starts. :class:`LazyLibrary` stands in for it:
+
+    STKObjects = lazy_library("STKObjects")
+    STKObjects.eSatellite       # from the enum index; no import
+    STKObjects.IAgSatellite     # imports comtypes.gen.STKObjects now
+
+Enum values come from a small JSON index cached on disk and built from the
+values actually used. It is tied to the generated module's timestamp and thrown
+away when comtypes regenerates the wrappers (e.g. after an STK upgrade).
+Interfaces need the real wrapper classes, so the first interface lookup
+imports the module. New enum values are written back at exit.
+:func:`import_report` lists how long each import made through here took.
+"""
+
+import atexit
+import importlib
+import importlib.util
+import json
+import os
+import tempfile
+import time
+
+DEFAULT_INDEX = os.path.join(os.path.expanduser("~"), ".stk_integration", "typelib_index.json")
+
+_imports = []
+
+
+def timed_import(name):
+    """Import ``name``, recording the time taken for :func:`import_report`."""
+    t0 = time.perf_counter()
+    module = importlib.import_module(name)
+    _imports.append((name, time.perf_counter() - t0))
+    return module
+
+
+def import_report():
+    """``(module, seconds)`` for every import made through this module, slowest first."""
+    return sorted(_imports, key=lambda item: -item[1])
+
+
+def _module_stamp(name):
+    # Identifies the generated wrapper without importing it
+    try:
+        spec = importlib.util.find_spec(name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or not spec.origin or not os.path.exists(spec.origin):
+        return None
+    return "%s@%r" % (spec.origin, os.path.getmtime(spec.origin))
+
+
+class EnumIndex(object):
+    """On-disk ``{library: {stamp, enums: {name: value}}}`` index of enum values."""
+
+    def __init__(self, path=DEFAULT_INDEX):
+        self.path = path
+        self.dirty = False
+        try:
+            with open(path) as f:
+                self._data = json.load(f)
+        except (IOError, OSError, ValueError):
+            self._data = {}
+
+    def enums(self, library, stamp):
+        entry = self._data.get(library)
+        if entry is None or entry.get("stamp") != stamp:
+            entry = self._data[library] = {"stamp": stamp, "enums": {}}
+            self.dirty = True
+        return entry["enums"]
+
+    def save(self):
+        if not self.dirty:
+            return
+        directory = os.path.dirname(self.path) or "."
+        # Spawned workers save at exit too: each writes its own temporary file
+        os.makedirs(directory, exist_ok=True)
+        fd, temp = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f, indent=1, sort_keys=True)
+            os.replace(temp, self.path)
+        except Exception:
+            os.remove(temp)
+            raise
+        self.dirty = False
+
+
+class LazyLibrary(object):
+    """
+    Stand-in for ``comtypes.gen.<name>`` that defers the import.
+
+    Integer enum values are answered from the :class:`EnumIndex`; anything
+    else (interfaces, classes) imports the generated module on first use.
+    Enum values looked up after the import are added to the index.
+    """
+
+    def __init__(self, name, index=None, package="comtypes.gen"):
+        self.__name__ = name
+        self._moduleName = "%s.%s" % (package, name)
+        self._index = index
+        self._module = None
+        self._enums = None
+
+    def _enum_table(self):
+        if self._enums is None:
+            self._enums = ({} if self._index is None else
+                           self._index.enums(self.__name__, _module_stamp(self._moduleName)))
+        return self._enums
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            self._module = timed_import(self._moduleName)
+        return self._module
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        enums = self._enum_table()
+        if name in enums:
+            return enums[name]
+        value = getattr(self.load(), name)
+        if isinstance(value, int) and not isinstance(value, bool) and self._index is not None:
+            enums[name] = int(value)
+            self._index.dirty = True
+        # Cache on the instance so later lookups skip __getattr__
+        setattr(self, name, value)
+        return value
+
+
+_index = None
+_libraries = {}
+
+
+def lazy_library(name, index_path=DEFAULT_INDEX):
+    """The shared :class:`LazyLibrary` for ``comtypes.gen.<name>``."""
+    global _index
+    library = _libraries.get(name)
+    if library is None:
+        if _index is None:
+            _index = EnumIndex(index_path)
+            atexit.register(save_index)
+        library = _libraries[name] = LazyLibrary(name, _index)
+    return library
+
+
+def save_index():
+    """Write newly seen enum values to the on-disk index."""
+    if _index is not None:
+        _index.save()
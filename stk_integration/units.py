@@ -0,0 +1,132 @@
+# coding: utf-8
+"""
+Scoped unit preferences.
+
+The notebook switches ``AngleUnit``/``TimeUnit`` to revs/day before setting
+mean motion and back to deg/sec afterwards: four ``SetCurrentUnit`` calls per
+satellite, and the global state is left wrong if anything in between raises.
+:class:`UnitTracker` remembers the current units on the Python side so that
+switches are only sent when a unit actually changes, and
+:meth:`UnitTracker.scope` restores the previous units on exit, exceptions
+included:
+
+    units = unit_tracker(root)
+    with units.scope(AngleUnit="revs", TimeUnit="day"):
+        sizeShape.MeanMotion = 15.08385840
+
+Alternatively, :meth:`UnitTracker.to_current` and
+:meth:`UnitTracker.rate_to_current` convert values into the units already in
+effect, so bulk assignment never touches the global state at all; that is what
+:func:`~stk_integration.scenario.assign_classical` does.
+"""
+
+import math
+import weakref
+from contextlib import contextmanager
+
+# Factors from each unit to a base unit (radians, seconds, km)
+FACTORS = {
+    "AngleUnit": {"deg": math.pi / 180, "rad": 1.0, "revs": 2 * math.pi},
+    "TimeUnit": {"sec": 1.0, "min": 60.0, "hr": 3600.0, "day": 86400.0},
+    "DistanceUnit": {"km": 1.0, "m": 1e-3},
+}
+
+
+def convert(value, dimension, from_unit, to_unit):
+    """
+    Convert ``value`` between two units of one dimension, e.g.
+    ``convert(15.08, "AngleUnit", "revs", "deg")``.
+    """
+    factors = FACTORS[dimension]
+    return value * factors[from_unit] / factors[to_unit]
+
+
+def convert_rate(value, from_units, to_units):
+    """
+    Convert an angle-per-time rate such as mean motion. Units are
+    ``(angle, time)`` pairs, e.g. ``convert_rate(15.08, ("revs", "day"), ("deg", "sec"))``.
+    """
+    angle = convert(value, "AngleUnit", from_units[0], to_units[0])
+    return angle / convert(1.0, "TimeUnit", from_units[1], to_units[1])
+
+
+class UnitTracker(object):
+    """
+    Client-side view of ``root.UnitPreferences``.
+
+    A dimension's unit is read from STK the first time it is needed and
+    tracked locally from then on, so only changes go through
+    ``SetCurrentUnit``. Everything that changes units should go through the
+    same tracker (one per root), or call :meth:`forget` afterwards.
+    """
+
+    def __init__(self, root):
+        try:
+            self._root = weakref.ref(root)
+        except TypeError:
+            self._root = lambda: root
+        self._current = {}
+        self._preferences = {}
+        self.switches = 0
+
+    @property
+    def root(self):
+        return self._root()
+
+    def _preference(self, dimension):
+        preference = self._preferences.get(dimension)
+        if preference is None:
+            preference = self._preferences[dimension] = self.root.UnitPreferences.Item(dimension)
+        return preference
+
+    def get(self, dimension):
+        unit = self._current.get(dimension)
+        if unit is None:
+            unit = self._current[dimension] = self._preference(dimension).CurrentUnit
+        return unit
+
+    def set(self, dimension, unit):
+        """Set a unit, skipping the COM call if it is already current."""
+        if self._current.get(dimension) == unit:
+            return
+        self._preference(dimension).SetCurrentUnit(unit)
+        self._current[dimension] = unit
+        self.switches += 1
+
+    def forget(self, dimension=None):
+        """Drop tracked state after units were changed behind the tracker's back."""
+        if dimension is None:
+            self._current.clear()
+        else:
+            self._current.pop(dimension, None)
+
+    @contextmanager
+    def scope(self, **units):
+        """Apply ``units`` (e.g. ``AngleUnit="revs"``) and restore the previous ones on exit."""
+        previous = dict((dimension, self.get(dimension)) for dimension in units)
+        try:
+            for dimension, unit in units.items():
+                self.set(dimension, unit)
+            yield self
+        finally:
+            for dimension, unit in previous.items():
+                self.set(dimension, unit)
+
+    def to_current(self, value, dimension, unit):
+        """Convert ``value`` from ``unit`` into the unit currently in effect."""
+        return convert(value, dimension, unit, self.get(dimension))
+
+    def rate_to_current(self, value, units):
+        """Convert an ``(angle, time)`` rate into the current Angle/Time units."""
+        return convert_rate(value, units, (self.get("AngleUnit"), self.get("TimeUnit")))
+
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+def unit_tracker(root):
+    """The shared :class:`UnitTracker` for ``root``, created on first use."""
+    tracker = _trackers.get(root)
+    if tracker is None:
+        tracker = _trackers[root] = UnitTracker(root)
+    return tracker
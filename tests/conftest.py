@@ -0,0 +1,22 @@
+# coding: utf-8
+import pytest
+
+from stk_integration.fake import create_fake_engine
+from stk_integration.scenario import new_scenario
+
+START = "10 Jun 2016 04:00:00.000"
+STOP = "11 Jun 2016 04:00:00.000"
+
+# The notebook's codeSat: mean motion, e, i, argument of perigee, RAAN, mean anomaly
+ELEMENTS = (15.08385840, 0.0002947, 28.4703, 114.7239, 309.1977, 245.3924)
+
+
+@pytest.fixture
+def root():
+    return create_fake_engine()
+
+
+@pytest.fixture
+def scenario(root):
+    """``root`` with a one-day scenario loaded; yields its ``IAgScenario``."""
+    return new_scenario(root, "Test", START, STOP, rewind=False)
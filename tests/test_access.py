@@ -0,0 +1,39 @@
+# coding: utf-8
+import numpy as np
+import pytest
+
+from stk_integration.access import compute_access
+from stk_integration.frames import geodetic_to_ecef
+
+SMA = 7000.0
+MU = 398600.4418
+MASK = 60.0
+STEP = 120.0
+SPAN = 1200.0
+
+
+def _circular_pass(peak):
+    # Equatorial circular orbit over an equatorial site, in the Earth-fixed
+    # frame; the satellite is overhead at ``peak`` seconds
+    radius = geodetic_to_ecef(np.array([0.0]), np.array([0.0]), np.array([0.0]))[0, 0]
+    n = np.sqrt(MU / SMA ** 3)
+    tsec = np.arange(0.0, SPAN + STEP / 2, STEP)
+    theta = n * (tsec - peak)
+    positions = SMA * np.column_stack([np.cos(theta), np.sin(theta), np.zeros_like(theta)])
+    # Central angle at which the elevation equals the mask
+    mask = np.radians(MASK)
+    half = (np.arccos(radius * np.cos(mask) / SMA) - mask) / n
+    times = np.datetime64("2016-06-10T04:00") + (tsec * 1e9).astype("timedelta64[ns]")
+    return times, positions, peak - half, peak + half
+
+
+@pytest.mark.parametrize("peak", [50.0, SPAN - 50.0, SPAN / 2 + 20.0])
+def test_short_pass_between_samples(peak):
+    times, positions, rise, set_ = _circular_pass(peak)
+    assert set_ - rise < STEP
+    access = compute_access({"name": ["Site"], "lat": [0.0], "lon": [0.0]}, times, positions,
+                            ["Sat"], min_elevation=MASK, frame="Fixed")
+    assert len(access) == 1
+    start = (access["start"][0] - times[0]) / np.timedelta64(1, "s")
+    stop = (access["stop"][0] - times[0]) / np.timedelta64(1, "s")
+    assert abs(start - rise) < 0.01 and abs(stop - set_) < 0.01
@@ -0,0 +1,26 @@
+# coding: utf-8
+import asyncio
+
+from conftest import START, STOP
+from stk_integration.aio import AsyncEngines
+from stk_integration.fake import create_fake_engine
+from stk_integration.interfaces import interface_cache
+from stk_integration.scenario import new_scenario
+
+
+def scenario_cache(root, name):
+    new_scenario(root, name, START, STOP, rewind=False)
+    return interface_cache(root)
+
+
+def test_engines_keep_and_release_their_own_caches():
+    async def main():
+        async with AsyncEngines(2, factory=create_fake_engine) as engines:
+            caches = await asyncio.gather(engines.run(scenario_cache, "A", client="a"),
+                                          engines.run(scenario_cache, "B", client="b"))
+            assert caches[0] is not caches[1]
+            assert [len(cache) for cache in caches] == [1, 1]
+        return caches
+
+    caches = asyncio.run(main())
+    assert [len(cache) for cache in caches] == [0, 0]
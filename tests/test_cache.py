@@ -0,0 +1,24 @@
+# coding: utf-8
+from conftest import ELEMENTS, START
+from stk_integration.cache import ResultCache
+from stk_integration.scenario import add_satellite
+from stk_integration.units import unit_tracker
+
+
+def test_unit_change_misses(root, scenario, tmp_path):
+    add_satellite(root, "Sat", START, *ELEMENTS)
+    cache = ResultCache(str(tmp_path))
+
+    # A fixed state, so only the unit preferences can tell the two extractions apart
+    def extract():
+        return cache.exec_elements(root, "*/Satellite/Sat", "Cartesian Position//J2000",
+                                   scenario.StartTime, scenario.StopTime, 600,
+                                   ["Time", "x", "y", "z"], state="fixed")
+
+    km = extract()
+    extract()
+    assert (cache.hits, cache.misses) == (1, 1)
+    unit_tracker(root).set("DistanceUnit", "m")
+    m = extract()
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert abs(m["x"][0] - km["x"][0] * 1000.0) < 1e-6
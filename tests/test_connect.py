@@ -0,0 +1,18 @@
+# coding: utf-8
+import pytest
+
+from stk_integration.connect import build_objects, execute_rows, facility_commands
+
+
+def test_names_are_validated():
+    with pytest.raises(ValueError, match="Site 1"):
+        facility_commands({"name": ["Site 1"], "lat": [0.0], "lon": [0.0]})
+
+
+def test_failures_carry_command_and_message(root, scenario):
+    report = build_objects(root, facilities={"name": ["Site"], "lat": [0.0], "lon": [0.0]})
+    assert report["ok"].all()
+    report = execute_rows(root, [("Missing", ["Unload / */Facility/Missing"])])
+    error = report["error"][0]
+    assert not report["ok"][0]
+    assert error == "Failed: Unload / */Facility/Missing (Object '*/Facility/Missing' not found)"
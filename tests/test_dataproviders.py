@@ -0,0 +1,45 @@
+# coding: utf-8
+import numpy as np
+
+from conftest import ELEMENTS, START, STOP
+from stk_integration.dataproviders import exec_elements, resolve_providers, stack_results
+from stk_integration.scenario import add_satellite
+
+
+def test_exec_elements_columns(root, scenario):
+    sat, _ = add_satellite(root, "codeSat", START, *ELEMENTS)
+    provider = sat.DataProviders.GetDataPrvTimeVarFromPath("Cartesian Position//J2000")
+    result = exec_elements(provider, START, STOP, 60, ["Time", "x", "y", "z"])
+
+    assert len(result) == 24 * 60 + 1
+    assert result["Time"].dtype == np.dtype("datetime64[ns]")
+    assert result["Time"][0] == np.datetime64("2016-06-10T04:00:00")
+    assert np.all(np.diff(result["Time"]) == np.timedelta64(60, "s"))
+    radius = np.sqrt(result["x"] ** 2 + result["y"] ** 2 + result["z"] ** 2)
+    assert 6900 < radius.min() <= radius.max() < 6950
+    assert list(result.to_dataframe().columns) == ["Time", "x", "y", "z"]
+
+
+def test_exec_elements_fetches_once(root, scenario):
+    sat, _ = add_satellite(root, "codeSat", START, *ELEMENTS)
+    provider = sat.DataProviders.GetDataPrvTimeVarFromPath("Cartesian Position//J2000")
+    root.engine.reset_counters()
+    exec_elements(provider, START, STOP, 60, ["Time", "x", "y", "z"])
+    fetches = dict((member, count) for (_, member), count in root.engine.calls.items())
+    assert fetches.get("ToArray") == 1
+    assert "GetValues" not in fetches
+
+
+def test_stack_results_repeated_paths(root, scenario):
+    add_satellite(root, "codeSat", START, *ELEMENTS)
+    provider, = resolve_providers(root, ["*/Satellite/codeSat"], "Cartesian Position//J2000")
+    first = exec_elements(provider, START, STOP, 3600, ["Time", "x"])
+    second = exec_elements(provider, START, STOP, 7200, ["Time", "x"])
+    paths = ["*/Satellite/codeSat", "*/Satellite/codeSat"]
+
+    frame = stack_results(paths, [first, second])
+
+    assert len(frame) == len(first) + len(second)
+    assert list(frame.index.get_level_values(0).unique()) == ["*/Satellite/codeSat"]
+    np.testing.assert_array_equal(frame["x"].to_numpy(),
+                                  np.concatenate([first["x"], second["x"]]))
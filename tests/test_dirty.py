@@ -0,0 +1,42 @@
+# coding: utf-8
+from conftest import ELEMENTS, START, STOP
+from stk_integration.dirty import change_tracker, propagate_dirty
+from stk_integration.fake import STKUtil
+from stk_integration.scenario import add_satellite, assign_classical, new_scenario, propagate
+
+
+def test_unpropagated_satellites_are_dirty_until_propagated(root, scenario):
+    _, satProp = add_satellite(root, "a", START, *ELEMENTS, propagate=False)
+    add_satellite(root, "b", START, *ELEMENTS, propagate=False)
+    add_satellite(root, "c", START, *ELEMENTS, propagate=False)
+    tracker = change_tracker(root)
+    assert tracker.dirty == ["*/Satellite/a", "*/Satellite/b", "*/Satellite/c"]
+
+    satProp.Propagate()
+    propagate(root, "*/Satellite/b")
+    assert tracker.dirty == ["*/Satellite/c"]
+    assert propagate_dirty(root) == ["*/Satellite/c"]
+    assert tracker.dirty == []
+
+
+def test_assignments_mark_dirty(root, scenario):
+    add_satellite(root, "a", START, *ELEMENTS)
+    tracker = change_tracker(root)
+    satProp = tracker.track("*/Satellite/a")
+    assert tracker.dirty == []
+
+    representation = satProp.InitialState.Representation
+    keplerian = representation.ConvertTo(STKUtil.eOrbitStateClassical)
+    assign_classical(root, keplerian, 15.2, 0.001, 45.0, 0.0, 0.0, 0.0)
+    representation.Assign(keplerian)
+    assert tracker.dirty == ["*/Satellite/a"]
+    root.engine.reset_counters()
+    propagate_dirty(root)
+    assert root.engine.calls[("FakePropagator", "Propagate")] == 1
+
+
+def test_new_scenario_starts_clean(root, scenario):
+    add_satellite(root, "a", START, *ELEMENTS, propagate=False)
+    root.CloseScenario()
+    new_scenario(root, "Next", START, STOP)
+    assert change_tracker(root).dirty == []
@@ -0,0 +1,51 @@
+# coding: utf-8
+from conftest import START, STOP
+from stk_integration.connect import execute_rows
+from stk_integration.fake import STKObjects, create_fake_engine
+from stk_integration.interfaces import InterfaceCache, interface_cache, query_interface
+from stk_integration.scenario import add_facility, close_scenario, new_scenario
+
+
+def test_hits_across_fresh_pointers(root, scenario):
+    # Every property get hands out a new pointer, as comtypes does
+    assert root.CurrentScenario is not root.CurrentScenario
+    cache = InterfaceCache()
+    views = [cache.query(root.CurrentScenario, STKObjects.IAgScenario) for _ in range(3)]
+    assert (cache.hits, cache.misses, len(cache)) == (2, 1, 1)
+    assert views[0] is views[1] is views[2]
+
+
+def test_hit_saves_the_round_trip(root, scenario):
+    query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+    root.engine.reset_counters()
+    query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+    assert root.engine.calls[("FakeScenario", "QueryInterface")] == 0
+
+
+def test_invalidate_and_scenario_changes(root, scenario):
+    cache = InterfaceCache()
+    cache.query(root.CurrentScenario, STKObjects.IAgScenario)
+    cache.invalidate(root.CurrentScenario)
+    assert len(cache) == 0
+
+    query_interface(root, root.CurrentScenario, STKObjects.IAgScenario)
+    assert len(interface_cache(root)) > 0
+    close_scenario(root)
+    assert len(interface_cache(root)) == 0
+    sc2 = new_scenario(root, "Other", START, STOP)
+    assert sc2.StartTime == START
+
+
+def test_roots_keep_their_own_caches(root, scenario):
+    other = create_fake_engine()
+    new_scenario(other, "Other", START, STOP, rewind=False)
+    query_interface(other, other.CurrentScenario, STKObjects.IAgScenario)
+    close_scenario(root)
+    assert len(interface_cache(other)) == 1
+
+
+def test_connect_unload_drops_entries(root, scenario):
+    add_facility(root, "Site", 0.0, 0.0, 0.0)
+    assert len(interface_cache(root)) > 0
+    execute_rows(root, [("Site", ["Unload / */Facility/Site"])])
+    assert len(interface_cache(root)) == 0
@@ -0,0 +1,49 @@
+# coding: utf-8
+import os
+
+import pytest
+
+from stk_integration.fake import create_fake_engine
+from stk_integration.pool import EnginePool, JobError, WorkerCrashed
+
+
+def crash_once(root, marker, value):
+    # The first attempt kills its worker; the retry finds the marker and succeeds
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(3)
+    return value * 2
+
+
+def crash(root, value):
+    os._exit(3)
+
+
+def fail(root, value):
+    raise ValueError("bad case %d" % value)
+
+
+def test_crashed_job_is_retried(tmp_path):
+    marker = str(tmp_path / "crashed")
+    with EnginePool(1, factory=create_fake_engine, max_retries=1) as pool:
+        assert pool.run([(crash_once, (marker, 21))]) == [42]
+        assert pool.restarts == 1
+        # The replacement worker keeps serving jobs
+        assert pool.run([(crash_once, (marker, 1))]) == [2]
+
+
+def test_crash_without_retries_is_reported():
+    with EnginePool(1, factory=create_fake_engine, max_retries=0) as pool:
+        result, = pool.map(crash, [1], return_exceptions=True)
+    assert isinstance(result, WorkerCrashed)
+    assert "code 3" in str(result)
+
+
+def test_job_errors_do_not_restart_the_worker():
+    with EnginePool(1, factory=create_fake_engine) as pool:
+        results = pool.map(fail, [1], return_exceptions=True)
+        assert isinstance(results[0], JobError)
+        assert "bad case 1" in str(results[0])
+        assert pool.restarts == 0
+        with pytest.raises(JobError):
+            pool.map(fail, [2])
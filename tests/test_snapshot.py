@@ -0,0 +1,89 @@
+# coding: utf-8
+import json
+import os
+
+import numpy as np
+import pytest
+
+from conftest import START, STOP
+from stk_integration.dirty import change_tracker
+from stk_integration.ephemeris import Ephemeris
+from stk_integration.fake import create_fake_engine
+from stk_integration.scenario import add_satellite
+from stk_integration.snapshot import (MANIFEST, load_manifest, restore_scenario,
+                                      snapshot_scenario)
+from stk_integration.spec import compile_plan
+from test_spec import make_spec
+
+PATHS = ["*/Satellite/s%d" % i for i in range(3)]
+
+
+def positions(root):
+    return Ephemeris.extract(root, PATHS, START, STOP, 600, velocities=False).positions
+
+
+@pytest.fixture
+def snapshot(root, tmp_path):
+    compile_plan(root, make_spec()).execute(root)
+    directory = str(tmp_path / "snapshot")
+    snapshot_scenario(root, directory)
+    return root, directory
+
+
+def test_restore_matches_the_original(snapshot):
+    root, directory = snapshot
+    manifest = load_manifest(directory)
+    assert manifest["scenario"]["name"] == "Spec"
+    assert len(manifest["objects"]) == 5
+
+    restored = create_fake_engine()
+    sc2 = restore_scenario(restored, directory, verify="states")
+    assert sc2.StartTime == START
+    np.testing.assert_array_equal(positions(restored), positions(root))
+
+
+def test_restored_spec_record_is_diffed_against(snapshot):
+    _, directory = snapshot
+    restored = create_fake_engine()
+    restore_scenario(restored, directory)
+    planned = compile_plan(restored, make_spec()).describe()
+    assert set(planned["action"]) == {"unchanged"}
+
+
+def test_restore_replaces_the_loaded_scenario(snapshot):
+    root, directory = snapshot
+    add_satellite(root, "extra", START, 15.0, 0.001, 45.0, 0.0, 0.0, 0.0, propagate=False)
+    assert change_tracker(root).dirty == ["*/Satellite/extra"]
+
+    restore_scenario(root, directory)
+    names = sorted(child.InstanceName for child in root.CurrentScenario.Children)
+    assert names == ["f0", "f1", "s0", "s1", "s2"]
+    assert change_tracker(root).dirty == []
+
+
+def edit_manifest(directory, edit):
+    path = os.path.join(directory, MANIFEST)
+    with open(path) as f:
+        manifest = json.load(f)
+    edit(manifest)
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+
+
+def test_restore_checks_the_objects(snapshot):
+    _, directory = snapshot
+    edit_manifest(directory, lambda manifest: manifest["objects"].append(
+        {"path": "*/Satellite/missing"}))
+    with pytest.raises(ValueError, match="missing"):
+        restore_scenario(create_fake_engine(), directory)
+
+
+def test_restore_checks_the_states(snapshot):
+    _, directory = snapshot
+
+    def corrupt(manifest):
+        manifest["objects"][-1]["state"] = "0" * 40
+    edit_manifest(directory, corrupt)
+    restore_scenario(create_fake_engine(), directory)
+    with pytest.raises(ValueError, match="differ"):
+        restore_scenario(create_fake_engine(), directory, verify="states")
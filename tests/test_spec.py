@@ -0,0 +1,63 @@
+# coding: utf-8
+import copy
+
+from conftest import START, STOP
+from stk_integration.spec import compile_plan
+
+
+def make_spec():
+    return {
+        "scenario": {"name": "Spec", "start": START, "stop": STOP},
+        "step": 60,
+        "facilities": [{"name": "f%d" % i, "lat": 10.0 * i, "lon": 20.0, "alt": 0.0}
+                       for i in range(2)],
+        "satellites": [{"name": "s%d" % i, "propagator": "J2Perturbation",
+                        "classical": {"mean_motion": 15.0, "eccentricity": 0.001,
+                                      "inclination": 50.0 + i, "arg_of_perigee": 0.0,
+                                      "raan": 10.0 * i, "mean_anomaly": 0.0}}
+                       for i in range(3)],
+    }
+
+
+def actions(plan):
+    return dict(((kind, name), action) for kind, name, action
+                in plan.describe().itertuples(index=False))
+
+
+def test_new_scenario_plan(root):
+    plan = compile_plan(root, make_spec())
+    planned = actions(plan)
+    assert planned.pop(("Scenario", "Spec")) == "new"
+    assert set(planned.values()) == {"new"}
+    assert len(planned) == 5
+
+    report = plan.execute(root)
+    assert report["ok"].all()
+    assert len(root.CurrentScenario.Children) == 5
+
+
+def test_replanning_touches_only_changes(root):
+    spec = make_spec()
+    compile_plan(root, spec).execute(root)
+    assert set(actions(compile_plan(root, spec)).values()) == {"unchanged"}
+
+    edited = copy.deepcopy(spec)
+    edited["satellites"][1]["classical"]["inclination"] = 70.0
+    del edited["facilities"][0]
+    plan = compile_plan(root, edited)
+    changed = dict((key, action) for key, action in actions(plan).items()
+                   if action != "unchanged")
+    assert changed == {("Satellite", "s1"): "update", ("Facility", "f0"): "unload"}
+
+    plan.execute(root)
+    names = sorted(child.InstanceName for child in root.CurrentScenario.Children)
+    assert names == ["f1", "s0", "s1", "s2"]
+    assert set(actions(compile_plan(root, edited)).values()) == {"unchanged"}
+
+
+def test_new_scenario_forgets_the_applied_spec(root):
+    spec = make_spec()
+    compile_plan(root, spec).execute(root)
+    root.CloseScenario()
+    planned = actions(compile_plan(root, spec))
+    assert set(planned.values()) == {"new"}
@@ -0,0 +1,69 @@
+# coding: utf-8
+import json
+
+import pytest
+
+from conftest import START, STOP
+from stk_integration.sweep import Sweep, grid_cases, sample_cases
+
+
+def make_sweep(path, cases=None):
+    cases = grid_cases({"mean_motion": 15.0}, inclination=[45, 50], raan=[0, 90]) \
+        if cases is None else cases
+    return Sweep(cases, str(path), START, STOP, step=600, chunk_size=2)
+
+
+def test_sweep_records_every_case(root, tmp_path):
+    sweep = make_sweep(tmp_path / "sweep.jsonl")
+    assert sweep.run(root=root) == 4
+    results = sweep.results()
+    assert list(results["case"]) == [0, 1, 2, 3]
+    assert (results["min_radius"] > 6000).all()
+    assert (results["max_radius"] >= results["min_radius"]).all()
+
+
+def test_sweep_resumes_after_a_crash(root, tmp_path):
+    path = tmp_path / "sweep.jsonl"
+    sweep = make_sweep(path)
+    sweep.run(root=root)
+    complete = sweep.results()
+
+    # Keep the header and two cases, plus a line cut short mid-write
+    lines = path.read_text().splitlines()
+    path.write_text("\n".join(lines[:3]) + "\n" + lines[3][:10])
+    assert sweep.completed() == {0, 1}
+
+    resumed = make_sweep(path)
+    assert resumed.run(root=root) == 2
+    assert resumed.run(root=root) == 0
+    assert resumed.results().equals(complete)
+
+
+def test_failed_cases_are_retried(root, tmp_path):
+    cases = [{"eccentricity": 0.001}, {"eccentricity": 1.5}]
+    sweep = make_sweep(tmp_path / "sweep.jsonl", cases)
+    sweep.run(root=root)
+    errors = sweep.results(errors=True)
+    assert errors["error"].notna().tolist() == [False, True]
+    assert [case for case, _ in sweep.pending()] == [1]
+    assert sweep.run(root=root) == 1
+
+
+def test_checkpoint_belongs_to_one_sweep(root, tmp_path):
+    path = tmp_path / "sweep.jsonl"
+    make_sweep(path).run(root=root)
+    other = make_sweep(path, sample_cases(3, {"raan": ("uniform", 0, 360)}, seed=1))
+    with pytest.raises(ValueError):
+        other.pending()
+    header = json.loads(path.read_text().splitlines()[0])
+    assert header["cases"] == 4
+
+
+def test_worker_rebuilds_a_replaced_scenario(root, tmp_path):
+    sweep = make_sweep(tmp_path / "sweep.jsonl")
+    sweep.run(root=root)
+    root.CloseScenario()
+    again = make_sweep(tmp_path / "again.jsonl")
+    assert again.run(root=root) == 4
+    assert again.results()[["min_radius", "max_radius"]].equals(
+        sweep.results()[["min_radius", "max_radius"]])
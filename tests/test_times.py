@@ -0,0 +1,50 @@
+# coding: utf-8
+import numpy as np
+import pytest
+
+from stk_integration.times import (datetime64_to_epsec, epsec_to_datetime64, format_utcg,
+                                   format_utcg_array, parse_utcg, parse_utcg_array)
+
+STRINGS = ["10 Jun 2016 04:00:00.000", "1 Jan 2017 00:00:00.125", "29 Feb 2016 23:59:59.999",
+           "31 Dec 1999 12:34:56.789"]
+
+
+def test_round_trip():
+    times = parse_utcg_array(STRINGS)
+    assert list(format_utcg_array(times)) == STRINGS
+
+
+def test_matches_scalar_parser():
+    times = parse_utcg_array(STRINGS)
+    expected = [np.datetime64(parse_utcg(value), "ns") for value in STRINGS]
+    np.testing.assert_array_equal(times, expected)
+    assert [format_utcg(parse_utcg(value)) for value in STRINGS] == STRINGS
+
+
+def test_fraction_digits():
+    times = parse_utcg_array(["10 Jun 2016 04:00:00", "10 Jun 2016 04:00:00.5",
+                              "10 Jun 2016 04:00:00.123456789"])
+    offsets = (times - times[0]) / np.timedelta64(1, "ns")
+    assert list(offsets) == [0, 500000000, 123456789]
+
+
+@pytest.mark.parametrize("value", ["10 Jun 2016 04:00:00.12a", "10 Jun 2016 04:00:00x",
+                                   "10 Jnu 2016 04:00:00.000", "10 Jun 2016 04-00:00.000"])
+def test_rejects_malformed(value):
+    with pytest.raises(ValueError):
+        parse_utcg_array(["10 Jun 2016 04:00:00.000", value])
+
+
+@pytest.mark.parametrize("value", ["10 Jun 2016 04:00:00.1234567890123",
+                                   "10 Jun 2016 04:00:00.000 trailing", "10 Jün 2016 04:00:00.000"])
+def test_rejects_long_and_non_ascii(value):
+    with pytest.raises(ValueError, match=value[:10]):
+        parse_utcg_array(["10 Jun 2016 04:00:00.000", value])
+
+
+def test_epsec_round_trip():
+    epoch = "10 Jun 2016 04:00:00.000"
+    seconds = np.array([0.0, 0.5, 60.0, 86400.0])
+    times = epsec_to_datetime64(seconds, epoch)
+    assert format_utcg_array(times[:1])[0] == epoch
+    np.testing.assert_allclose(datetime64_to_epsec(times, epoch), seconds)
@@ -0,0 +1,13 @@
+# coding: utf-8
+from stk_integration.trace import Tracer
+
+
+def test_folded_frames_have_no_separators(root):
+    tracer = Tracer()
+    traced = tracer.wrap(root)
+    with tracer.span("build sats; pass 1"):
+        traced.UnitPreferences
+    [line] = tracer.folded()
+    stack, count = line.rsplit(" ", 1)
+    assert stack.split(";") == ["build_sats__pass_1", "FakeRoot.UnitPreferences"]
+    assert int(count) >= 1